@@ -1,44 +1,71 @@
 from flask import Flask, request, jsonify,Response
 from flask_cors import CORS
-from db import get_db_connection
-from datetime import datetime, date, time, timedelta
+from db import (get_db_connection, db_connection, pool_stats, routing_stats, insert_many,
+                CATALOG, SHOPS, user_key)
+import db
+from shop_index import shop_index, get_shop_index
+from geo import calc_distance, near_rounding_tie
+from quotes import issue_quote, verify_quote, items_total, QUOTE_TTL
+from paging import (page_params, keyset_sql, split_page, stream_rows, history_params, history_sql,
+                    split_history_page)
+from search_index import search_index, get_search_index, refresh_product
+from image_cache import serve_image, UpstreamError, UpstreamBusy, ImageTooLarge
+from image_variants import variant_params, serve_variant
+from auth import hash_password, check_password, issue_shop_token, shop_auth_error, SHOP_AUTH_REQUIRED
+from catalog_cache import catalog_cache, shops_cache
+from coalesce import coalescer
+from etags import fingerprint, not_modified, tagged, user_tags
+from json_provider import RowJSONProvider, RowSet
+from product_import import import_format, import_products
+from product_updates import apply_updates, index_updates, BATCH_UPDATE_MAX_ITEMS
+from sales_rollup import record_orders, remove_order, shop_summary
+from statements import run
+import metrics
+from datetime import datetime
 import decimal
+import logging
+import os
+import secrets
 from decimal import Decimal, ROUND_HALF_UP
-from math import radians, sin, cos, sqrt, atan2
+import numpy as np
 app = Flask(__name__)
+app.json = RowJSONProvider(app)
+# Signs delivery quotes and shop tokens; every worker must share it
+if not os.environ.get('SECRET_KEY'):
+    if SHOP_AUTH_REQUIRED:
+        raise RuntimeError("SHOP_AUTH_REQUIRED=1 needs SECRET_KEY: shop tokens would not survive "
+                           "a restart or be accepted by other workers")
+    logging.getLogger(__name__).warning(
+        "SECRET_KEY is not set: using a per-process key, so shop tokens and delivery quotes "
+        "fail after a restart and on other workers")
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 CORS(app, resources={r"/*": {"origins": "*"}})
-import bcrypt
-import requests
+# Sends the client its last write time so replica reads in any worker can honour it
+db.init_app(app)
 
 @app.route('/proxy_image')
 def proxy_image():
+    """Proxy a remote image. Optional width, height, quality and format
+    (webp|jpeg) return a resized variant instead of the original."""
     url = request.args.get("url")
     if not url:
         return jsonify({"error": "Missing URL"}), 400
 
     try:
-        # Add a real browser user-agent to avoid being blocked by websites
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/120.0 Safari/537.36"
-        }
-
-        # Get the image from the remote site
-        resp = requests.get(url, headers=headers, timeout=10)
-
-        # If the image URL is invalid or blocked
-        if resp.status_code != 200:
-            return jsonify({
-                "error": f"Failed to fetch image (status {resp.status_code})"
-            }), 400
-
-        # Detect and forward the content type properly
-        content_type = resp.headers.get("Content-Type", "image/jpeg")
-
-        # Return the binary image data
-        return Response(resp.content, mimetype=content_type)
+        params = variant_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
+        if params:
+            return serve_variant(url, params, request.if_none_match)
+        # Served from the image cache; misses are fetched into it first
+        return serve_image(url, request.if_none_match)
+
+    except (UpstreamError, ImageTooLarge) as e:
+        return jsonify({"error": str(e)}), 400
+    except UpstreamBusy as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -53,10 +80,11 @@ def convert_product(product):
     }
 @app.route('/update-owner-details/<int:shop_id>', methods=['PUT'])
 def update_owner_details(shop_id):
+    auth_error = shop_auth_error(shop_id)
+    if auth_error:
+        return auth_error
     try:
         data = request.get_json()
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
 
         # ✅ Allowed fields to update
         fields = [
@@ -77,17 +105,23 @@ def update_owner_details(shop_id):
         values.append(shop_id)
 
         query = f"UPDATE shops SET {set_clause}, updated_at = NOW() WHERE shop_id = %s"
-        cursor.execute(query, values)
-        conn.commit()
+        with db_connection(sticky=SHOPS) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, values)
+            conn.commit()
+            cursor.close()
+
+        # Keep the nearest-shop index in sync with location/status changes
+        geo_fields = {k: update_data[k] for k in ('latitude', 'longitude', 'status') if k in update_data}
+        if geo_fields:
+            shop_index.upsert(shop_id, **geo_fields)
+        shops_cache.clear()
 
         return jsonify({"status": "ok", "message": "Shop details updated successfully"}), 200
 
     except Exception as e:
         print(f"❌ Error updating shop details: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 # ----------------- Add Product -----------------
 @app.route('/add_owner_product', methods=['POST'])
@@ -104,30 +138,82 @@ def add_owner_product():
         if not all([shop_id, name, category, price is not None, quantity_in_stock is not None]):
             return jsonify({"error": "Missing required fields"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        auth_error = shop_auth_error(shop_id)
+        if auth_error:
+            return auth_error
 
         query = """
         INSERT INTO products (shop_id, name, category, price, quantity_in_stock, image_url, date_added)
         VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
-        cursor.execute(query, (
-            shop_id,
-            name,
-            category,
-            price,
-            quantity_in_stock,
-            image_url,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_connection(sticky=CATALOG) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (
+                shop_id,
+                name,
+                category,
+                price,
+                quantity_in_stock,
+                image_url,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ))
+            product_id = cursor.lastrowid
+            conn.commit()
+            refresh_product(conn, product_id)
+            cursor.close()
+
+        catalog_cache.invalidate_shop(shop_id)
 
         return jsonify({"message": "Product added successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# ----------------- Bulk Import Products -----------------
+@app.route('/import_owner_products', methods=['POST'])
+def import_owner_products():
+    """Bulk add products from a CSV (header row) or NDJSON upload.
+
+    The file is either the raw request body or a multipart "file" field;
+    ?shop_id= names the shop, ?format=csv|ndjson overrides detection and
+    ?batch_size= sets rows per transaction. Bad rows are reported by line
+    number and skipped; the rest are imported.
+    """
+    shop_id = request.args.get('shop_id')
+    if not shop_id:
+        return jsonify({"error": "shop_id is required"}), 400
+    try:
+        shop_id = int(shop_id)
+    except ValueError:
+        return jsonify({"error": "shop_id must be an integer"}), 400
+
+    auth_error = shop_auth_error(shop_id)
+    if auth_error:
+        return auth_error
+
+    upload = request.files.get('file')
+    try:
+        fmt = import_format(request.args.get('format'),
+                            upload.mimetype if upload else request.mimetype,
+                            upload.filename if upload else None)
+        batch_size = request.args.get('batch_size', type=int)
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be positive")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        report = import_products(upload.stream if upload else request.stream, fmt, shop_id, batch_size)
+        if report.imported:
+            catalog_cache.invalidate_shop(shop_id)
+        return jsonify({"status": "ok", **report.as_dict()}), 200
+
+    except Exception as e:
+        print(f"❌ Error importing products: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/delete_owner_product', methods=['POST'])
 def delete_owner_product():
     try:
@@ -137,15 +223,23 @@ def delete_owner_product():
         if product_id is None:
             return jsonify({"error": "product_id is required"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         query = "DELETE FROM products WHERE id = %s"
-        cursor.execute(query, (product_id,))
-        conn.commit()
+        with db_connection(sticky=CATALOG) as conn:
+            cursor = conn.cursor()
+            # The owning shop: who may delete it, and whose cached listings this touches
+            cursor.execute("SELECT shop_id FROM products WHERE id = %s FOR UPDATE", (product_id,))
+            row = cursor.fetchone()
+            auth_error = shop_auth_error(row[0]) if row else None
+            if auth_error:
+                cursor.close()
+                return auth_error
+            cursor.execute(query, (product_id,))
+            conn.commit()
+            cursor.close()
 
-        cursor.close()
-        conn.close()
+        search_index.remove(int(product_id))
+        if row:
+            catalog_cache.invalidate_shop(row[0])
 
         return jsonify({"message": "Product deleted successfully"}), 200
 
@@ -166,52 +260,146 @@ def update_product_owner():
         if not product_id:
             return jsonify({"error": "product_id is required"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE products
-            SET name=%s, category=%s, price=%s, quantity_in_stock=%s, image_url=%s
-            WHERE id=%s
-        """, (name, category, price, quantity_in_stock, image_url, product_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_connection(sticky=CATALOG) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT shop_id FROM products WHERE id = %s FOR UPDATE", (product_id,))
+            row = cursor.fetchone()
+            auth_error = shop_auth_error(row[0]) if row else None
+            if auth_error:
+                cursor.close()
+                return auth_error
+            cursor.execute("""
+                UPDATE products
+                SET name=%s, category=%s, price=%s, quantity_in_stock=%s, image_url=%s
+                WHERE id=%s
+            """, (name, category, price, quantity_in_stock, image_url, product_id))
+            conn.commit()
+            product = refresh_product(conn, int(product_id))
+            cursor.close()
+
+        if product:
+            catalog_cache.invalidate_shop(product["shop_id"])
         return jsonify({"message": "Product updated successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# ------------------ BATCH UPDATE PRODUCTS ------------------
+@app.route('/update_owner_products', methods=['POST'])
+def update_owner_products():
+    """Partial updates for many of a shop's products in one transaction.
+
+    Body: {"shop_id": 1, "items": [{"product_id": 5, "stock_delta": -2},
+    {"product_id": 6, "price": 120, "quantity_in_stock": 40}, ...]}.
+    Returns a result per item, in order; failed items don't stop the rest.
+    """
+    try:
+        data = request.get_json()
+        shop_id = data.get('shop_id')
+        items = data.get('items')
+
+        if shop_id is None:
+            return jsonify({"error": "shop_id is required"}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "items must be a non-empty list"}), 400
+        if len(items) > BATCH_UPDATE_MAX_ITEMS:
+            return jsonify({"error": f"At most {BATCH_UPDATE_MAX_ITEMS} items per request"}), 400
+
+        auth_error = shop_auth_error(shop_id)
+        if auth_error:
+            return auth_error
+
+        with db_connection(sticky=CATALOG) as conn:
+            try:
+                results, rows = apply_updates(conn, shop_id, items)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        if rows:
+            index_updates(rows)
+            catalog_cache.invalidate_shop(shop_id)
+        updated = sum(1 for r in results if r["status"] == "updated")
+        return jsonify({"status": "ok", "updated": updated, "failed": len(results) - updated,
+                        "results": results}), 200
+
+    except Exception as e:
+        print(f"❌ Error in batch product update: {e}")
+        return jsonify({"error": str(e)}), 500
 # ==================================================
 # 1️⃣ Fetch Products
+# Optional ?limit=&after=<id> pages by id (next cursor in "next_after" /
+# X-Next-After); ?stream=json|ndjson streams the rows without buffering.
+# Buffered pages carry an ETag; If-None-Match gets a 304 without a query.
+# Identical buffered requests in flight together share one response (coalesce.py).
+PRODUCT_SELECT = "SELECT id, shop_id, name, category, image_url, price, quantity_in_stock, date_added FROM products"
+# /products sends price as a number; /items and /ownerproducts send the raw column
+PRODUCT_CONVERT = {"price": float}
+
+
+def products_cache_key(shop_id, limit, after):
+    return ('products', shop_id, after, limit)
+
+
+def fetch_products(shop_id, limit, after):
+    """One page of products (all of them without a limit), the next cursor and an ETag.
+
+    shop_id None means the whole catalog. Pages are served from the catalog cache.
+    """
+    def load():
+        where, params = (["shop_id = %s"], [shop_id]) if shop_id is not None else ((), ())
+        sql, params = keyset_sql(PRODUCT_SELECT, where, params, after=after,
+                                 limit=limit + 1 if limit else None)
+        with db_connection(read=True, sticky=CATALOG) as conn:
+            products = run(conn, sql, params).rowset()  # a handful of distinct texts, each prepared once
+        return split_page(products, limit)
+
+    (products, next_after), tag = catalog_cache.get_or_load_tagged(
+        products_cache_key(shop_id, limit, after), load, shop_id)
+    return products, next_after, tag
+
+
+def with_next_after(response, next_after):
+    if next_after is not None:
+        response.headers['X-Next-After'] = str(next_after)
+    return response
+
+
 @app.route('/products')
 def product_page():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        limit, after, stream = page_params(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
 
-        # ✅ Include shop_id in your query
-        cursor.execute("SELECT id, shop_id, name, category, image_url, price, quantity_in_stock, date_added FROM products")
-        products = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        products = [
-            {
-                "id": p["id"],
-                "shop_id": p["shop_id"],  # ✅ include
-                "name": p["name"],
-                "category": p["category"],
-                "image_url": p["image_url"],
-                "price": float(p["price"]),
-                "quantity_in_stock": p["quantity_in_stock"],
-                "date_added": p["date_added"]
+    try:
+        if stream:
+            sql, params = keyset_sql(PRODUCT_SELECT, after=after, limit=limit)
+            return stream_rows(sql, params, PRODUCT_CONVERT, stream,
+                               prefix='{"products": [', suffix='], "status": "ok"}')
+
+        current = catalog_cache.fresh_tag(products_cache_key(None, limit, after))
+        unchanged = not_modified(current)
+        if unchanged:
+            return unchanged
+
+        def build():
+            products, next_after, tag = fetch_products(None, limit, after)
+            # Checked again here: the page may have expired from the cache or never been in this worker's
+            unchanged = not_modified(tag)
+            if unchanged:
+                return unchanged
+            body = {
+                'status': 'ok',
+                'products': products.with_convert(**PRODUCT_CONVERT)
             }
-            for p in products
-        ]
+            if limit:
+                body['next_after'] = next_after
+            return tagged(with_next_after(jsonify(body), next_after), tag)
 
-        return jsonify({
-            'status': 'ok',
-            'products': products
-        })
+        return coalescer.respond(('/products', limit, after), build, current)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -226,54 +414,45 @@ def ownerproduct_page():
         if shop_id is None:
             return jsonify({"error": "shop_id is required"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        auth_error = shop_auth_error(shop_id)
+        if auth_error:
+            return auth_error
 
-        query = """
-        SELECT id, shop_id, name, category, image_url, price, quantity_in_stock, date_added
-        FROM products
-        WHERE shop_id = %s
-        """
-        cursor.execute(query, (shop_id,))
-        products = cursor.fetchall()
+        try:
+            limit, after, stream = page_params({**request.args.to_dict(), **data})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        cursor.close()
-        conn.close()
+        if stream:
+            sql, params = keyset_sql(PRODUCT_SELECT, ["shop_id = %s"], [shop_id], after=after, limit=limit)
+            return stream_rows(sql, params, fmt=stream)
 
-        return jsonify(products), 200
+        products, next_after, _ = fetch_products(int(shop_id), limit, after)
+        return with_next_after(jsonify(products), next_after), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 @app.route('/owner-details/<int:shop_id>', methods=['GET'])
 def get_owner_details(shop_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM shops WHERE shop_id = %s", (shop_id,))
-        shop = cursor.fetchone()
+        with db_connection(read=True, sticky=SHOPS) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM shops WHERE shop_id = %s", (shop_id,))
+            # ✅ plain: MySQL time/datetime values as strings, Decimal as numbers
+            shop = RowSet.from_cursor(cursor, plain=True).first()
+            cursor.close()
 
         if not shop:
             return jsonify({"status": "error", "message": "Shop not found"}), 404
 
         # ✅ Remove sensitive fields
-        if 'password' in shop:
-            del shop['password']
-
-        # ✅ Convert MySQL objects (time, Decimal, datetime, etc.) to strings
-        for key, value in shop.items():
-            if isinstance(value, (datetime, date, time, timedelta)):
-                shop[key] = str(value)
-            elif isinstance(value, Decimal):
-                shop[key] = float(value)
+        shop = shop.without('password')
 
         return jsonify({"status": "ok", "shop": shop}), 200
 
     except Exception as e:
         print(f"❌ Error fetching shop details: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 # =========================================
 # 🧾 Full Shop Registration Route
 # =========================================
@@ -285,54 +464,60 @@ def shop_register():
         if not all(field in data and data[field] for field in required_fields):
             return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        # Hash password (on the bcrypt executor, before holding a DB connection)
+        hashed_pw = hash_password(data['password'])
 
-        # Check if email already exists
-        cursor.execute("SELECT * FROM shops WHERE email = %s", (data['email'],))
-        if cursor.fetchone():
+        with db_connection(sticky=SHOPS) as conn:
+            # Check if email already exists
+            if run(conn, 'shop_email_taken', (data['email'],)).rows:
+                return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
+
+            cursor = conn.cursor(dictionary=True)
+
+            # Insert shop record
+            cursor.execute("""
+                INSERT INTO shops (
+                    shop_name, shop_type, owner_name, contact_number, email, address, city, state,
+                    postal_code, country, opening_time, closing_time, status, image_url,
+                    latitude, longitude, password, created_at
+                ) VALUES (
+                    %s, %s, %s, %s, %s, %s, %s, %s,
+                    %s, %s, %s, %s, 'active', %s,
+                    %s, %s, %s, NOW()
+                )
+            """, (
+                data.get('shop_name'),
+                data.get('shop_type'),
+                data.get('owner_name'),
+                data.get('contact_number'),
+                data.get('email'),
+                data.get('address'),
+                data.get('city'),
+                data.get('state'),
+                data.get('postal_code'),
+                data.get('country', 'India'),
+                data.get('opening_time'),
+                data.get('closing_time'),
+                data.get('image_url'),
+                data.get('latitude'),
+                data.get('longitude'),
+                hashed_pw
+            ))
+
+            new_shop_id = cursor.lastrowid
+            conn.commit()
             cursor.close()
-            conn.close()
-            return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
-
-        # Hash password
-        hashed_pw = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-
-        # Insert shop record
-        cursor.execute("""
-            INSERT INTO shops (
-                shop_name, shop_type, owner_name, contact_number, email, address, city, state,
-                postal_code, country, opening_time, closing_time, status, image_url,
-                latitude, longitude, password, created_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, 'active', %s,
-                %s, %s, %s, NOW()
-            )
-        """, (
-            data.get('shop_name'),
-            data.get('shop_type'),
-            data.get('owner_name'),
-            data.get('contact_number'),
-            data.get('email'),
-            data.get('address'),
-            data.get('city'),
-            data.get('state'),
-            data.get('postal_code'),
-            data.get('country', 'India'),
-            data.get('opening_time'),
-            data.get('closing_time'),
-            data.get('image_url'),
-            data.get('latitude'),
-            data.get('longitude'),
-            hashed_pw
-        ))
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        shop_index.upsert(new_shop_id, latitude=data.get('latitude'),
+                          longitude=data.get('longitude'), status='active')
+        shops_cache.clear()
 
-        return jsonify({'status': 'ok', 'message': 'Shop registered successfully'})
+        return jsonify({
+            'status': 'ok',
+            'message': 'Shop registered successfully',
+            'shop_id': new_shop_id,
+            'token': issue_shop_token(new_shop_id)
+        })
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -351,21 +536,18 @@ def shop_login():
         if not email or not password:
             return jsonify({'status': 'error', 'message': 'Missing email or password'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT * FROM shops WHERE email = %s", (email,))
-        shop = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            shop = run(conn, 'shop_by_email', (email,)).first_dict()
 
         if not shop:
             return jsonify({'status': 'error', 'message': 'Invalid email or password'}), 400
 
-        if bcrypt.checkpw(password.encode('utf-8'), shop['password'].encode('utf-8')):
+        if check_password(password, shop['password']):
             return jsonify({
                 'status': 'ok',
                 'message': 'Login successful',
+                # Send as "Authorization: Bearer <token>" to owner endpoints
+                'token': issue_shop_token(shop['shop_id']),
                 'shop': {
                     'shop_id': shop['shop_id'],
                     'shop_name': shop['shop_name'],
@@ -392,10 +574,11 @@ def add_to_cart():
     if not items:
         return jsonify({"success": False, "message": "No items received"}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(sticky=user_key(user_id))
     cursor = conn.cursor()
 
     try:
+        rows = []
         for item in items:
             pickle_name = item.get("pickle_name")
             quantity = item.get("quantity")
@@ -405,12 +588,14 @@ def add_to_cart():
             if not pickle_name or not quantity or not cost or shop_id is None:
                 continue  # skip invalid items
 
-            cursor.execute("""
-                INSERT INTO cart (user_id, pickle_name, quantity, cost, shop_id)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (user_id, pickle_name, quantity, cost, shop_id))
+            rows.append((user_id, pickle_name, quantity, cost, shop_id))
+
+        # One multi-row INSERT instead of a round trip per item
+        insert_many(cursor, "INSERT INTO cart (user_id, pickle_name, quantity, cost, shop_id) VALUES ",
+                    "(%s, %s, %s, %s, %s)", rows)
 
         conn.commit()
+        user_tags.invalidate(('cart', str(user_id)))
         return jsonify({"success": True})
     except Exception as e:
         print("Error adding to cart:", e)
@@ -422,15 +607,160 @@ def add_to_cart():
 # ==================================================
 # 3️⃣ Buy Now
 # ==================================================
-def calc_distance(lat1, lon1, lat2, lon2):
-    R = 6371.0  # km
-    dlat = radians(float(lat2) - float(lat1))
-    dlon = radians(float(lon2) - float(lon1))
-    a = sin(dlat / 2)**2 + cos(radians(float(lat1))) * cos(radians(float(lat2))) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+def select_shop(latitude, longitude, requested_shop_id):
+    """Requested shop if it is active, else the nearest one: (shop_id, lat, lon) or None."""
+    index = get_shop_index()
+    if requested_shop_id:
+        shop = index.get(requested_shop_id)
+        if shop:
+            return shop
+    # Requested shop_id missing or not found: fall back to nearest
+    nearest = index.nearest(latitude, longitude, k=1)
+    return nearest[0] if nearest else None
+
+
+DELIVERY_PER_KM = Decimal('10')
+MIN_CHARGE = Decimal('20')
+
+
+def delivery_pricing(latitude, longitude, shop_lat, shop_lon):
+    """(distance_km, delivery_charge) as Decimals, with the checkout rounding rules."""
+    return price_distance(calc_distance(latitude, longitude, shop_lat, shop_lon))
+
+
+def price_distance(km):
+    distance_km = Decimal(str(km)).quantize(Decimal('0.00000001'))
+    delivery_charge = max(MIN_CHARGE, (distance_km * DELIVERY_PER_KM).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+    return distance_km, delivery_charge
+
+
+def price_distances(km):
+    """delivery_pricing's rules over an array of km: (distance_km, delivery_charge) float arrays.
+
+    Exact integer arithmetic on the 8-decimal distance; cells on a rounding
+    boundary go through the Decimal code, so results match it to the cent.
+    """
+    steps = np.rint(km * 1e8).astype(np.int64)  # distance in 1e-8 km
+    per_km_cents = int(DELIVERY_PER_KM * 100)
+    cents = np.maximum(int(MIN_CHARGE * 100), (steps * per_km_cents + 50_000_000) // 100_000_000)
+    distance_km, delivery_charge = steps / 1e8, cents / 100
+    for cell in zip(*np.nonzero(near_rounding_tie(km))):
+        d, c = price_distance(float(km[cell]))
+        distance_km[cell], delivery_charge[cell] = float(d), float(c)
+    return distance_km, delivery_charge
+
+
+ORDER_INSERT_HEAD = """
+    INSERT INTO orders (
+        user_id, pickles, quantity, cost, status, created_at,
+        latitude, longitude, distance, delivery_charge, final_cost, shop_id
+    ) VALUES """
+ORDER_INSERT_ROW = "(%s, %s, %s, %s, 'Ordered', NOW(), %s, %s, %s, %s, %s, %s)"
+
+
+def insert_orders(cursor, order_rows, **kwargs):
+    """Insert ORDER_INSERT_ROW rows and count them in the sales rollups (same transaction)."""
+    insert_many(cursor, ORDER_INSERT_HEAD, ORDER_INSERT_ROW, order_rows, **kwargs)
+    record_orders(cursor, [(row[9], row[1], row[2], row[3], row[7]) for row in order_rows])
+
+
+# Current price of a cart row's product (cart rows carry shop and name, not a product id)
+CART_PRICE_SQL = """(SELECT p.price FROM products p
+    WHERE p.shop_id = c.shop_id AND p.name = c.pickle_name ORDER BY p.id LIMIT 1)"""
+
+
+def checkout_cart(user_id, latitude, longitude):
+    """Order everything in the user's cart at current prices, in one transaction.
+
+    Three statements whatever the cart size: read the cart joined to
+    product prices (locking the rows), insert all orders, delete the cart
+    rows. Each shop in the cart gets its own distance and delivery charge.
+    """
+    conn = get_db_connection(sticky=user_key(user_id))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT c.id, c.shop_id, c.pickle_name, c.quantity, {CART_PRICE_SQL} AS price
+            FROM cart c WHERE c.user_id = %s ORDER BY c.id FOR UPDATE
+        """, (user_id,))
+        cart = cursor.fetchall()
+        if not cart:
+            conn.rollback()
+            return jsonify({'success': False, 'message': 'Cart is empty'}), 400
+
+        unavailable = sorted({name for _, _, name, _, price in cart if price is None})
+        if unavailable:
+            conn.rollback()
+            return jsonify({'success': False, 'message': 'Some cart items are no longer available',
+                            'unavailable': unavailable}), 409
+
+        index = get_shop_index()
+        pricing = {}
+        for shop_id in {row[1] for row in cart}:
+            shop = index.get(shop_id)
+            if not shop:
+                conn.rollback()
+                return jsonify({'success': False, 'message': f'Shop {shop_id} is not accepting orders'}), 409
+            pricing[shop_id] = delivery_pricing(latitude, longitude, shop[1], shop[2])
+
+        order_lat = Decimal(str(latitude)).quantize(Decimal('0.00000001'))
+        order_lon = Decimal(str(longitude)).quantize(Decimal('0.00000001'))
+        order_rows = []
+        order_details = []
+        for _, shop_id, name, qty, price in cart:
+            qty = int(qty)
+            distance_km, delivery_charge = pricing[shop_id]
+            cost = (Decimal(str(price)) * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            final_cost = (cost + delivery_charge).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            order_rows.append((
+                user_id, name, qty, cost, order_lat, order_lon,
+                distance_km, delivery_charge, final_cost, shop_id
+            ))
+            order_details.append({
+                "pickle_name": name,
+                "quantity": qty,
+                "cost": float(cost),
+                "delivery_charge": float(delivery_charge),
+                "final_cost": float(final_cost),
+                "shop_id": shop_id
+            })
+
+        insert_orders(cursor, order_rows, chunk_size=len(order_rows))
+        cart_ids = [row[0] for row in cart]
+        cursor.execute(f"DELETE FROM cart WHERE user_id = %s AND id IN ({', '.join(['%s'] * len(cart_ids))})",
+                       [user_id] + cart_ids)
+        conn.commit()
+        user_tags.invalidate(('cart', str(user_id)), ('orders', str(user_id)))
+
+        response = {
+            "success": True,
+            "message": "Order placed successfully",
+            "shops": [{"shop_id": shop_id, "distance_km": float(d), "delivery_charge": float(c)}
+                      for shop_id, (d, c) in sorted(pricing.items())],
+            "orders": order_details
+        }
+        if len(pricing) == 1:
+            # Same top-level fields as an items order
+            shop_id, (distance_km, delivery_charge) = next(iter(pricing.items()))
+            response.update(shop_id=shop_id, distance_km=float(distance_km),
+                            delivery_charge=float(delivery_charge))
+        return jsonify(response)
+
+    except Exception as e:
+        conn.rollback()
+        print("Error in /buy_now checkout:", e)
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @app.route('/buy_now', methods=['POST'])
 def buy_now():
+    """Place orders for the posted items, or with "from_cart": true for
+    everything in the user's cart (priced from the products table and
+    removed from the cart in the same transaction)."""
     data = request.get_json()
     user_id = data.get("user_id")
     latitude = data.get("latitude")
@@ -440,53 +770,43 @@ def buy_now():
 
     if not user_id:
         return jsonify({'success': False, 'message': 'user_id missing'}), 400
+    if data.get("from_cart"):
+        if latitude is None or longitude is None:
+            return jsonify({'success': False, 'message': 'Missing coordinates'}), 400
+        return checkout_cart(user_id, latitude, longitude)
     if not items:
         return jsonify({'success': False, 'message': 'No items received'}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(sticky=user_key(user_id))
     cursor = conn.cursor()
 
     try:
-        # Fetch all active shops
-        cursor.execute("""
-            SELECT shop_id, latitude, longitude 
-            FROM shops 
-            WHERE status = 'active' AND latitude IS NOT NULL AND longitude IS NOT NULL
-        """)
-        shops = cursor.fetchall()
-        if not shops:
-            return jsonify({'success': False, 'message': 'No active shops found'}), 404
-
-        # Determine which shop to use
-        if requested_shop_id == 0:
-            # Choose nearest shop
-            nearest_shop = min(
-                shops,
-                key=lambda shop: calc_distance(latitude, longitude, shop[1], shop[2])
-            )
-            shop_id, shop_lat, shop_lon = nearest_shop
+        # A valid quote from /distance_finder already fixes shop and price, as
+        # long as it is for the shop asked for and that shop still takes orders
+        quote = verify_quote(data.get("quote"), latitude, longitude, items_total(items))
+        if quote and (requested_shop_id and quote["shop_id"] != requested_shop_id
+                      or not get_shop_index().get(quote["shop_id"])):
+            quote = None
+        if quote:
+            shop_id = quote["shop_id"]
+            distance_km = quote["distance_km"]
+            delivery_charge = quote["delivery_charge"]
         else:
-            # Try to find requested shop
-            shop_found = next((s for s in shops if s[0] == requested_shop_id), None)
-            if shop_found:
-                shop_id, shop_lat, shop_lon = shop_found
-            else:
-                # If requested shop_id not found, fallback to nearest
-                nearest_shop = min(
-                    shops,
-                    key=lambda shop: calc_distance(latitude, longitude, shop[1], shop[2])
-                )
-                shop_id, shop_lat, shop_lon = nearest_shop
+            # Determine which shop to use (from the in-memory shop index)
+            shop = select_shop(latitude, longitude, requested_shop_id)
+            if not shop:
+                return jsonify({'success': False, 'message': 'No active shops found'}), 404
+            shop_id, shop_lat, shop_lon = shop
 
-        # Calculate distance and delivery charge
-        distance_km = Decimal(str(calc_distance(latitude, longitude, shop_lat, shop_lon))).quantize(Decimal('0.00000001'))
-        DELIVERY_PER_KM = Decimal('10')
-        MIN_CHARGE = Decimal('20')
-        delivery_charge = max(MIN_CHARGE, (distance_km * DELIVERY_PER_KM).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+            # Calculate distance and delivery charge
+            distance_km, delivery_charge = delivery_pricing(latitude, longitude, shop_lat, shop_lon)
 
         order_details = []
+        order_rows = []
+        order_lat = Decimal(str(latitude)).quantize(Decimal('0.00000001'))
+        order_lon = Decimal(str(longitude)).quantize(Decimal('0.00000001'))
 
-        # Insert each item into orders
+        # Validate and price every item, then insert them in one statement
         for item in items:
             name = item.get("pickle_name")
             if not name:
@@ -497,18 +817,8 @@ def buy_now():
             cost = (unit_price * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
             final_cost = (cost + delivery_charge).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-            cursor.execute("""
-                INSERT INTO orders (
-                    user_id, pickles, quantity, cost, status, created_at,
-                    latitude, longitude, distance, delivery_charge, final_cost, shop_id
-                ) VALUES (
-                    %s, %s, %s, %s, 'Ordered', NOW(),
-                    %s, %s, %s, %s, %s, %s
-                )
-            """, (
-                user_id, name, qty, cost,
-                Decimal(str(latitude)).quantize(Decimal('0.00000001')),
-                Decimal(str(longitude)).quantize(Decimal('0.00000001')),
+            order_rows.append((
+                user_id, name, qty, cost, order_lat, order_lon,
                 distance_km, delivery_charge, final_cost, shop_id
             ))
 
@@ -521,7 +831,10 @@ def buy_now():
                 "shop_id": shop_id
             })
 
+        insert_orders(cursor, order_rows)
+
         conn.commit()
+        user_tags.invalidate(('orders', str(user_id)))
 
         return jsonify({
             "success": True,
@@ -541,6 +854,84 @@ def buy_now():
         cursor.close()
         conn.close()
 
+# Batch quotes: many points against many shops, one vectorized pass
+QUOTE_MATRIX_MAX_POINTS = int(os.environ.get('QUOTE_MATRIX_MAX_POINTS', 1000))
+QUOTE_MATRIX_MAX_CELLS = int(os.environ.get('QUOTE_MATRIX_MAX_CELLS', 200_000))
+
+
+def parse_points(points):
+    """(lats, lons) lists from [{"latitude", "longitude"}, ...]; raises ValueError."""
+    if not isinstance(points, list) or not points:
+        raise ValueError("points must be a non-empty list")
+    if len(points) > QUOTE_MATRIX_MAX_POINTS:
+        raise ValueError(f"At most {QUOTE_MATRIX_MAX_POINTS} points per request")
+    lats, lons = [], []
+    for point in points:
+        try:
+            lat, lon = float(point["latitude"]), float(point["longitude"])
+        except (TypeError, KeyError, ValueError):
+            raise ValueError("Each point needs numeric latitude and longitude")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Coordinates out of range")
+        lats.append(lat)
+        lons.append(lon)
+    return lats, lons
+
+
+@app.route('/delivery_quotes', methods=['POST'])
+def delivery_quotes():
+    """Distance and delivery charge from each point to each shop.
+
+    Body: {"points": [{"latitude": .., "longitude": ..}, ...], "shop_ids": [..]}
+    (shop_ids optional: all active shops). Returns matrices with a row per
+    point and a column per entry of "shop_ids", priced like /distance_finder.
+    """
+    data = request.get_json()
+    try:
+        lats, lons = parse_points(data.get("points"))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        coords = get_shop_index().coords()  # one snapshot for the whole matrix
+        requested = data.get("shop_ids")
+        unknown = []
+        if requested:
+            positions, shop_ids = [], []
+            for shop_id in requested:
+                try:
+                    pos = coords.position(int(shop_id))
+                except (TypeError, ValueError):
+                    pos = None
+                if pos is None:
+                    unknown.append(shop_id)
+                else:
+                    positions.append(pos)
+                    shop_ids.append(coords.shop_ids[pos])
+        else:
+            positions, shop_ids = None, list(coords.shop_ids)
+
+        if not shop_ids:
+            return jsonify({'success': False, 'message': 'No active shops found', 'unknown_shop_ids': unknown}), 404
+        if len(lats) * len(shop_ids) > QUOTE_MATRIX_MAX_CELLS:
+            return jsonify({'success': False,
+                            'message': f'At most {QUOTE_MATRIX_MAX_CELLS} point-shop pairs per request'}), 400
+
+        km = coords.distance_matrix(lats, lons, positions)
+        distance_km, delivery_charge = price_distances(km)
+        return jsonify({
+            "success": True,
+            "shop_ids": shop_ids,
+            "unknown_shop_ids": unknown,
+            "distance_km": distance_km.tolist(),
+            "delivery_charge": delivery_charge.tolist()
+        })
+
+    except Exception as e:
+        print("Error in /delivery_quotes:", e)
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
 @app.route('/distance_finder', methods=['POST'])
 def distance_finder():
     data = request.get_json()
@@ -554,46 +945,18 @@ def distance_finder():
     if not items:
         return jsonify({'success': False, 'message': 'No items received'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     try:
-        # Fetch active shops
-        cursor.execute("""
-            SELECT shop_id, latitude, longitude 
-            FROM shops 
-            WHERE status = 'active' AND latitude IS NOT NULL AND longitude IS NOT NULL
-        """)
-        shops = cursor.fetchall()
-        if not shops:
+        # Determine which shop to use (from the in-memory shop index)
+        shop = select_shop(latitude, longitude, requested_shop_id)
+        if not shop:
             return jsonify({'success': False, 'message': 'No active shops found'}), 404
-
-        # Determine which shop to use
-        if requested_shop_id == 0:
-            nearest_shop = min(
-                shops,
-                key=lambda shop: calc_distance(latitude, longitude, shop[1], shop[2])
-            )
-            shop_id, shop_lat, shop_lon = nearest_shop
-        else:
-            shop_found = next((s for s in shops if s[0] == requested_shop_id), None)
-            if shop_found:
-                shop_id, shop_lat, shop_lon = shop_found
-            else:
-                nearest_shop = min(
-                    shops,
-                    key=lambda shop: calc_distance(latitude, longitude, shop[1], shop[2])
-                )
-                shop_id, shop_lat, shop_lon = nearest_shop
+        shop_id, shop_lat, shop_lon = shop
 
         # Calculate distance and delivery charge
-        distance_km = Decimal(str(calc_distance(latitude, longitude, shop_lat, shop_lon))).quantize(Decimal('0.00000001'))
-        DELIVERY_PER_KM = Decimal('10')
-        MIN_CHARGE = Decimal('20')
-        delivery_charge = max(MIN_CHARGE, (distance_km * DELIVERY_PER_KM).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        distance_km, delivery_charge = delivery_pricing(latitude, longitude, shop_lat, shop_lon)
 
         # Calculate total item cost
-        total_cost = sum(Decimal(str(i.get("cost", 0))) * int(i.get("quantity", 1)) for i in items)
+        total_cost = items_total(items)
         final_cost = (total_cost + delivery_charge).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
         return jsonify({
@@ -601,15 +964,15 @@ def distance_finder():
             "shop_id": shop_id,
             "distance_km": float(distance_km),
             "delivery_charge": float(delivery_charge),
-            "final_cost": float(final_cost)
+            "final_cost": float(final_cost),
+            # Pass back to /buy_now to skip re-pricing and lock in this price
+            "quote": issue_quote(latitude, longitude, shop_id, distance_km, delivery_charge, total_cost),
+            "quote_expires_in": QUOTE_TTL
         })
 
     except Exception as e:
         print("Error in /distance_finder:", e)
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # ==================================================
@@ -629,7 +992,7 @@ def remove_from_cart():
     if not cart_item_id and not pickle_name:
         return jsonify({"success": False, "message": "cart_item_id or pickle_name required"}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(sticky=user_key(user_id))
     cursor = conn.cursor()
 
     try:
@@ -643,6 +1006,7 @@ def remove_from_cart():
             return jsonify({"success": False, "message": "Item not found"}), 404
 
         conn.commit()
+        user_tags.invalidate(('cart', str(user_id)))
         return jsonify({"success": True, "message": "Item removed from cart"})
     except Exception as e:
         print("Error removing from cart:", e)
@@ -655,6 +1019,21 @@ def remove_from_cart():
 # ==================================================
 # 5️⃣ Fetch Cart
 # ==================================================
+def user_rows_tag(table, user_id):
+    """ETag for one user's cart or orders.
+
+    The app only inserts and deletes these rows, so the row count and the
+    highest id change whenever the list does; the query reads the user_id
+    index only and is the same in every worker. Recent tags are kept in
+    user_tags, so a repeat If-None-Match is answered without a query.
+    """
+    def compute():
+        with db_connection(read=True, sticky=user_key(user_id)) as conn:
+            count, last_id = run(conn, f'{table}_fingerprint', (user_id,)).first()
+        return fingerprint(table, user_id, count, last_id)
+    return user_tags.get_or_compute((table, str(user_id)), compute)
+
+
 @app.route('/your_cart', methods=['GET'])
 def your_cart():
     user_id = request.args.get("user_id")
@@ -662,23 +1041,18 @@ def your_cart():
     if not user_id:
         return jsonify({"status": "error", "error": "user_id missing"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     try:
-        cursor.execute("""
-    SELECT id, user_id, pickle_name, quantity, cost, added_at, shop_id
-    FROM cart
-    WHERE user_id = %s
-""", (user_id,))
-        rows = cursor.fetchall()
-        return jsonify({"status": "ok", "cart_items": rows})
+        tag = user_rows_tag('cart', user_id)
+        unchanged = not_modified(tag)
+        if unchanged:
+            return unchanged
+
+        with db_connection(read=True, sticky=user_key(user_id)) as conn:
+            rows = run(conn, 'cart_for_user', (user_id,)).rowset()
+        return tagged(jsonify({"status": "ok", "cart_items": rows}), tag)
     except Exception as e:
         print("Error fetching cart:", e)
         return jsonify({"status": "error", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 # ==================================================
 # 9️⃣ Cancel Order (Delete from Orders)
 # ==================================================
@@ -694,17 +1068,17 @@ def remove_item():
     if not order_id:
         return jsonify({"success": False, "message": "order_id missing"}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(sticky=user_key(user_id))
     cursor = conn.cursor()
 
     try:
-        cursor.execute("DELETE FROM orders WHERE id = %s AND user_id = %s", (order_id, user_id))
-
-        if cursor.rowcount == 0:
+        # Deletes the order and subtracts it from the sales rollups
+        if not remove_order(cursor, order_id, user_id):
             conn.rollback()
             return jsonify({"success": False, "message": "Order not found"}), 404
 
         conn.commit()
+        user_tags.invalidate(('orders', str(user_id)))
         return jsonify({"success": True, "message": "Order deleted successfully"})
     except Exception as e:
         print("Error deleting order:", e)
@@ -717,6 +1091,15 @@ def remove_item():
 # ==================================================
 # 6️⃣ Fetch Orders
 # ==================================================
+# Optional ?limit=&cursor= pages newest first on (created_at, id); the next
+# cursor is in "next_cursor" / X-Next-Cursor. ?from_date=&to_date= (ISO
+# dates, inclusive) and ?status= filter the history.
+def with_next_cursor(response, next_cursor):
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
 @app.route('/orders_info', methods=['GET'])
 def orders_info():
     user_id = request.args.get("user_id")
@@ -724,24 +1107,66 @@ def orders_info():
     if not user_id:
         return jsonify({"status": "error", "error": "user_id missing"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    try:
+        limit, page_cursor, filters = history_params(request.args)
+        sql, params = history_sql(
+            "SELECT id, user_id, pickles, quantity, cost, status, created_at FROM orders",
+            ["user_id = %s"], [user_id], filters, page_cursor, limit + 1 if limit else None)
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
 
     try:
-        cursor.execute("""
-            SELECT id, user_id, pickles, quantity, cost, status, created_at
-            FROM orders
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        """, (user_id,))
-        rows = cursor.fetchall()
-        return jsonify({"status": "ok", "orders": rows})
+        # Each page and filter combination is its own representation
+        tag = fingerprint(user_rows_tag('orders', user_id), limit, page_cursor, sorted(filters.items()))
+        unchanged = not_modified(tag)
+        if unchanged:
+            return unchanged
+
+        with db_connection(read=True, sticky=user_key(user_id)) as conn:
+            rows, next_cursor = split_history_page(run(conn, sql, params).rowset(), limit)
+        body = {"status": "ok", "orders": rows}
+        if limit:
+            body["next_cursor"] = next_cursor
+        return tagged(with_next_cursor(jsonify(body), next_cursor), tag)
     except Exception as e:
         print("Error fetching orders:", e)
         return jsonify({"status": "error", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+# ==================================================
+# 📊 Shop sales summary (from the daily rollups)
+# ==================================================
+@app.route('/shop_sales_summary', methods=['GET'])
+def shop_sales_summary():
+    """Totals, per-day figures and top products for ?shop_id=, optionally
+    limited to ?from_date=&to_date= (ISO dates, inclusive); ?top= sets the
+    number of products (default 10)."""
+    shop_id = request.args.get("shop_id")
+    if not shop_id:
+        return jsonify({"status": "error", "error": "shop_id is required"}), 400
+
+    auth_error = shop_auth_error(shop_id)
+    if auth_error:
+        return auth_error
+
+    try:
+        from_date, to_date = (request.args.get(k) for k in ("from_date", "to_date"))
+        for value in (from_date, to_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+        top = max(1, min(int(request.args.get("top", 10)), 100))
+    except ValueError:
+        return jsonify({"status": "error", "error": "dates must be YYYY-MM-DD and top a number"}), 400
+
+    try:
+        with db_connection(read=True) as conn:
+            cursor = conn.cursor()
+            summary = shop_summary(cursor, shop_id, from_date, to_date, top)
+            cursor.close()
+        return jsonify({"status": "ok", "shop_id": int(shop_id), **summary})
+    except Exception as e:
+        print("Error fetching sales summary:", e)
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+
 @app.route('/shop_by_email', methods=['POST'])
 def get_shop_by_email():
     try:
@@ -751,73 +1176,72 @@ def get_shop_by_email():
         if not email:
             return jsonify({"error": "Email is required"}), 400
 
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT shop_id, shop_name, image_url, address, status 
-            FROM shops 
-            WHERE email = %s
-        """, (email,))
-
-        shop = cursor.fetchone()
+        with db_connection(read=True, sticky=SHOPS) as connection:
+            shop = run(connection, 'shop_card_by_email', (email,)).first_dict()
 
         if not shop:
             return jsonify({"error": "Shop not found"}), 404
 
         return jsonify({"status": "ok", "shop": shop})
 
-    except Error as e:
+    except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/shops', methods=['GET'])
 def get_shops():
+    current = shops_cache.fresh_tag('shops')
+    unchanged = not_modified(current)
+    if unchanged:
+        return unchanged
+
+    def load():
+        with db_connection(read=True, sticky=SHOPS) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT shop_id, shop_name, image_url, address, status 
+                FROM shops
+            """)
+            shops = cursor.fetchall()
+            cursor.close()
+        return shops
+
+    def build():
+        shops, tag = shops_cache.get_or_load_tagged('shops', load)
+        return not_modified(tag) or tagged(jsonify(shops), tag)
+
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT shop_id, shop_name, image_url, address, status 
-            FROM shops
-        """)
-        shops = cursor.fetchall()
-        return jsonify(shops)
-    except Error as e:
+        return coalescer.respond(('/shops',), build, current)
+    except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # /items/<shop_name> route
 @app.route('/items/<int:shop_id>', methods=['GET'])
 def get_items_for_shop(shop_id):
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+        limit, after, stream = page_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        query = """
-            SELECT id, shop_id, name, category, image_url, price, quantity_in_stock, date_added
-            FROM products
-            WHERE shop_id = %s
-        """
-        cursor.execute(query, (shop_id,))
-        items = cursor.fetchall()
+    try:
+        if stream:
+            sql, params = keyset_sql(PRODUCT_SELECT, ["shop_id = %s"], [shop_id], after=after, limit=limit)
+            return stream_rows(sql, params, fmt=stream)
+
+        current = catalog_cache.fresh_tag(products_cache_key(shop_id, limit, after))
+        unchanged = not_modified(current)
+        if unchanged:
+            return unchanged
+
+        def build():
+            items, next_after, tag = fetch_products(shop_id, limit, after)
+            return not_modified(tag) or tagged(with_next_after(jsonify(items), next_after), tag)
 
-        return jsonify(items)
+        return coalescer.respond(('/items', shop_id, limit, after), build, current)
 
     except Exception as e:
         print("Error fetching items:", e)
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
 @app.route('/shop_orders', methods=['POST'])
 def get_shop_orders():
     try:
@@ -827,34 +1251,42 @@ def get_shop_orders():
         if not shop_id:
             return jsonify({"error": "shop_id is required"}), 400
 
-        connection = get_db_connection()
+        auth_error = shop_auth_error(shop_id)
+        if auth_error:
+            return auth_error
+
+        # Paging and filters as for /orders_info, from the body or the query string
+        try:
+            limit, page_cursor, filters = history_params({**request.args.to_dict(), **data})
+            # ✅ Join orders and users tables to get all details
+            query, params = history_sql("""
+                SELECT 
+                    o.id AS order_id,
+                    o.pickles AS ordered_product,
+                    o.quantity,
+                    o.cost,
+                    o.final_cost,
+                    o.created_at AS order_date,
+                    u.name AS user_name,
+                    u.email AS user_email
+                FROM orders o
+                JOIN users u ON o.user_id = u.id""",
+                ["o.shop_id = %s"], [shop_id], filters, page_cursor, limit + 1 if limit else None, alias='o.')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        connection = get_db_connection(read=True)
         cursor = connection.cursor(dictionary=True)
 
-        # ✅ Join orders and users tables to get all details
-        query = """
-            SELECT 
-                o.id AS order_id,
-                o.pickles AS ordered_product,
-                o.quantity,
-                o.cost,
-                o.final_cost,
-                o.created_at AS order_date,
-                u.name AS user_name,
-                u.email AS user_email
-            FROM orders o
-            JOIN users u ON o.user_id = u.id
-            WHERE o.shop_id = %s
-        """
+        cursor.execute(query, params)
+        orders, next_cursor = split_history_page(cursor.fetchall(), limit, 'order_date', 'order_id')
 
-        cursor.execute(query, (shop_id,))
-        orders = cursor.fetchall()
-
-        if not orders:
+        if not orders and page_cursor is None:
             return jsonify({"message": "No orders found for this shop_id"}), 404
 
-        return jsonify(orders), 200
+        return with_next_cursor(jsonify(orders), next_cursor), 200
 
-    except Error as e:
+    except Exception as e:
         return jsonify({"error": str(e)}), 500
 
     finally:
@@ -864,28 +1296,43 @@ def get_shop_orders():
 
 @app.route('/search_items', methods=['GET'])
 def search_items():
+    """Ranked product search from the in-memory index: exact name, name prefix,
+    word prefix, substring, then category matches. Optional ?limit= (1 to MAX_PAGE_SIZE)."""
     query = request.args.get("query", "").strip().lower()
     if not query:
         return jsonify({"status": "error", "error": "Missing search query"}), 400
-
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    try:
+        limit, _, _ = page_params({'limit': request.args.get("limit")})
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
 
     try:
-        cursor.execute("""
-            SELECT id, name, price, image_url
-            FROM products
-            WHERE LOWER(TRIM(name)) LIKE %s
-            ORDER BY name ASC
-        """, (f"%{query}%",))  # lowercase & trimmed
-        rows = cursor.fetchall()
+        rows = [
+            {"id": p["id"], "name": p["name"], "price": p["price"], "image_url": p["image_url"]}
+            for p in get_search_index().search(query, limit)
+        ]
         return jsonify({"status": "ok", "products": rows, "count": len(rows)})
     except Exception as e:
         print("❌ Error while searching products:", e)
         return jsonify({"status": "error", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+
+@app.route('/search_autocomplete', methods=['GET'])
+def search_autocomplete():
+    """Product names with a word starting with ?query=, for the search box."""
+    query = request.args.get("query", "").strip().lower()
+    if not query:
+        return jsonify({"status": "error", "error": "Missing search query"}), 400
+    try:
+        limit, _, _ = page_params({'limit': request.args.get("limit", 10)})
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    try:
+        return jsonify({"status": "ok", "suggestions": get_search_index().autocomplete(query, limit)})
+    except Exception as e:
+        print("❌ Error while autocompleting products:", e)
+        return jsonify({"status": "error", "error": str(e)}), 500
 
 
 # ==================================================
@@ -920,14 +1367,11 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("SELECT * FROM persons WHERE username = %s AND password = %s", (username, password))
-    user = cursor.fetchone()
-
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM persons WHERE username = %s AND password = %s", (username, password))
+        user = cursor.fetchone()
+        cursor.close()
 
     if user:
         return jsonify({'status': 'ok', 'user': {'id': user['id'], 'username': user['username']}})
@@ -935,5 +1379,36 @@ def login():
         return jsonify({'status': 'error', 'error': 'Invalid credentials'})
 
 
+# ==================================================
+# 🩺 DB Pool Stats
+# ==================================================
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify({"status": "ok", "pool": pool_stats(), "routing": routing_stats()})
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"status": "ok", "catalog": catalog_cache.stats(), "shops": shops_cache.stats(),
+                    "user_tags": user_tags.stats(), "coalescing": coalescer.stats()})
+
+
+# ==================================================
+# 📈 Prometheus metrics (/metrics): per-route and per-query timings
+# ==================================================
+metrics.init_app(app, extra=lambda: (
+    metrics.gauges("db_pool", "Connection pool state.", pool_stats())
+    + metrics.gauges("db_routing", "Reads by destination.", routing_stats())
+    + metrics.gauges("catalog_cache", "Catalog cache counters.", catalog_cache.stats())
+    + metrics.gauges("coalescing", "Coalesced identical reads.", coalescer.stats())
+))
+
+
 if __name__ == '__main__':
+    # Build the in-memory indexes before taking traffic
+    try:
+        get_shop_index()
+        get_search_index()
+    except Exception as e:
+        print("Error warming indexes:", e)
     app.run(host='0.0.0.0', port=8080)
@@ -0,0 +1,280 @@
+"""Async serving mode:  uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+Same URLs as `python app.py`. /proxy_image runs on the event loop: upstream
+fetches use an async httpx client, and cache file work (image_cache's and
+image_variants' shared helpers) and resizing are handed to threads / the
+resize process pool, so a slow remote site holds a coroutine instead of a
+thread. Every other route is the Flask app, run on
+bounded thread pools; the hot read routes get a pool of their own so slow
+writes cannot starve them. Requests waiting for a thread cost a coroutine,
+so one worker process can hold thousands of requests in flight while DB
+concurrency stays at the pool sizes.
+"""
+import asyncio
+import json
+import os
+from urllib.parse import parse_qsl
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+from app import app
+from image_cache import (ImageCache, UpstreamError, ImageTooLarge, get_image_cache, is_fresh, cache_headers,
+                         check_length, upstream_meta, revalidation_headers,
+                         UPSTREAM_HEADERS, IMAGE_UPSTREAM_TIMEOUT, IMAGE_FLIGHT_WAIT, IMAGE_MAX_BYTES, CHUNK_SIZE)
+from image_variants import (variant_params, render_variant, get_resize_pool, variant_key,
+                            cached_variant, store_variant)
+from search_index import get_search_index
+from shop_index import get_shop_index
+
+ASGI_READ_THREADS = int(os.environ.get('ASGI_READ_THREADS', 16))    # hot read routes
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))     # everything else
+IMAGE_UPSTREAM_ASYNC_CONNECTIONS = int(os.environ.get('IMAGE_UPSTREAM_ASYNC_CONNECTIONS', 256))
+
+# GET routes served from the hot-read pool (prefix match)
+HOT_READ_PATHS = ('/products', '/items/', '/shops', '/search_items', '/search_autocomplete',
+                  '/your_cart', '/orders_info')
+
+hot_reads = WSGIMiddleware(app, workers=ASGI_READ_THREADS)
+other_routes = WSGIMiddleware(app, workers=ASGI_WSGI_THREADS)
+
+_client = None
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: duplicates await the leader's event."""
+
+    def __init__(self):
+        self._flights = {}
+        self.collapsed = 0
+
+    def begin(self, key):
+        event = self._flights.get(key)
+        if event is not None:
+            self.collapsed += 1
+            return False, event
+        event = self._flights[key] = asyncio.Event()
+        return True, event
+
+    def end(self, key):
+        event = self._flights.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+flights = AsyncSingleFlight()
+
+
+async def _wait(event):
+    try:
+        await asyncio.wait_for(event.wait(), IMAGE_FLIGHT_WAIT)
+    except asyncio.TimeoutError:
+        pass
+
+
+# Queueing here is FIFO and cheap; httpx's own pool queue slows down badly
+# with thousands of waiters and times them out after IMAGE_UPSTREAM_TIMEOUT
+upstream_slots = asyncio.Semaphore(IMAGE_UPSTREAM_ASYNC_CONNECTIONS)
+
+
+def get_client():
+    """The shared async upstream client (created on first use in the running loop)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=UPSTREAM_HEADERS, timeout=IMAGE_UPSTREAM_TIMEOUT, follow_redirects=True,
+            limits=httpx.Limits(max_connections=IMAGE_UPSTREAM_ASYNC_CONNECTIONS))
+    return _client
+
+
+# ---------- responses ----------
+async def send_response(send, status, body=b"", headers=None, content_type=None):
+    raw = [(b"access-control-allow-origin", b"*")]
+    if content_type:
+        raw.append((b"content-type", content_type.encode('latin-1')))
+    for name, value in (headers or {}).items():
+        raw.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+    raw.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, payload):
+    await send_response(send, status, json.dumps(payload).encode() + b"\n", content_type="application/json")
+
+
+async def send_cached(send, meta, body, if_none_match):
+    if if_none_match and if_none_match.contains(meta["etag"]):
+        await send_response(send, 304, headers=cache_headers(meta["etag"]))
+    else:
+        await send_response(send, 200, body, cache_headers(meta["etag"]), meta["content_type"])
+
+
+# ---------- upstream: async fetches around image_cache's shared helpers ----------
+# Cache and file work (the helpers) runs in threads, never on the event loop.
+async def store_stream(cache, key, resp):
+    """image_cache.store_response for a streamed httpx response: (meta, body)."""
+    check_length(resp)
+    writer = await asyncio.to_thread(cache.writer, key, IMAGE_MAX_BYTES)
+    try:
+        async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+            await asyncio.to_thread(writer.write, chunk)
+        return await asyncio.to_thread(writer.commit_entry, upstream_meta(resp))
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
+
+
+async def _revalidate(cache, key, url, meta, body):
+    headers = revalidation_headers(meta)
+    if headers is None:
+        return None
+    try:
+        async with upstream_slots:
+            async with get_client().stream('GET', url, headers=headers) as resp:
+                if resp.status_code == 200:
+                    return await store_stream(cache, key, resp)
+    except httpx.HTTPError:
+        # Upstream unreachable: a stale image beats no image
+        return meta, body
+    if resp.status_code == 304:
+        return await asyncio.to_thread(cache.touch, key, meta), body
+    return meta, body
+
+
+async def cached_or_revalidated(cache, key, url):
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is None:
+        return None
+    if is_fresh(entry[0]):
+        return entry
+    return await _revalidate(cache, key, url, *entry)
+
+
+async def load_image(url):
+    """(meta, body) of the original image, from the cache or fetched and stored.
+
+    As in image_cache.load_image, concurrent misses share one fetch and
+    the flight ends once the entry is committed.
+    """
+    cache = get_image_cache()
+    key = ImageCache.key_for(url)
+    entry = await cached_or_revalidated(cache, key, url)
+    if entry is not None:
+        return entry
+
+    leader, event = flights.begin(key)
+    if not leader:
+        await _wait(event)
+        entry = await asyncio.to_thread(cache.get, key)
+        if entry is not None:
+            return entry
+        leader, event = flights.begin(key)
+    try:
+        async with upstream_slots:
+            async with get_client().stream('GET', url) as resp:
+                if resp.status_code != 200:
+                    raise UpstreamError(resp.status_code)
+                return await store_stream(cache, key, resp)
+    finally:
+        if leader:
+            flights.end(key)
+
+
+async def serve_image(send, url, if_none_match):
+    await send_cached(send, *await load_image(url), if_none_match)
+
+
+async def serve_variant(send, url, params, if_none_match):
+    cache = get_image_cache()
+    entry = await asyncio.to_thread(cached_variant, cache, url, params)
+    if entry is not None:
+        return await send_cached(send, *entry, if_none_match)
+
+    source, body = await load_image(url)
+    key = variant_key(url, source["etag"], params)
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is not None:
+        return await send_cached(send, *entry, if_none_match)
+
+    leader, event = flights.begin(key)
+    if not leader:
+        await _wait(event)
+        entry = await asyncio.to_thread(cache.get, key)
+        if entry is not None:
+            return await send_cached(send, *entry, if_none_match)
+
+    try:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(get_resize_pool(), render_variant, body, *params)
+        meta = await asyncio.to_thread(store_variant, cache, key, data, params)
+    finally:
+        if leader:
+            flights.end(key)
+    await send_cached(send, meta, data, if_none_match)
+
+
+async def proxy_image(scope, receive, send):
+    """Async /proxy_image; same parameters and responses as the Flask route."""
+    started = False
+
+    async def tracked_send(message):
+        nonlocal started
+        started = started or message["type"] == "http.response.start"
+        await send(message)
+    args = MultiDict(parse_qsl(scope.get("query_string", b"").decode('latin-1'), keep_blank_values=True))
+    headers = dict(scope.get("headers") or [])
+    if_none_match = parse_etags(headers.get(b"if-none-match", b"").decode('latin-1') or None)
+
+    url = args.get("url")
+    if not url:
+        return await send_json(send, 400, {"error": "Missing URL"})
+    try:
+        params = variant_params(args)
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+
+    try:
+        if params:
+            await serve_variant(tracked_send, url, params, if_none_match)
+        else:
+            await serve_image(tracked_send, url, if_none_match)
+    except Exception as e:
+        if started:
+            raise  # failed mid-body; the server drops the connection
+        await send_json(send, 400 if isinstance(e, (UpstreamError, ImageTooLarge)) else 500, {"error": str(e)})
+
+
+# ---------- ASGI entry point ----------
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Build the in-memory indexes before taking traffic
+            try:
+                await asyncio.to_thread(get_shop_index)
+                await asyncio.to_thread(get_search_index)
+            except Exception as e:
+                print("Error warming indexes:", e)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _client is not None:
+                await _client.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"], scope["method"]
+    if method == "GET" and path == "/proxy_image":
+        return await proxy_image(scope, receive, send)
+    if method == "GET" and path.startswith(HOT_READ_PATHS):
+        return await hot_reads(scope, receive, send)
+    return await other_routes(scope, receive, send)
@@ -0,0 +1,69 @@
+"""Password hashing off the request threads, and signed shop session tokens.
+
+bcrypt runs on a small dedicated executor so a burst of logins cannot
+occupy every request thread. After login a shop gets a signed token;
+owner endpoints verify it with an HMAC check instead of a password hash.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app, request, jsonify
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+SHOP_SESSION_TTL = int(os.environ.get('SHOP_SESSION_TTL', 7 * 24 * 3600))  # seconds
+# Until every client sends tokens, requests without one are still let through
+SHOP_AUTH_REQUIRED = os.environ.get('SHOP_AUTH_REQUIRED', '0') == '1'
+
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+
+
+def hash_password(password):
+    return _bcrypt_pool.submit(
+        lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    ).result()
+
+
+def check_password(password, hashed):
+    """hashed as read back from the shops table: text, or bytes from a binary column."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    return _bcrypt_pool.submit(bcrypt.checkpw, password.encode('utf-8'), hashed).result()
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='shop-session')
+
+
+def issue_shop_token(shop_id):
+    return _serializer().dumps({"shop_id": shop_id})
+
+
+def verify_shop_token(token):
+    """The token's claims, or None if it is invalid or expired."""
+    try:
+        return _serializer().loads(token, max_age=SHOP_SESSION_TTL)
+    except BadSignature:
+        return None
+
+
+def shop_auth_error(shop_id):
+    """None if this request may act for shop_id, else an error response.
+
+    Reads "Authorization: Bearer <token>" as issued by /shop_login.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header:
+        if SHOP_AUTH_REQUIRED:
+            return jsonify({"status": "error", "message": "Missing session token"}), 401
+        return None
+
+    scheme, _, token = header.partition(' ')
+    claims = verify_shop_token(token) if scheme.lower() == 'bearer' else None
+    if claims is None:
+        return jsonify({"status": "error", "message": "Invalid or expired session token"}), 401
+    if str(claims["shop_id"]) != str(shop_id):
+        return jsonify({"status": "error", "message": "Token does not belong to this shop"}), 403
+    return None
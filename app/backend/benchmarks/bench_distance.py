@@ -0,0 +1,64 @@
+"""Micro-benchmark: per-shop calc_distance loop vs the vectorized ShopCoords engine.
+
+Run from app/backend:  python benchmarks/bench_distance.py
+"""
+import os
+import random
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import ShopCoords, calc_distance  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 20
+
+
+def delivery_charge(km):
+    distance_km = Decimal(str(km)).quantize(Decimal('0.00000001'))
+    return max(Decimal('20'), (distance_km * Decimal('10')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = random.Random(42)
+    points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(QUERIES)]
+    print(f"{'shops':>8} {'scalar ms':>10} {'vector ms':>10} {'speedup':>8} {'charge mismatches':>18}")
+
+    for n in SIZES:
+        shops = [(i, rng.uniform(8, 35), rng.uniform(68, 97)) for i in range(n)]
+        coords = ShopCoords(shops)
+
+        def scalar():
+            for lat, lon in points:
+                [calc_distance(lat, lon, s[1], s[2]) for s in shops]
+
+        def vector():
+            for lat, lon in points:
+                coords.distances_from(lat, lon)
+
+        t_scalar = best_of(scalar) / QUERIES
+        t_vector = best_of(vector) / QUERIES
+
+        lat, lon = points[0]
+        fast = coords.distances_from(lat, lon)
+        mismatches = sum(
+            delivery_charge(fast[i]) != delivery_charge(calc_distance(lat, lon, s[1], s[2]))
+            for i, s in enumerate(shops)
+        )
+        print(f"{n:>8} {t_scalar * 1000:>10.3f} {t_vector * 1000:>10.3f} "
+              f"{t_scalar / t_vector:>7.1f}x {mismatches:>18}")
+
+
+if __name__ == '__main__':
+    main()
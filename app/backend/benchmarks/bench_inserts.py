@@ -0,0 +1,75 @@
+"""Benchmark: per-row INSERTs vs insert_many for checkout-sized batches.
+
+Needs a reachable MySQL with the app schema (DB_* environment variables,
+see db.py). Rows go into a TEMPORARY copy of the orders table, so nothing
+is left behind.
+
+Run from app/backend:  python benchmarks/bench_inserts.py
+"""
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import db_connection, insert_many  # noqa: E402
+
+SIZES = [1, 10, 100]
+RUNS = 30
+
+HEAD = """
+    INSERT INTO bench_orders (
+        user_id, pickles, quantity, cost, status, created_at,
+        latitude, longitude, distance, delivery_charge, final_cost, shop_id
+    ) VALUES """
+ROW = "(%s, %s, %s, %s, 'Ordered', NOW(), %s, %s, %s, %s, %s, %s)"
+
+
+def make_rows(n):
+    return [
+        (1, f"item-{i}", 2, Decimal('21.00'), Decimal('17.43000000'), Decimal('78.36000000'),
+         Decimal('1.53683524'), Decimal('20.00'), Decimal('41.00'), 1)
+        for i in range(n)
+    ]
+
+
+def per_row(conn, cursor, rows):
+    for row in rows:
+        cursor.execute(HEAD + ROW, row)
+    conn.commit()
+
+
+def batched(conn, cursor, rows):
+    insert_many(cursor, HEAD, ROW, rows)
+    conn.commit()
+
+
+def measure(conn, cursor, fn, rows):
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(conn, cursor, rows)
+        samples.append(time.perf_counter() - start)
+        cursor.execute("DELETE FROM bench_orders")
+        conn.commit()
+    return statistics.median(samples) * 1000
+
+
+def main():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE bench_orders LIKE orders")
+        print(f"{'items':>6} {'per-row ms':>11} {'batched ms':>11} {'speedup':>8}")
+        for n in SIZES:
+            rows = make_rows(n)
+            t_row = measure(conn, cursor, per_row, rows)
+            t_batch = measure(conn, cursor, batched, rows)
+            print(f"{n:>6} {t_row:>11.3f} {t_batch:>11.3f} {t_row / t_batch:>7.1f}x")
+        cursor.execute("DROP TEMPORARY TABLE bench_orders")
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Micro-benchmark: encoding 100k cart/order-style rows as a JSON response body.
+
+Compares Flask's default provider on dict rows with RowJSONProvider on dict
+rows (orjson when installed) and on a RowSet of cursor tuples.
+
+Run from app/backend:  python benchmarks/bench_json.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import RowJSONProvider, RowSet  # noqa: E402
+
+ROWS = 100_000
+COLUMNS = ("id", "user_id", "pickle_name", "quantity", "cost", "added_at", "shop_id")
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    start = datetime(2024, 1, 1, 9, 30)
+    rows = [(i, i % 997, f"Mango pickle {i % 50}", i % 5 + 1, Decimal(f"{i % 400}.50"),
+             start + timedelta(minutes=i), i % 13) for i in range(ROWS)]
+
+    app = Flask(__name__)
+    flask_json = DefaultJSONProvider(app)
+    row_json = RowJSONProvider(app)
+    compact = {"separators": (",", ":")}
+
+    cases = [
+        ("flask default, dict rows", lambda: flask_json.dumps(
+            {"status": "ok", "cart_items": [dict(zip(COLUMNS, r)) for r in rows]}, **compact)),
+        (f"RowJSONProvider, dict rows{' (orjson)' if row_json.fast else ''}", lambda: row_json.dumps(
+            {"status": "ok", "cart_items": [dict(zip(COLUMNS, r)) for r in rows]}, **compact)),
+        ("RowJSONProvider, RowSet", lambda: row_json.dumps(
+            {"status": "ok", "cart_items": RowSet(COLUMNS, rows)}, **compact)),
+    ]
+
+    expected = json.loads(cases[0][1]())
+    baseline = None
+    print(f"{ROWS} rows")
+    print(f"{'encoder':<40} {'ms':>8} {'speedup':>8} {'same JSON':>10}")
+    for name, fn in cases:
+        elapsed = best_of(fn)
+        baseline = baseline or elapsed
+        same = json.loads(fn()) == expected
+        print(f"{name:<40} {elapsed * 1000:8.1f} {baseline / elapsed:7.2f}x {str(same):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark: text-protocol cursors vs the prepared statements in statements.py.
+
+Runs each registered hot statement (plus a keyset products page) many
+times both ways on one pooled connection and prints the median time per
+call. Needs a reachable MySQL with the app schema and some rows (DB_*
+environment variables, see db.py); load_test.py --backend mysql can seed
+one. --backend sqlite runs against the stand-in, which has no prepared
+statements, so it only checks that the script works.
+
+Run from app/backend:  python benchmarks/bench_prepared.py [--calls 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import metrics  # noqa: E402
+import sqlite_db  # noqa: E402
+import statements  # noqa: E402
+from paging import keyset_sql  # noqa: E402
+
+ROUNDS = 5
+
+
+def sample_params(conn):
+    """Parameters for every benchmarked statement, taken from existing rows."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id) FROM products")
+    product_id = cursor.fetchone()[0]
+    cursor.execute("SELECT user_id FROM cart ORDER BY id LIMIT 1")
+    row = cursor.fetchone()
+    user_id = row[0] if row else 1
+    cursor.execute("SELECT email FROM shops ORDER BY shop_id LIMIT 1")
+    email = cursor.fetchone()[0]
+    cursor.close()
+    if product_id is None:
+        sys.exit("no products in the database; seed it first")
+
+    cases = {
+        'product_for_index': (product_id,),
+        'cart_for_user': (user_id,),
+        'cart_fingerprint': (user_id,),
+        'orders_fingerprint': (user_id,),
+        'shop_by_email': (email,),
+        'shop_card_by_email': (email,),
+        'shop_email_taken': (email,),
+    }
+    page_sql, page_params = keyset_sql(
+        "SELECT id, shop_id, name, category, image_url, price, quantity_in_stock, date_added FROM products",
+        after=product_id, limit=21)
+    cases['products page (keyset)'] = (page_sql, tuple(page_params))
+    return cases
+
+
+def text_call(conn, sql, params):
+    cursor = conn.driver_connection.cursor()
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    cursor.close()
+
+
+def prepared_call(conn, sql, params):
+    statements.run(conn, sql, params)
+
+
+def measure(conn, fn, sql, params, calls):
+    """Median microseconds per call over ROUNDS rounds."""
+    fn(conn, sql, params)  # warm up (prepares the statement)
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn(conn, sql, params)
+        samples.append((time.perf_counter() - start) / calls)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql')
+    parser.add_argument('--calls', type=int, default=2000, help='calls per round')
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite':
+        path = os.path.join(tempfile.mkdtemp(prefix='taaja-bench-'), 'bench.sqlite3')
+        sqlite_db.create_schema(path)
+        db.use_connection_factory(sqlite_db.factory(path))
+        with db.db_connection() as conn:
+            cursor = conn.cursor()
+            sqlite_db.seed(cursor, 20, 20, 200, 500, 1000)
+            conn.commit()
+            cursor.close()
+
+    metrics.METRICS_ENABLED = False  # time the driver only, on both sides
+    with db.db_connection() as conn:
+        cases = sample_params(conn)
+        print(f"{'statement':<26} {'text µs':>9} {'prepared µs':>12} {'speedup':>8}")
+        for name, params in cases.items():
+            sql = statements.STATEMENTS.get(name)
+            if sql is None:
+                sql, params = params
+            t_text = measure(conn, text_call, sql, params, args.calls)
+            t_prep = measure(conn, prepared_call, sql, params, args.calls)
+            print(f"{name:<26} {t_text:>9.1f} {t_prep:>12.1f} {t_text / t_prep:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""Load test: throughput and p50/p95/p99 latency per route, saved as JSON.
+
+Seeds synthetic shops, products, users, carts and orders, serves the app
+in-process and drives each route with concurrent HTTP clients (client
+threads run in separate processes so they don't share the server's GIL).
+
+Run from app/backend:
+    python benchmarks/load_test.py                       # SQLite stand-in, default scale
+    python benchmarks/load_test.py --scale large --concurrency 64
+    python benchmarks/load_test.py --backend mysql       # seeds the DB_* database
+    python benchmarks/load_test.py --compare benchmarks/results/load-abc1234.json
+
+Results go to benchmarks/results/load-<commit>.json unless --out is given.
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+import db  # noqa: E402
+import sqlite_db  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+SCALES = {
+    # shops, products per shop, users, cart items, orders
+    'small': (20, 20, 200, 500, 1000),
+    'medium': (100, 50, 2000, 5000, 20000),
+    'large': (500, 100, 20000, 50000, 200000),
+}
+ROUTES = ['products', 'search_items', 'distance_finder', 'buy_now', 'add_to_cart', 'shop_orders']
+
+
+# ---------- requests per route ----------
+def _items(rng, products, n, with_shop=False):
+    items = []
+    for shop_id, name, price in rng.sample(products, n):
+        item = {"pickle_name": name, "quantity": rng.randrange(1, 4), "cost": price}
+        if with_shop:
+            item["shop_id"] = shop_id
+        items.append(item)
+    return items
+
+
+def _location(rng):
+    return (round(sqlite_db.CENTER[0] + rng.uniform(-sqlite_db.SPREAD, sqlite_db.SPREAD), 6),
+            round(sqlite_db.CENTER[1] + rng.uniform(-sqlite_db.SPREAD, sqlite_db.SPREAD), 6))
+
+
+def make_request(route, rng, data):
+    """(method, path, json body or None) for one call to route."""
+    products, users, shops = data["products"], data["user_ids"], data["shop_ids"]
+    if route == 'products':
+        after = rng.choice([None, rng.randrange(len(products))])
+        return 'GET', '/products?limit=50' + (f'&after={after}' if after else ''), None
+    if route == 'search_items':
+        return 'GET', f'/search_items?query={rng.choice(sqlite_db.WORDS)[:rng.randrange(3, 6)]}&limit=20', None
+    if route == 'distance_finder':
+        lat, lon = _location(rng)
+        return 'POST', '/distance_finder', {"latitude": lat, "longitude": lon,
+                                            "items": _items(rng, products, rng.randrange(1, 4))}
+    if route == 'buy_now':
+        lat, lon = _location(rng)
+        return 'POST', '/buy_now', {"user_id": rng.choice(users), "latitude": lat, "longitude": lon,
+                                    "items": _items(rng, products, rng.randrange(1, 4))}
+    if route == 'add_to_cart':
+        return 'POST', '/add_to_cart', {"user_id": rng.choice(users),
+                                        "items": _items(rng, products, rng.randrange(1, 4), with_shop=True)}
+    if route == 'shop_orders':
+        return 'POST', '/shop_orders', {"shop_id": rng.choice(shops)}
+    raise ValueError(f"unknown route {route}")
+
+
+# ---------- client processes ----------
+def drive(base_url, calls, threads):
+    """Runs in a client process: make the calls from `threads` threads; [(seconds, status)]."""
+    results = []
+    lock = threading.Lock()
+    position = iter(range(len(calls)))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            method, path, body = calls[i]
+            start = time.perf_counter()
+            try:
+                status = session.request(method, base_url + path, json=body, timeout=60).status_code
+            except requests.RequestException:
+                status = 0
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((elapsed, status))
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return results
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest rank: the smallest value with at least pct% of the values at or below it
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def run_route(executor, processes, base_url, route, rng, data, total, concurrency):
+    calls = [make_request(route, rng, data) for _ in range(total)]
+    shares = [calls[i::processes] for i in range(processes)]
+    threads = [max(1, concurrency // processes + (i < concurrency % processes)) for i in range(processes)]
+
+    start = time.perf_counter()
+    futures = [executor.submit(drive, base_url, share, t) for share, t in zip(shares, threads) if share]
+    results = [r for f in futures for r in f.result()]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sum(n for s, n in statuses.items() if s.startswith('2'))
+    return {
+        "requests": len(results),
+        "errors": len(results) - ok,
+        "statuses": statuses,
+        "seconds": round(wall, 3),
+        "rps": round(len(results) / wall, 1) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+# ---------- setup ----------
+def prepare_database(args, scale):
+    shops, per_shop, users, carts, orders = scale
+    if args.backend == 'sqlite':
+        path = args.db or os.path.join(tempfile.mkdtemp(prefix='taaja-bench-'), 'bench.sqlite3')
+        sqlite_db.create_schema(path)
+        db.use_connection_factory(sqlite_db.factory(path))
+
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        if args.no_seed:
+            data = existing_data(cursor)
+        else:
+            data = sqlite_db.seed(cursor, shops, per_shop, users, carts, orders, random.Random(args.seed))
+        conn.commit()
+        cursor.close()
+    return data
+
+
+def existing_data(cursor):
+    cursor.execute("SELECT shop_id, name, price FROM products")
+    products = [(r[0], r[1], float(r[2])) for r in cursor.fetchall()]
+    cursor.execute("SELECT shop_id FROM shops")
+    shop_ids = [r[0] for r in cursor.fetchall()]
+    cursor.execute("SELECT id FROM users")
+    user_ids = [r[0] for r in cursor.fetchall()]
+    return {"products": products, "shop_ids": shop_ids, "user_ids": user_ids}
+
+
+def serve_in_thread():
+    from werkzeug.serving import make_server
+
+    from app import app
+    from search_index import get_search_index
+    from shop_index import get_shop_index
+
+    get_shop_index()
+    get_search_index()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report, baseline=None):
+    print(f"{'route':<16} {'reqs':>6} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + (f" {'rps Δ':>8} {'p95 Δ':>8}" if baseline else ""))
+    for route, r in report["routes"].items():
+        line = (f"{route:<16} {r['requests']:>6} {r['errors']:>5} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        old = (baseline or {}).get("routes", {}).get(route)
+        if old:
+            line += f" {_change(old['rps'], r['rps']):>8} {_change(old['p95_ms'], r['p95_ms']):>8}"
+        print(line)
+
+
+def _change(old, new):
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--db', help='SQLite file to use (default: a new temp file)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--no-seed', action='store_true', help='use the rows already in the database')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--requests', type=int, default=500, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads in total')
+    parser.add_argument('--client-processes', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and requests')
+    parser.add_argument('--out', help='JSON results file')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    routes = [r for r in args.routes.split(',') if r]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    scale = SCALES[args.scale]
+    data = prepare_database(args, scale)
+    server, base_url = serve_in_thread()
+    rng = random.Random(args.seed)
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "scale": dict(zip(("shops", "products_per_shop", "users", "cart_items", "orders"), scale)),
+        "requests_per_route": args.requests,
+        "concurrency": args.concurrency,
+        "routes": {},
+    }
+    processes = max(1, min(args.client_processes, args.concurrency))
+    try:
+        # spawn: the server's threads and DB connections must not be forked
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for route in routes:
+                report["routes"][route] = run_route(executor, processes, base_url, route, rng, data,
+                                                    args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {out}")
+
+
+if __name__ == '__main__':
+    main()
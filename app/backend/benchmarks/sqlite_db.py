@@ -0,0 +1,229 @@
+"""SQLite stand-in for the MySQL database, for benchmarks without a server.
+
+connect() returns objects with the parts of the mysql.connector API the
+app uses (dictionary cursors, %s placeholders, NOW(), FOR UPDATE,
+ON DUPLICATE KEY UPDATE, lastrowid, rowcount, fetchmany, ping,
+in_transaction). Plug it in with
+db.use_connection_factory(sqlite_db.factory(path)).
+
+SQLite allows one writer at a time, so write-route numbers measured on it
+say more about SQLite than about the app; read routes compare well.
+"""
+import glob
+import os
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sqlite3.register_adapter(Decimal, str)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shops (
+    shop_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    shop_name TEXT, shop_type TEXT, owner_name TEXT, contact_number TEXT,
+    email TEXT UNIQUE, address TEXT, city TEXT, state TEXT, postal_code TEXT,
+    country TEXT, opening_time TEXT, closing_time TEXT, status TEXT, image_url TEXT,
+    latitude REAL, longitude REAL, password TEXT, created_at TEXT, updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    shop_id INTEGER, name TEXT, category TEXT, price NUMERIC,
+    quantity_in_stock INTEGER, image_url TEXT, date_added TEXT
+);
+CREATE INDEX IF NOT EXISTS products_shop ON products (shop_id, id);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, email TEXT
+);
+CREATE TABLE IF NOT EXISTS cart (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, pickle_name TEXT, quantity INTEGER, cost NUMERIC,
+    added_at TEXT DEFAULT CURRENT_TIMESTAMP, shop_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS cart_user ON cart (user_id);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, pickles TEXT, quantity INTEGER, cost NUMERIC, status TEXT,
+    created_at TEXT, latitude NUMERIC, longitude NUMERIC, distance NUMERIC,
+    delivery_charge NUMERIC, final_cost NUMERIC, shop_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS orders_shop ON orders (shop_id, created_at, id);
+"""
+
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+_FOR_UPDATE = re.compile(r"\s+FOR UPDATE\b", re.IGNORECASE)  # SQLite locks the whole database
+_ON_DUPLICATE = re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.IGNORECASE)
+_VALUES_OF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+
+
+def translate(sql):
+    """MySQL-flavoured SQL as used by the app -> SQLite."""
+    sql = _FOR_UPDATE.sub("", _NOW.sub("CURRENT_TIMESTAMP", sql))
+    if _ON_DUPLICATE.search(sql):
+        sql = _VALUES_OF.sub(r"excluded.\1", _ON_DUPLICATE.sub("ON CONFLICT DO UPDATE SET", sql))
+    return sql.replace("%s", "?")
+
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cur = conn.raw.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def execute(self, sql, params=()):
+        self._cur.execute(translate(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(translate(sql), [tuple(p) for p in seq])
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, r)) for r in rows]
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        return None if row is None else self._rows([row])[0]
+
+    def fetchall(self):
+        return self._rows(self._cur.fetchall())
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cur.fetchmany(size))
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    unread_result = False
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.raw.execute("PRAGMA journal_mode=WAL")
+        self.raw.execute("PRAGMA synchronous=NORMAL")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.raw.close()
+
+
+def factory(path):
+    """A connect(**config) callable for db.use_connection_factory."""
+    def connect(**config):
+        return Connection(path)
+    return connect
+
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def create_schema(path):
+    """The base tables plus every migrations/*.sql file (their DDL is valid SQLite too)."""
+    raw = sqlite3.connect(path)
+    raw.executescript(SCHEMA)
+    for migration in sorted(glob.glob(os.path.join(MIGRATIONS, '*.sql'))):
+        with open(migration) as f:
+            raw.executescript(f.read())
+    raw.close()
+
+
+# ---------- synthetic data ----------
+WORDS = ["mango", "lemon", "garlic", "chilli", "ginger", "tomato", "gongura", "amla",
+         "carrot", "mixed", "sweet", "hot", "tangy", "classic", "homemade", "spicy"]
+CATEGORIES = ["veg pickle", "non-veg pickle", "sweet pickle", "powder", "snack"]
+CENTER = (17.385, 78.4867)   # synthetic shops are scattered around this point
+SPREAD = 0.5                 # degrees
+
+
+def seed(cursor, shops=50, products_per_shop=40, users=1000, cart_items=2000, orders=5000, rng=None):
+    """Insert synthetic rows through any app-style cursor (SQLite stand-in or MySQL)."""
+    from db import insert_many
+
+    rng = rng or random.Random(1)
+    now = datetime(2024, 1, 1)
+
+    shop_rows = [(
+        f"Shop {i}", "pickles", f"Owner {i}", f"9{i:09d}", f"shop{i}@example.com",
+        f"{i} Market Road", "Hyderabad", "Telangana", "500001", "India", "09:00:00", "21:00:00",
+        "active", f"https://img.example.com/shop/{i}.jpg",
+        round(CENTER[0] + rng.uniform(-SPREAD, SPREAD), 6), round(CENTER[1] + rng.uniform(-SPREAD, SPREAD), 6),
+        "x", str(now),
+    ) for i in range(shops)]
+    insert_many(cursor, """INSERT INTO shops (shop_name, shop_type, owner_name, contact_number, email,
+        address, city, state, postal_code, country, opening_time, closing_time, status, image_url,
+        latitude, longitude, password, created_at) VALUES """, "(" + ", ".join(["%s"] * 18) + ")", shop_rows)
+    cursor.execute("SELECT shop_id FROM shops")
+    shop_ids = [r[0] if not isinstance(r, dict) else r["shop_id"] for r in cursor.fetchall()]
+
+    product_rows = []
+    for shop_id in shop_ids:
+        for _ in range(products_per_shop):
+            name = " ".join(rng.sample(WORDS, 2)) + " pickle"
+            product_rows.append((shop_id, name.title(), rng.choice(CATEGORIES),
+                                 Decimal(rng.randrange(5000, 90000)) / 100, rng.randrange(0, 200),
+                                 f"https://img.example.com/p/{len(product_rows)}.jpg",
+                                 str(now - timedelta(days=rng.randrange(365)))))
+    insert_many(cursor, """INSERT INTO products (shop_id, name, category, price, quantity_in_stock,
+        image_url, date_added) VALUES """, "(%s, %s, %s, %s, %s, %s, %s)", product_rows)
+
+    insert_many(cursor, "INSERT INTO users (name, email) VALUES ", "(%s, %s)",
+                [(f"User {i}", f"user{i}@example.com") for i in range(users)])
+    cursor.execute("SELECT id FROM users")
+    user_ids = [r[0] if not isinstance(r, dict) else r["id"] for r in cursor.fetchall()]
+
+    insert_many(cursor, "INSERT INTO cart (user_id, pickle_name, quantity, cost, shop_id) VALUES ",
+                "(%s, %s, %s, %s, %s)",
+                [(rng.choice(user_ids), p[1], rng.randrange(1, 4), p[3], p[0])
+                 for p in (rng.choice(product_rows) for _ in range(cart_items))])
+
+    order_rows = []
+    for _ in range(orders):
+        p = rng.choice(product_rows)
+        qty = rng.randrange(1, 4)
+        order_rows.append((rng.choice(user_ids), p[1], qty, p[3] * qty, "Ordered",
+                           str(now + timedelta(minutes=len(order_rows))), CENTER[0], CENTER[1],
+                           Decimal("3.5"), Decimal("35.00"), p[3] * qty + Decimal("35.00"), p[0]))
+    insert_many(cursor, """INSERT INTO orders (user_id, pickles, quantity, cost, status, created_at,
+        latitude, longitude, distance, delivery_charge, final_cost, shop_id) VALUES """,
+                "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", order_rows)
+
+    return {"shop_ids": shop_ids, "user_ids": user_ids,
+            "products": [(p[0], p[1], float(p[3])) for p in product_rows]}
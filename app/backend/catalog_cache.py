@@ -0,0 +1,138 @@
+"""Read-through cache for product listings.
+
+Entries are either global (the /products listing) or belong to one shop
+(/items/<shop_id>, /ownerproducts). A product write invalidates that shop's
+entries and the global ones; a generation counter stops a load that raced
+with a write from putting stale rows back. Other worker processes see
+writes once their entries expire (CATALOG_CACHE_TTL).
+
+Every stored entry gets a tag derived from its content, usable as an
+ETag: equal rows give equal tags in every worker and across reloads, so a
+client holding the tag has exactly the rows the entry holds.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from etags import fingerprint
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 30))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 2048))
+
+GLOBAL = None  # shop_id used for catalog-wide entries
+
+
+class CatalogCache:
+    def __init__(self, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, shop_id, value, tag), LRU first
+        self._by_shop = {}             # shop_id -> set(keys)
+        self._generation = {}          # shop_id -> write counter
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def get_or_load(self, key, loader, shop_id=GLOBAL):
+        """Cached value for key, or loader() stored under the shop's entries."""
+        return self.get_or_load_tagged(key, loader, shop_id)[0]
+
+    def get_or_load_tagged(self, key, loader, shop_id=GLOBAL):
+        """(value, tag); tag is None when a concurrent write kept the value out of the cache."""
+        shop_id = _shop_key(shop_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], entry[3]
+            self.misses += 1
+            generation = (self._generation.get(shop_id, 0), self._generation.get(GLOBAL, 0))
+
+        value = loader()
+        tag = content_tag(value)  # hashed outside the lock
+
+        with self._lock:
+            if generation == (self._generation.get(shop_id, 0), self._generation.get(GLOBAL, 0)):
+                self._store(key, shop_id, value, tag, now + self.ttl)
+                return value, tag
+        return value, None
+
+    def fresh_tag(self, key):
+        """Tag of the live entry for key, without loading anything."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[3]
+        return None
+
+    def _store(self, key, shop_id, value, tag, expires_at):
+        self._discard(key)
+        self._entries[key] = (expires_at, shop_id, value, tag)
+        self._by_shop.setdefault(shop_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old_key = next(iter(self._entries))
+            self._discard(old_key)
+            self.evictions += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_shop.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_shop[entry[1]]
+
+    def invalidate_shop(self, shop_id):
+        """Drop one shop's entries plus the catalog-wide ones after a product write."""
+        shop_id = _shop_key(shop_id)
+        with self._lock:
+            self.invalidations += 1
+            for sid in {shop_id, GLOBAL}:
+                self._generation[sid] = self._generation.get(sid, 0) + 1
+                for key in list(self._by_shop.get(sid, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += 1
+            self._entries.clear()
+            self._by_shop.clear()
+            for sid in set(self._generation) | {GLOBAL}:
+                self._generation[sid] = self._generation.get(sid, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+def content_tag(value):
+    """Stable tag for a cached value: RowSets, dicts, lists and tuples of plain values."""
+    return fingerprint(_canonical(value))
+
+
+def _canonical(value):
+    if hasattr(value, 'columns') and hasattr(value, 'rows'):  # RowSet
+        return ('rows', tuple(value.columns), tuple(tuple(row) for row in value.rows))
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    return value
+
+
+def _shop_key(shop_id):
+    return GLOBAL if shop_id is None else int(shop_id)
+
+
+catalog_cache = CatalogCache()
+# The /shops listing; cleared whenever a shop is registered or edited
+shops_cache = CatalogCache()
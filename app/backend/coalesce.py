@@ -0,0 +1,142 @@
+"""Request coalescing for hot, identical catalog reads.
+
+When many clients ask for the same page at once (/products, /shops,
+/items/<shop_id>), the first request builds the response: the query and
+the JSON serialization. Requests with the same key that arrive while it
+is in flight wait for it and are sent the same body bytes. Each follower
+still gets its own Response object, so CORS and metrics hooks run as
+usual.
+
+A finished response is also kept for COALESCE_GRACE seconds. It is only
+reused while its ETag is still the cache's current tag for the page, so
+the grace window never serves rows that a write has replaced. Responses
+without an ETag, errors and streamed bodies are never shared.
+COALESCE_ENABLED=0 turns the whole thing off.
+"""
+import os
+import threading
+import time
+
+from flask import Response
+
+from etags import not_modified
+
+COALESCE_ENABLED = os.environ.get('COALESCE_ENABLED', '1') == '1'
+COALESCE_GRACE = float(os.environ.get('COALESCE_GRACE', 0.05))
+COALESCE_WAIT = float(os.environ.get('COALESCE_WAIT', 10))  # followers give up and build their own
+COALESCE_MAX_ENTRIES = int(os.environ.get('COALESCE_MAX_ENTRIES', 1024))
+
+
+class _Flight:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # (status, headers, body) when shareable
+
+
+class Coalescer:
+    def __init__(self, grace=COALESCE_GRACE, wait=COALESCE_WAIT, max_entries=COALESCE_MAX_ENTRIES):
+        self.grace = grace
+        self.wait = wait
+        self.max_entries = max_entries
+        self.enabled = COALESCE_ENABLED
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight
+        self._recent = {}   # key -> (expires_at, etag, result)
+        self.leaders = self.collapsed = self.grace_hits = self.fallbacks = 0
+
+    def respond(self, key, build, current_tag=None):
+        """build()'s response for key, shared with identical concurrent requests.
+
+        current_tag is the cache's tag for the page right now (None if not
+        cached); a recent response is reused only while it carries that tag.
+        """
+        if not self.enabled:
+            return build()
+
+        with self._lock:
+            recent = self._recent.get(key)
+            if (recent is not None and current_tag is not None
+                    and recent[1] == current_tag and recent[0] > time.monotonic()):
+                self.grace_hits += 1
+                return _response(recent[2])
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            if flight.done.wait(self.wait) and flight.result is not None:
+                return _response(flight.result)
+            with self._lock:
+                self.fallbacks += 1
+            return build()
+
+        response = None
+        try:
+            response = build()
+            return response
+        finally:
+            self._land(key, flight, response)
+
+    def _land(self, key, flight, response):
+        """Publish the leader's response (if shareable) and release the followers."""
+        result = _shareable(response)
+        etag = result and dict(result[1]).get('ETag')
+        if not etag:
+            result = None  # untagged: may not be the same for everyone, so followers build their own
+        with self._lock:
+            self._flights.pop(key, None)
+            if result is not None and self.grace > 0:
+                if len(self._recent) >= self.max_entries:
+                    self._prune()
+                self._recent[key] = (time.monotonic() + self.grace, etag.strip('"'), result)
+        flight.result = result
+        flight.done.set()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self._recent.items() if entry[0] <= now]:
+            del self._recent[key]
+        if len(self._recent) >= self.max_entries:
+            self._recent.clear()
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "grace_seconds": self.grace,
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "collapsed": self.collapsed,
+                "grace_hits": self.grace_hits,
+                "fallbacks": self.fallbacks,
+            }
+
+
+def _shareable(response):
+    """(status, headers, body) of a complete 200 response, else None (_land also needs an ETag)."""
+    if not isinstance(response, Response) or response.status_code != 200 or response.is_streamed:
+        return None
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length']
+    return response.status_code, headers, response.get_data()
+
+
+def _response(result):
+    status, headers, body = result
+    etag = dict(headers).get('ETag')
+    unchanged = not_modified(etag.strip('"')) if etag else None
+    if unchanged:
+        return unchanged
+    return Response(body, status=status, headers=headers)
+
+
+coalescer = Coalescer()
@@ -0,0 +1,83 @@
+"""Strong ETags and If-None-Match handling for list endpoints."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Seconds a per-user tag (cart, orders) is trusted without a query. This
+# process's writes drop it at once; other workers' writes show after this.
+USER_TAG_TTL = float(os.environ.get('USER_TAG_TTL', 2))
+USER_TAG_MAX_ENTRIES = int(os.environ.get('USER_TAG_MAX_ENTRIES', 10000))
+
+
+def fingerprint(*parts):
+    """Short stable tag from a few cheap version values."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def not_modified(tag):
+    """A 304 response if the client already has this version, else None."""
+    if tag and request.if_none_match.contains(tag):
+        response = Response(status=304)
+        response.set_etag(tag)
+        return response
+    return None
+
+
+def tagged(response, tag):
+    if tag:
+        response.set_etag(tag)
+    return response
+
+
+class RecentTags:
+    """Tags computed in the last ttl seconds, so a matching If-None-Match costs no query."""
+
+    def __init__(self, ttl=USER_TAG_TTL, max_entries=USER_TAG_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, tag), LRU first
+        self._writes = 0               # bumped by invalidate(); a tag computed across one isn't kept
+        self.hits = self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            writes = self._writes
+
+        tag = compute()
+
+        with self._lock:
+            if writes == self._writes and self.ttl > 0:
+                self._entries.pop(key, None)
+                self._entries[key] = (time.monotonic() + self.ttl, tag)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return tag
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._writes += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_tags = RecentTags()
@@ -0,0 +1,493 @@
+"""Cache and pooled upstream fetching for /proxy_image.
+
+Fetched images go into an on-disk store with LRU eviction by total bytes,
+fronted by a small in-memory hot tier. Stale entries are revalidated with
+ETag / Last-Modified. A miss is fetched into the cache first and then
+served, so upstream connections are held only for the upstream transfer,
+never for a slow client's download. The upstream body is streamed to
+disk in chunks; one larger than IMAGE_MAX_BYTES is abandoned (ImageTooLarge)
+and its partial file removed. Concurrent misses for the same URL
+wait for a single upstream fetch, and each upstream host gets at most
+IMAGE_UPSTREAM_PER_HOST requests at a time (UpstreamBusy after
+IMAGE_UPSTREAM_POOL_TIMEOUT seconds of waiting).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from flask import Response
+from requests.adapters import HTTPAdapter
+
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'taaja-image-cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_HOT_CACHE_BYTES = int(os.environ.get('IMAGE_HOT_CACHE_BYTES', 32 * 1024 * 1024))
+IMAGE_HOT_ITEM_MAX_BYTES = int(os.environ.get('IMAGE_HOT_ITEM_MAX_BYTES', 1024 * 1024))
+IMAGE_CACHE_TTL = int(os.environ.get('IMAGE_CACHE_TTL', 24 * 3600))        # revalidate upstream after this
+IMAGE_CLIENT_MAX_AGE = int(os.environ.get('IMAGE_CLIENT_MAX_AGE', 24 * 3600))  # Cache-Control for clients
+IMAGE_UPSTREAM_HOSTS = int(os.environ.get('IMAGE_UPSTREAM_HOSTS', 32))     # per-host pools kept
+IMAGE_UPSTREAM_PER_HOST = int(os.environ.get('IMAGE_UPSTREAM_PER_HOST', 8))  # connections per host
+IMAGE_UPSTREAM_POOL_TIMEOUT = float(os.environ.get('IMAGE_UPSTREAM_POOL_TIMEOUT', 5))  # wait for a free connection
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 20 * 1024 * 1024))  # largest upstream image accepted
+IMAGE_UPSTREAM_TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+IMAGE_FLIGHT_WAIT = 30  # seconds a duplicate miss waits for the leader's fetch
+
+
+class UpstreamError(Exception):
+    """The remote site answered with something other than 200."""
+
+    def __init__(self, status):
+        super().__init__(f"Failed to fetch image (status {status})")
+        self.status = status
+
+
+class UpstreamBusy(Exception):
+    """Every connection to the image's host stayed busy for IMAGE_UPSTREAM_POOL_TIMEOUT."""
+
+
+class ImageTooLarge(Exception):
+    """The upstream image is bigger than IMAGE_MAX_BYTES."""
+
+    def __init__(self, limit):
+        super().__init__(f"Image is larger than {limit} bytes")
+        self.limit = limit
+
+# Add a real browser user-agent to avoid being blocked by websites
+UPSTREAM_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/120.0 Safari/537.36"
+}
+
+
+def _make_session():
+    session = requests.Session()
+    # Non-blocking pools: concurrency is bounded by _host_slots, which can time out
+    adapter = HTTPAdapter(pool_connections=IMAGE_UPSTREAM_HOSTS,
+                          pool_maxsize=IMAGE_UPSTREAM_PER_HOST, pool_block=False)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(UPSTREAM_HEADERS)
+    return session
+
+
+upstream = _make_session()
+_host_slots = {}  # scheme://host -> semaphore of IMAGE_UPSTREAM_PER_HOST
+_host_slots_lock = threading.Lock()
+
+
+@contextmanager
+def upstream_get(url, **kwargs):
+    """GET url through the shared session, holding one of its host's slots until closed."""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with _host_slots_lock:
+        slots = _host_slots.get(host)
+        if slots is None:
+            slots = _host_slots[host] = threading.BoundedSemaphore(IMAGE_UPSTREAM_PER_HOST)
+    if not slots.acquire(timeout=IMAGE_UPSTREAM_POOL_TIMEOUT):
+        raise UpstreamBusy(f"all connections to {host} are busy")
+    try:
+        resp = upstream.get(url, timeout=IMAGE_UPSTREAM_TIMEOUT, **kwargs)
+        try:
+            yield resp
+        finally:
+            resp.close()
+    finally:
+        slots.release()
+
+
+class ImageCache:
+    """Byte-bounded LRU store on disk with an in-memory hot tier.
+
+    Entries are (meta, body) where meta holds content_type, etag (ours),
+    upstream_etag, last_modified, size and checked_at.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES,
+                 hot_bytes=IMAGE_HOT_CACHE_BYTES, hot_item_max=IMAGE_HOT_ITEM_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self.hot_item_max = hot_item_max
+        self._lock = threading.Lock()
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_total = 0
+        self._hot = OrderedDict()   # key -> (meta, body)
+        self._hot_total = 0
+        self.hits = self.hot_hits = self.misses = self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key_for(*parts):
+        return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix=''):
+        return os.path.join(self.directory, key + suffix)
+
+    def _scan(self):
+        """Rebuild the LRU order from what is already on disk (oldest first)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp-'):
+                self._unlink(os.path.join(self.directory, name))
+            elif name.endswith('.json'):
+                key = name[:-5]
+                try:
+                    entries.append((os.path.getmtime(self._path(key, '.json')), key,
+                                    os.path.getsize(self._path(key))))
+                except OSError:
+                    continue
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_total += size
+        self._evict()
+
+    # ---------- reads ----------
+    def get(self, key):
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot is not None:
+                self._hot.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.hits += 1
+                self.hot_hits += 1
+                return hot
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key, '.json')) as f:
+                meta = json.load(f)
+            with open(self._path(key), 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._promote(key, meta, body)
+        return meta, body
+
+    # ---------- writes ----------
+    def writer(self, key, max_size=None):
+        return _CacheWriter(self, key, max_size)
+
+    def _commit(self, key, tmp_path, meta, body):
+        meta_tmp = tmp_path + '.json'
+        with open(meta_tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(key))
+        os.replace(meta_tmp, self._path(key, '.json'))
+        with self._lock:
+            self._disk_total -= self._disk.pop(key, 0)
+            self._disk[key] = meta["size"]
+            self._disk_total += meta["size"]
+            self._drop_hot(key)
+            if body is not None:
+                self._promote(key, meta, body)
+            self._evict()
+
+    def touch(self, key, meta):
+        """Record a successful revalidation (new checked_at)."""
+        meta = dict(meta, checked_at=time.time())
+        tmp = os.path.join(self.directory, '.tmp-' + uuid.uuid4().hex + '.json')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(key, '.json'))
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot is not None:
+                self._hot[key] = (meta, hot[1])
+        return meta
+
+    def meta(self, key):
+        """Metadata only (no body read) or None."""
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot is not None:
+                return hot[0]
+            if key not in self._disk:
+                return None
+        try:
+            with open(self._path(key, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, key):
+        with self._lock:
+            self._disk_total -= self._disk.pop(key, 0)
+            self._drop_hot(key)
+        self._unlink(self._path(key))
+        self._unlink(self._path(key, '.json'))
+
+    # ---------- bookkeeping (caller holds the lock) ----------
+    def _promote(self, key, meta, body):
+        if len(body) > self.hot_item_max:
+            return
+        self._drop_hot(key)
+        self._hot[key] = (meta, body)
+        self._hot_total += len(body)
+        while self._hot_total > self.hot_bytes and self._hot:
+            _, (_, old) = self._hot.popitem(last=False)
+            self._hot_total -= len(old)
+
+    def _drop_hot(self, key):
+        old = self._hot.pop(key, None)
+        if old is not None:
+            self._hot_total -= len(old[1])
+
+    def _evict(self):
+        while self._disk_total > self.max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_total -= size
+            self._drop_hot(key)
+            self.evictions += 1
+            self._unlink(self._path(key))
+            self._unlink(self._path(key, '.json'))
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._disk),
+                "disk_bytes": self._disk_total,
+                "hot_entries": len(self._hot),
+                "hot_bytes": self._hot_total,
+                "hits": self.hits,
+                "hot_hits": self.hot_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class _CacheWriter:
+    """Collects a body chunk by chunk into a temp file, hashing as it goes.
+
+    write() raises ImageTooLarge once the body passes max_size; the caller
+    then abort()s, which removes the partial file.
+    """
+
+    def __init__(self, cache, key, max_size=None):
+        self.cache = cache
+        self.key = key
+        self.max_size = max_size
+        self.tmp_path = os.path.join(cache.directory, '.tmp-' + uuid.uuid4().hex)
+        self.file = open(self.tmp_path, 'wb')
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.keep = []  # body kept in memory too when small enough for the hot tier
+
+    def write(self, chunk):
+        if self.max_size is not None and self.size + len(chunk) > self.max_size:
+            raise ImageTooLarge(self.max_size)
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        if self.keep is not None:
+            if self.size <= self.cache.hot_item_max:
+                self.keep.append(chunk)
+            else:
+                self.keep = None
+
+    def commit(self, meta):
+        self.file.close()
+        meta = dict(meta, etag=self.digest.hexdigest()[:32], size=self.size, checked_at=time.time())
+        body = b"".join(self.keep) if self.keep is not None else None
+        self.cache._commit(self.key, self.tmp_path, meta, body)
+        return meta
+
+    def commit_entry(self, meta):
+        """commit() and return (meta, body); a body too big to keep in memory is read back first."""
+        self.file.close()
+        if self.keep is not None:
+            body = b"".join(self.keep)
+        else:
+            with open(self.tmp_path, 'rb') as f:
+                body = f.read()  # before the commit, which may evict it straight away
+        return self.commit(meta), body
+
+    def abort(self):
+        self.file.close()
+        ImageCache._unlink(self.tmp_path)
+
+
+class SingleFlight:
+    """Lets one caller per key do the work while duplicates wait for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.collapsed = 0
+
+    def begin(self, key):
+        """(is_leader, event)."""
+        with self._lock:
+            event = self._flights.get(key)
+            if event is not None:
+                self.collapsed += 1
+                return False, event
+            event = self._flights[key] = threading.Event()
+            return True, event
+
+    def end(self, key):
+        with self._lock:
+            event = self._flights.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+image_cache = None
+flights = SingleFlight()
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    global image_cache
+    if image_cache is None:
+        with _cache_lock:
+            if image_cache is None:
+                image_cache = ImageCache()
+    return image_cache
+
+
+# ---------- responses ----------
+def cache_headers(etag=None):
+    headers = {"Cache-Control": f"public, max-age={IMAGE_CLIENT_MAX_AGE}"}
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+    return headers
+
+
+def cached_response(meta, body, if_none_match=None):
+    """if_none_match is the request's werkzeug ETags, if any."""
+    if if_none_match and if_none_match.contains(meta["etag"]):
+        return Response(status=304, headers=cache_headers(meta["etag"]))
+    return Response(body, mimetype=meta["content_type"], headers=cache_headers(meta["etag"]))
+
+
+def upstream_meta(resp):
+    return {
+        "content_type": resp.headers.get("Content-Type", "image/jpeg"),
+        "upstream_etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def is_fresh(meta):
+    return time.time() - meta.get("checked_at", 0) < IMAGE_CACHE_TTL
+
+
+# ---------- shared with the async proxy (asgi.py); these do file IO only ----------
+def check_length(resp):
+    """Refuse a response whose Content-Length is already over IMAGE_MAX_BYTES."""
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > IMAGE_MAX_BYTES:
+        raise ImageTooLarge(IMAGE_MAX_BYTES)
+
+
+def store_response(cache, key, resp):
+    """Stream a 200 upstream response (requests, stream=True) into the cache; returns (meta, body)."""
+    check_length(resp)
+    writer = cache.writer(key, IMAGE_MAX_BYTES)
+    try:
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            writer.write(chunk)
+        return writer.commit_entry(upstream_meta(resp))
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def revalidation_headers(meta):
+    """Conditional request headers for a stale entry, or None if it has no validators."""
+    headers = {}
+    if meta.get("upstream_etag"):
+        headers["If-None-Match"] = meta["upstream_etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers or None
+
+
+def apply_revalidation(cache, key, meta, body, resp):
+    """(meta, body) after a conditional request: refreshed, replaced, or kept as is."""
+    if resp.status_code == 304:
+        return cache.touch(key, meta), body
+    if resp.status_code == 200:
+        return store_response(cache, key, resp)
+    return meta, body
+
+
+def _revalidate(cache, key, url, meta, body):
+    """Updated (meta, body) for a stale entry, or None if it cannot be revalidated."""
+    headers = revalidation_headers(meta)
+    if headers is None:
+        return None
+    try:
+        with upstream_get(url, headers=headers, stream=True) as resp:
+            return apply_revalidation(cache, key, meta, body, resp)
+    except (requests.RequestException, UpstreamBusy):
+        # Upstream unreachable or saturated: a stale image beats no image
+        return meta, body
+
+
+def load_image(url):
+    """(meta, body) of the original image, from the cache or fetched and stored.
+
+    Concurrent misses for one URL share a single fetch; the flight ends as
+    soon as the cache entry is committed.
+    """
+    cache = get_image_cache()
+    key = ImageCache.key_for(url)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if is_fresh(entry[0]):
+            return entry
+        revalidated = _revalidate(cache, key, url, *entry)
+        if revalidated is not None:
+            return revalidated
+
+    leader, event = flights.begin(key)
+    if not leader:
+        event.wait(IMAGE_FLIGHT_WAIT)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        leader, event = flights.begin(key)  # the leader failed or timed out: fetch it ourselves
+
+    try:
+        with upstream_get(url, stream=True) as resp:
+            if resp.status_code != 200:
+                raise UpstreamError(resp.status_code)
+            return store_response(cache, key, resp)
+    finally:
+        if leader:
+            flights.end(key)
+
+
+def serve_image(url, if_none_match=None):
+    """Response for /proxy_image: cache hit, revalidated hit, or a miss fetched into the cache."""
+    return cached_response(*load_image(url), if_none_match=if_none_match)
@@ -0,0 +1,135 @@
+"""Resized / re-encoded variants of proxied images.
+
+Variants are rendered with Pillow in a process pool (so request threads
+never do the pixel work) and stored in the image cache under a key that
+includes the source image's ETag, so each size is made once per version
+of the source.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from image_cache import (ImageCache, get_image_cache, load_image, cached_response,
+                         is_fresh, flights, IMAGE_FLIGHT_WAIT)
+
+IMAGE_RESIZE_WORKERS = int(os.environ.get('IMAGE_RESIZE_WORKERS', os.cpu_count() or 2))
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+DEFAULT_QUALITY = 80
+
+# format param -> (Pillow format, mimetype)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+
+def variant_params(args):
+    """(width, height, quality, format) from request args, or None for the original.
+
+    Raises ValueError for out-of-range values.
+    """
+    width = args.get('width', type=int)
+    height = args.get('height', type=int)
+    quality = args.get('quality', type=int)
+    fmt = (args.get('format') or '').lower() or None
+    if width is None and height is None and quality is None and fmt is None:
+        return None
+
+    for name, value in (('width', width), ('height', height)):
+        if value is not None and not 1 <= value <= IMAGE_MAX_DIMENSION:
+            raise ValueError(f"{name} must be between 1 and {IMAGE_MAX_DIMENSION}")
+    if quality is None:
+        quality = DEFAULT_QUALITY
+    elif not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    fmt = fmt or 'webp'
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return width, height, quality, fmt
+
+
+def render_variant(body, width, height, quality, fmt):
+    """Runs in a pool process: fit within width x height (never upscale) and re-encode."""
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(body))
+    image = ImageOps.exif_transpose(image)
+    if width or height:
+        image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    out = BytesIO()
+    image.save(out, pil_format, quality=quality)
+    return out.getvalue()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_resize_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_RESIZE_WORKERS)
+                _pool_pid = pid
+    return _pool
+
+
+# ---------- shared with the async proxy (asgi.py); these do file IO only ----------
+def variant_key(url, source_etag, params):
+    width, height, quality, fmt = params
+    spec = f"w={width or ''}&h={height or ''}&q={quality}&f={FORMATS[fmt][0]}"
+    return ImageCache.key_for(url, source_etag, spec)
+
+
+def cached_variant(cache, url, params):
+    """Fast path: the variant's entry when fresh source metadata is enough to find it."""
+    source = cache.meta(ImageCache.key_for(url))
+    if source is not None and is_fresh(source):
+        return cache.get(variant_key(url, source["etag"], params))
+    return None
+
+
+def store_variant(cache, key, data, params):
+    writer = cache.writer(key)
+    writer.write(data)
+    return writer.commit({"content_type": FORMATS[params[3]][1]})
+
+
+def serve_variant(url, params, if_none_match=None):
+    cache = get_image_cache()
+    entry = cached_variant(cache, url, params)
+    if entry is not None:
+        return cached_response(*entry, if_none_match=if_none_match)
+
+    source, body = load_image(url)
+    key = variant_key(url, source["etag"], params)
+    entry = cache.get(key)
+    if entry is not None:
+        return cached_response(*entry, if_none_match=if_none_match)
+
+    leader, event = flights.begin(key)
+    if not leader:
+        event.wait(IMAGE_FLIGHT_WAIT)
+        entry = cache.get(key)
+        if entry is not None:
+            return cached_response(*entry, if_none_match=if_none_match)
+
+    try:
+        data = get_resize_pool().submit(render_variant, body, *params).result()
+        meta = store_variant(cache, key, data, params)
+    finally:
+        if leader:
+            flights.end(key)
+    return cached_response(meta, data, if_none_match)
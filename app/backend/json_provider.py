@@ -0,0 +1,271 @@
+"""The app's JSON provider, tuned for database rows.
+
+Column types come out the way Flask has always written them (Decimal as a
+string, datetime/date as an HTTP date), plus time and timedelta as str.
+Query results can be wrapped in a RowSet (column names plus cursor
+tuples). When orjson is installed (JSON_FAST_ENCODER=0 turns it off) it
+encodes everything; without it RowSets are written column by column
+straight into JSON text, with no dict per row.
+
+orjson output is the same text as the stdlib encoder's (non-ASCII is
+escaped the same way) except for floats: exponents are written without
+a "+" (1e16, not 1e+16) and NaN/Infinity, which are not valid JSON,
+become null. Finite values parse back the same. Prices (Decimal, or
+float below 1e16) print without an exponent, so listings are
+unaffected.
+"""
+import json
+import os
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+JSON_FAST_ENCODER = os.environ.get('JSON_FAST_ENCODER', '1') == '1'
+
+_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def http_date(value):
+    """Same text as werkzeug.http.http_date (naive values are UTC), several times faster."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (
+        _DAYS[value.weekday()], value.day, _MONTHS[value.month - 1], value.year, hour, minute, second)
+
+
+def default(o):
+    """Encoder hook for the types rows contain; anything else goes to Flask's default."""
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (time, timedelta)):
+        return str(o)
+    if isinstance(o, RowSet):
+        return o.as_python()
+    return DefaultJSONProvider.default(o)
+
+
+def plain_default(o):
+    """Encoder hook for RowSet(plain=True) rows."""
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (date, time, timedelta)):
+        return str(o)
+    return default(o)
+
+
+# ---------- value encoders for RowSet, by exact type ----------
+def _float(value):
+    # repr() matches the json module except for nan/inf
+    return repr(value) if value - value == 0 else json.dumps(value)
+
+
+_ENCODERS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: _float,
+    bool: lambda v: 'true' if v else 'false',
+    type(None): lambda v: 'null',
+    Decimal: lambda v: '"%s"' % v,
+    datetime: lambda v: '"%s"' % http_date(v),
+    date: lambda v: '"%s"' % http_date(v),
+    time: lambda v: '"%s"' % v,
+    timedelta: lambda v: '"%s"' % v,
+}
+
+# plain=True: temporal values as str(), Decimal as a JSON number
+_PLAIN_ENCODERS = {
+    **_ENCODERS,
+    Decimal: lambda v: _float(float(v)),
+    datetime: lambda v: '"%s"' % v,
+    date: lambda v: '"%s"' % v,
+}
+
+
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+
+
+def _escape_char(match):
+    n = ord(match.group())
+    if n < 0x10000:
+        return '\\u%04x' % n
+    n -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (n >> 10), 0xdc00 | (n & 0x3ff))
+
+
+def ascii_only(text):
+    """JSON text with non-ASCII characters as \\u escapes, like json.dumps(ensure_ascii=True)."""
+    return text if text.isascii() else _NON_ASCII.sub(_escape_char, text)
+
+
+def _encode_any(value):
+    return json.dumps(value, default=default, sort_keys=True, separators=(",", ":"))
+
+
+class RowSet:
+    """Query results as (columns, tuples), written to JSON as a list of objects.
+
+    convert maps a column name to a function applied to its values first;
+    plain=True writes temporal columns with str() and Decimal as numbers.
+    A RowSet made by first() encodes as a single object.
+    """
+    __slots__ = ('columns', 'rows', 'convert', 'plain', 'single')
+
+    def __init__(self, columns, rows, convert=None, plain=False, single=False):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self.convert = convert or {}
+        self.plain = plain
+        self.single = single
+
+    @classmethod
+    def from_cursor(cls, cursor, rows=None, **kwargs):
+        """Wrap a plain (tuple) cursor's results; fetches all rows unless given."""
+        columns = [d[0] for d in cursor.description]
+        return cls(columns, cursor.fetchall() if rows is None else rows, **kwargs)
+
+    def _copy(self, rows=None, **changes):
+        fields = dict(convert=self.convert, plain=self.plain, single=self.single)
+        fields.update(changes)
+        return RowSet(self.columns, self.rows if rows is None else rows, **fields)
+
+    def with_convert(self, **convert):
+        return self._copy(convert={**self.convert, **convert})
+
+    def without(self, *columns):
+        keep = [i for i, c in enumerate(self.columns) if c not in columns]
+        return RowSet([self.columns[i] for i in keep], [tuple(r[i] for i in keep) for r in self.rows],
+                      convert=self.convert, plain=self.plain, single=self.single)
+
+    def first(self):
+        """The first row as a single-object RowSet, or None."""
+        return self._copy(rows=self.rows[:1], single=True) if self.rows else None
+
+    # ---------- sequence of dicts, for code that wants rows ----------
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._copy(rows=self.rows[index])
+        return dict(zip(self.columns, self.rows[index]))
+
+    def __iter__(self):
+        for row in self.rows:
+            yield dict(zip(self.columns, row))
+
+    def as_python(self, plain_values=True):
+        """Converted rows as dicts (a dict for a single-row set).
+
+        plain_values=False leaves plain-mode values to plain_default.
+        """
+        columns, rows = self.columns, self.rows
+        if self.convert:
+            converters = [self.convert.get(c) for c in columns]
+            rows = [tuple(v if f is None or v is None else f(v) for f, v in zip(converters, r)) for r in rows]
+        if self.plain and plain_values:
+            rows = [tuple(_plain(v) for v in r) for r in rows]
+        dicts = [dict(zip(columns, r)) for r in rows]
+        return (dicts[0] if dicts else None) if self.single else dicts
+
+    # ---------- encoding ----------
+    def encode_rows(self, sort_keys=True):
+        """One JSON object string per row."""
+        order = range(len(self.columns))
+        if sort_keys:
+            order = sorted(order, key=self.columns.__getitem__)
+        template = "{" + ",".join(
+            encode_basestring_ascii(self.columns[i]).replace("%", "%%") + ":%s" for i in order) + "}"
+
+        encoders = _PLAIN_ENCODERS if self.plain else _ENCODERS
+        rows = self.rows
+        columns = []
+        for i in order:
+            convert = self.convert.get(self.columns[i])
+            values = [r[i] for r in rows]
+            if convert is not None:
+                values = [None if v is None else convert(v) for v in values]
+            columns.append([(encoders.get(type(v)) or _encode_any)(v) for v in values])
+        return [template % values for values in zip(*columns)]
+
+    def to_json(self, sort_keys=True):
+        encoded = self.encode_rows(sort_keys)
+        if self.single:
+            return encoded[0] if encoded else "null"
+        return "[" + ",".join(encoded) + "]"
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time, timedelta)):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """Registered as app.json; see the module docstring."""
+    fast = orjson is not None and JSON_FAST_ENCODER
+
+    def dumps(self, obj, **kwargs):
+        compact = kwargs.get("separators") == (",", ":") and "indent" not in kwargs
+        if compact or not kwargs:
+            if self.fast:
+                try:
+                    text = self._orjson(obj).decode()
+                    return ascii_only(text) if self.ensure_ascii else text
+                except (orjson.JSONEncodeError, TypeError):
+                    pass  # e.g. ints beyond 64 bits; the stdlib encoder copes
+            elif isinstance(obj, RowSet):
+                return obj.to_json(self.sort_keys)
+            elif isinstance(obj, dict) and any(isinstance(v, RowSet) for v in obj.values()):
+                return self._splice(obj)
+
+        kwargs.setdefault("default", default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def _orjson(self, obj):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if isinstance(obj, RowSet) and obj.plain:
+            return orjson.dumps(obj.as_python(plain_values=False), default=plain_default, option=option)
+        return orjson.dumps(obj, default=default, option=option)
+
+    def encode_rows(self, rows):
+        """One JSON text per row of a RowSet (for NDJSON and streamed arrays)."""
+        if self.fast:
+            try:
+                return [ascii_only(self._orjson(r).decode()) for r in rows.as_python()]
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+        return rows.encode_rows(self.sort_keys)
+
+    def _splice(self, obj):
+        """A dict holding RowSets: encode the rows directly and join the pieces."""
+        keys = sorted(obj, key=str) if self.sort_keys else list(obj)
+        parts = []
+        for key in keys:
+            value = obj[key]
+            if isinstance(value, RowSet):
+                text = value.to_json(self.sort_keys)
+            else:
+                text = self.dumps(value, separators=(",", ":"))
+            parts.append(encode_basestring_ascii(str(key)) + ":" + text)
+        return "{" + ",".join(parts) + "}"
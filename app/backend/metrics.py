@@ -0,0 +1,269 @@
+"""Request and SQL metrics, exposed in Prometheus text format on /metrics.
+
+Per Flask route: request count by status and a latency histogram. Per SQL
+statement (through the cursors db.get_db_connection hands out): latency
+histogram (execute plus fetches), rows returned or affected, and errors,
+labelled with the statement normalized to a shape ("... WHERE id = ?").
+Recording is a dict lookup and a few adds under a lock.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_MAX_QUERY_LABELS = int(os.environ.get('METRICS_MAX_QUERY_LABELS', 500))
+
+# Upper bounds in seconds
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in snapshot:
+            base = _labels(self.labels, labels)
+            running = 0
+            for bound, n in zip(self.buckets, series):
+                running += n
+                out.append(f'{self.name}_bucket{{{base},le="{bound}"}} {running}')
+            out.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            out.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            out.append(f"{self.name}_count{{{base}}} {series[-1]}")
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            snapshot = list(self._values.items())
+        for labels, value in snapshot:
+            out.append(f"{self.name}{{{_labels(self.labels, labels)}}} {value}")
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route, method and status.",
+                        ("route", "method", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Time to build the response, by route.",
+                         ("route", "method"), HTTP_BUCKETS)
+db_latency = Histogram("db_query_duration_seconds", "SQL statement time including fetches.",
+                       ("query",), DB_BUCKETS)
+db_rows = Counter("db_query_rows_total", "Rows fetched (SELECT) or affected (writes).", ("query",))
+db_errors = Counter("db_query_errors_total", "Statements that raised.", ("query",))
+
+
+# ---------- SQL normalization ----------
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_VALUES_LIST = re.compile(r"(\((?:\?\s*,\s*)*\?\))(?:\s*,\s*\((?:\?\s*,\s*)*\?\))+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\?\s*,\s*)+\?\)", re.IGNORECASE)
+
+_labels_cache = {}
+_labels_lock = threading.Lock()
+
+
+def query_label(sql):
+    """Statement shape: literals and placeholders become ?, repeated row groups collapse."""
+    label = _labels_cache.get(sql)
+    if label is not None:
+        return label
+    label = _SPACE.sub(" ", sql).strip()
+    label = _STRING.sub("?", label)
+    label = _PLACEHOLDER.sub("?", label)
+    label = _NUMBER.sub("?", label)
+    label = _VALUES_LIST.sub(r"\1, ...", label)
+    label = _IN_LIST.sub("IN (...)", label)
+    with _labels_lock:
+        if len(_labels_cache) >= METRICS_MAX_QUERY_LABELS * 4:
+            _labels_cache.clear()  # dynamic SQL; only the cache is bounded here
+        _labels_cache[sql] = label
+    return label
+
+
+_known_queries = set()
+_known_queries_lock = threading.Lock()
+
+
+def _query_key(sql):
+    label = query_label(sql)
+    if label not in _known_queries:  # lock-free fast path for labels already admitted
+        with _known_queries_lock:
+            if label not in _known_queries:
+                if len(_known_queries) >= METRICS_MAX_QUERY_LABELS:
+                    return ("other",)
+                _known_queries.add(label)
+    return (label,)
+
+
+class InstrumentedCursor:
+    """Wraps a DB cursor; a statement's time runs from execute() to the next
+    execute() or close(), so fetches on unbuffered cursors count too."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._key = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def flush(self):
+        """Record the current statement, if any."""
+        if self._key is not None:
+            rows = self._rows
+            if not rows:
+                rowcount = getattr(self._cursor, 'rowcount', -1)
+                rows = rowcount if rowcount and rowcount > 0 else 0
+            db_latency.observe(self._key, self._elapsed)
+            if rows:
+                db_rows.inc(self._key, rows)
+            self._key = None
+
+    def _run(self, method, sql, args):
+        self.flush()
+        key = _query_key(sql)
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        except Exception:
+            db_errors.inc(key)
+            raise
+        finally:
+            self._key, self._elapsed, self._rows = key, time.perf_counter() - start, 0
+
+    def execute(self, sql, *args, **kwargs):
+        return self._run(lambda s, *a: self._cursor.execute(s, *a, **kwargs), sql, args)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._run(lambda s, *a: self._cursor.executemany(s, *a, **kwargs), sql, args)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        self._elapsed += time.perf_counter() - start
+        if result is not None:
+            self._rows += len(result) if isinstance(result, list) else 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetch(lambda: self._cursor.fetchmany(*args, **kwargs))
+
+    def close(self):
+        self.flush()
+        return self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def instrument_cursor(cursor):
+    return InstrumentedCursor(cursor) if METRICS_ENABLED else cursor
+
+
+# ---------- Flask ----------
+def init_app(app, extra=None):
+    """Time every request and serve /metrics. extra() may return more text lines."""
+    if METRICS_ENABLED:
+        @app.before_request
+        def _start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def _record(response):
+            _observe(response.status_code)
+            return response
+
+        @app.teardown_request
+        def _record_failure(exc):
+            if exc is not None:
+                _observe(500)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        out = []
+        for metric in (http_requests, http_latency, db_latency, db_rows, db_errors):
+            metric.render(out)
+        if extra:
+            out.extend(extra())
+        return Response("\n".join(out) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def _observe(status):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    rule = request.url_rule
+    route = rule.rule if rule is not None else "unmatched"
+    http_requests.inc((route, request.method, str(status)))
+    http_latency.observe((route, request.method), time.perf_counter() - start)
+
+
+def gauges(name, help, values):
+    """Prometheus lines for a dict of numeric values, as one labelled gauge."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'{name}{{stat="{_escape(key)}"}} {value}')
+    return lines
@@ -0,0 +1,25 @@
+-- Daily sales rollups read by /shop_sales_summary (see sales_rollup.py).
+-- Apply before deploying the code that writes them:
+--     mysql <db> < migrations/0001_sales_rollups.sql
+-- or  python sales_rollup.py create-tables
+-- then load orders placed earlier with:  python sales_rollup.py backfill
+
+CREATE TABLE IF NOT EXISTS shop_sales_daily (
+    shop_id INT NOT NULL,
+    day DATE NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    quantity INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    delivery_charge DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS product_sales_daily (
+    shop_id INT NOT NULL,
+    day DATE NOT NULL,
+    product_name VARCHAR(255) NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    quantity INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day, product_name)
+);
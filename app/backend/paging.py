@@ -0,0 +1,179 @@
+"""Keyset pagination and streamed JSON responses for list endpoints."""
+import base64
+import os
+from datetime import datetime, timedelta
+
+from flask import Response, current_app
+
+from db import db_connection, CATALOG
+from json_provider import RowSet
+
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+STREAM_FORMATS = ('json', 'ndjson')
+
+
+def page_params(source):
+    """(limit, after, stream) from request args; raises ValueError on bad input."""
+    limit = source.get('limit')
+    after = source.get('after')
+    stream = source.get('stream') or None
+
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        limit = min(limit, MAX_PAGE_SIZE)
+    if after is not None:
+        after = int(after)
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of {', '.join(STREAM_FORMATS)}")
+    return limit, after, stream
+
+
+def keyset_sql(select_sql, where=(), params=(), after=None, limit=None, key='id'):
+    """Append filters, an `after` cursor, ordering on the key and a LIMIT."""
+    clauses = list(where)
+    params = list(params)
+    if after is not None:
+        clauses.append(f"{key} > %s")
+        params.append(after)
+    sql = select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if after is not None or limit is not None:
+        sql += f" ORDER BY {key}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def split_page(rows, limit, key='id'):
+    """Trim the look-ahead row fetched with LIMIT limit+1; return (rows, next_after)."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1][key]
+
+
+# ---------- newest-first history (orders) on (created_at, id) ----------
+# Served by the (user_id, created_at, id) / (shop_id, created_at, id) indexes
+# on orders, a page is a short index range scan however long the history is.
+HISTORY_FILTERS = ('from_date', 'to_date', 'status')
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque next-page cursor for the last row of a page."""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=' ')
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(created_at text, id) from encode_cursor; raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        datetime.fromisoformat(created_at)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
+def _date_bound(value, name, end=False):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or datetime")
+    if end and len(value) <= 10:
+        return parsed + timedelta(days=1), '<'  # a whole day, inclusive
+    return parsed, '<=' if end else '>='
+
+
+def history_params(source):
+    """(limit, cursor, filters) from request args; raises ValueError on bad input."""
+    limit, _, _ = page_params({'limit': source.get('limit')})
+    cursor = source.get('cursor')
+    filters = {k: source.get(k) for k in HISTORY_FILTERS if source.get(k)}
+    return limit, decode_cursor(cursor) if cursor else None, filters
+
+
+def history_sql(select_sql, where, params, filters, cursor=None, limit=None, alias=''):
+    """Newest-first query: filters, the (created_at, id) cursor, ORDER BY and a LIMIT.
+
+    alias prefixes the orders columns (e.g. "o." in a join).
+    """
+    created_at, row_id, status = alias + 'created_at', alias + 'id', alias + 'status'
+    clauses = list(where)
+    params = list(params)
+    if 'from_date' in filters:
+        bound, op = _date_bound(filters['from_date'], 'from_date')
+        clauses.append(f"{created_at} {op} %s")
+        params.append(bound)
+    if 'to_date' in filters:
+        bound, op = _date_bound(filters['to_date'], 'to_date', end=True)
+        clauses.append(f"{created_at} {op} %s")
+        params.append(bound)
+    if 'status' in filters:
+        clauses.append(f"{status} = %s")
+        params.append(filters['status'])
+    if cursor is not None:
+        # Expanded form of (created_at, id) < cursor, which MySQL turns into an index range
+        clauses.append(f"({created_at} < %s OR ({created_at} = %s AND {row_id} < %s))")
+        params += [cursor[0], cursor[0], cursor[1]]
+
+    sql = select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {created_at} DESC, {row_id} DESC"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def split_history_page(rows, limit, created_at='created_at', key='id'):
+    """Trim the look-ahead row; return (rows, next cursor or None)."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_at], last[key])
+
+
+def stream_rows(sql, params, convert=None, fmt='json', prefix='[', suffix=']'):
+    """Stream query results with fetchmany, as one JSON array or as NDJSON lines.
+
+    In json mode the rows are wrapped in prefix/suffix so the body has the
+    same shape as the buffered response. convert maps column -> function
+    (see RowSet); each batch is encoded straight from the cursor tuples.
+    The rows are products, read from a replica unless this process just
+    wrote some.
+    """
+    provider = current_app.json
+
+    def generate():
+        with db_connection(read=True, sticky=CATALOG) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            if fmt == 'json':
+                yield prefix
+            first = True
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                encoded = provider.encode_rows(RowSet.from_cursor(cursor, rows, convert=convert))
+                if fmt == 'ndjson':
+                    yield "".join(line + "\n" for line in encoded)
+                else:
+                    chunk = ",".join(encoded)
+                    yield chunk if first else "," + chunk
+                    first = False
+            if fmt == 'json':
+                yield suffix
+            cursor.close()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(generate(), mimetype=mimetype)
@@ -0,0 +1,223 @@
+"""Bulk product import for /import_owner_products.
+
+The upload (CSV with a header row, or NDJSON) is read as a stream, one
+record at a time. Each record is checked with add_owner_product's rules.
+Valid rows are inserted with multi-row INSERTs, one transaction per batch,
+so only a batch of rows and the capped error list are ever held in memory.
+"""
+import codecs
+import csv
+import json
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from db import db_connection, insert_many, CATALOG
+from search_index import search_index, PRODUCT_FIELDS
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+IMPORT_MAX_BATCH_SIZE = int(os.environ.get('IMPORT_MAX_BATCH_SIZE', 5000))
+IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))  # listed in the report
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+INSERT_HEAD = """INSERT INTO products (shop_id, name, category, price, quantity_in_stock, image_url, date_added)
+    VALUES """
+INSERT_ROW = "(%s, %s, %s, %s, %s, %s, %s)"
+
+
+def import_format(requested, content_type, filename=None):
+    """csv or ndjson, from ?format=, the file name or the Content-Type; raises ValueError."""
+    fmt = (requested or '').lower()
+    if not fmt and filename:
+        fmt = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        fmt = {'jsonl': 'ndjson'}.get(fmt, fmt)
+    if not fmt:
+        content_type = (content_type or '').lower()
+        if 'csv' in content_type:
+            fmt = 'csv'
+        elif 'ndjson' in content_type or 'jsonl' in content_type:
+            fmt = 'ndjson'
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    return fmt
+
+
+def _lines(stream):
+    """Decoded text lines from a binary stream, read incrementally."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='strict')
+    pending = ''
+    while True:
+        chunk = stream.read(64 * 1024)
+        text = decoder.decode(chunk or b'', final=not chunk)
+        if text:
+            lines = (pending + text).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record dict or None, parse error or None)."""
+    lines = _lines(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield reader.line_num, None, f"Invalid CSV: {e}"
+                continue
+            if None in record:
+                yield reader.line_num, None, "More values than header columns"
+                continue
+            yield reader.line_num, record, None
+    else:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "Each line must be a JSON object"
+                continue
+            yield number, record, None
+
+
+def _value(record, key):
+    value = record.get(key)
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None  # empty CSV cells count as missing
+    return value
+
+
+def validate(record, shop_id, date_added):
+    """A products row tuple for the INSERT; raises ValueError with the reason."""
+    row_shop = _value(record, 'shop_id')
+    if row_shop is not None and str(row_shop) != str(shop_id):
+        raise ValueError("shop_id does not match the import's shop")
+    name = _value(record, 'name')
+    category = _value(record, 'category')
+    price = _value(record, 'price')
+    quantity_in_stock = _value(record, 'quantity_in_stock')
+
+    # Same rule as add_owner_product
+    if not all([shop_id, name, category, price is not None, quantity_in_stock is not None]):
+        raise ValueError("Missing required fields")
+
+    try:
+        price = Decimal(str(price))
+    except InvalidOperation:
+        raise ValueError("price must be a number")
+    if not price.is_finite():
+        raise ValueError("price must be a number")
+    try:
+        quantity_in_stock = int(str(quantity_in_stock))
+    except ValueError:
+        raise ValueError("quantity_in_stock must be an integer")
+
+    return (shop_id, str(name), str(category), price, quantity_in_stock,
+            _value(record, 'image_url'), date_added)
+
+
+class ImportReport:
+    """Counts plus the first IMPORT_MAX_ERRORS row errors."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _insert_batch(conn, cursor, batch, report):
+    """Insert one batch in a transaction; if it fails, retry row by row to find the bad rows."""
+    try:
+        insert_many(cursor, INSERT_HEAD, INSERT_ROW, [row for _, row in batch], chunk_size=len(batch))
+        conn.commit()
+        report.imported += len(batch)
+        return
+    except Exception:
+        conn.rollback()
+
+    for line, row in batch:
+        try:
+            cursor.execute(INSERT_HEAD + INSERT_ROW, row)
+            report.imported += 1
+        except Exception as e:
+            report.error(line, str(e))
+    conn.commit()
+
+
+def _index_new_products(cursor, shop_id, after_id):
+    """Add the shop's products with id > after_id to the search index, in batches."""
+    cursor.execute(f"SELECT {', '.join(PRODUCT_FIELDS)} FROM products WHERE shop_id = %s AND id > %s",
+                   (shop_id, after_id))
+    while True:
+        rows = cursor.fetchmany(IMPORT_BATCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            search_index.upsert(dict(zip(PRODUCT_FIELDS, row)))
+
+
+def import_products(stream, fmt, shop_id, batch_size=None):
+    """Validate and insert every record in the stream; returns an ImportReport.
+
+    Raises ValueError, before anything is written, if shop_id is not an integer.
+    """
+    shop_id = int(shop_id)
+    batch_size = min(batch_size or IMPORT_BATCH_SIZE, IMPORT_MAX_BATCH_SIZE)
+    report = ImportReport()
+    date_added = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with db_connection(sticky=CATALOG) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products WHERE shop_id = %s", (shop_id,))
+        before_id = cursor.fetchone()[0]
+        conn.commit()
+
+        batch = []
+        try:
+            for line, record, parse_error in read_records(stream, fmt):
+                if parse_error:
+                    report.error(line, parse_error)
+                    continue
+                try:
+                    batch.append((line, validate(record, shop_id, date_added)))
+                except ValueError as e:
+                    report.error(line, str(e))
+                    continue
+                if len(batch) >= batch_size:
+                    _insert_batch(conn, cursor, batch, report)
+                    batch = []
+        except UnicodeDecodeError:
+            report.error(None, "Upload is not valid UTF-8; rows after this point were not read")
+        if batch:
+            _insert_batch(conn, cursor, batch, report)
+
+        if report.imported:
+            _index_new_products(cursor, shop_id, before_id)
+        cursor.close()
+    return report
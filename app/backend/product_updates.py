@@ -0,0 +1,155 @@
+"""Batch partial product updates for /update_owner_products.
+
+Each item names a product_id and any of: price, quantity_in_stock
+(absolute), stock_delta (relative; a NULL stock counts as 0), name,
+category, image_url. The batch
+runs in one transaction: the rows are locked and checked with one SELECT
+and changed with one UPDATE that uses a CASE per column.
+"""
+import os
+from decimal import Decimal, InvalidOperation
+
+from search_index import search_index, PRODUCT_FIELDS
+
+BATCH_UPDATE_MAX_ITEMS = int(os.environ.get('BATCH_UPDATE_MAX_ITEMS', 1000))
+
+TEXT_FIELDS = ('name', 'category', 'image_url')
+
+
+def parse_item(item):
+    """(product_id, changes dict) for one request item; raises ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be an object")
+    try:
+        product_id = int(item.get('product_id'))
+    except (TypeError, ValueError):
+        raise ValueError("product_id is required")
+
+    changes = {}
+    if item.get('price') is not None:
+        try:
+            price = Decimal(str(item['price']))
+        except InvalidOperation:
+            raise ValueError("price must be a number")
+        if not price.is_finite() or price < 0:
+            raise ValueError("price must be a non-negative number")
+        changes['price'] = price
+
+    stock, delta = item.get('quantity_in_stock'), item.get('stock_delta')
+    if stock is not None and delta is not None:
+        raise ValueError("Give quantity_in_stock or stock_delta, not both")
+    for key, value in (('quantity_in_stock', stock), ('stock_delta', delta)):
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"{key} must be an integer")
+        try:
+            changes[key] = int(value)
+        except ValueError:
+            raise ValueError(f"{key} must be an integer")
+    if changes.get('quantity_in_stock', 0) < 0:
+        raise ValueError("quantity_in_stock cannot be negative")
+
+    for key in TEXT_FIELDS:
+        if key in item:
+            if key != 'image_url' and not item[key]:
+                raise ValueError(f"{key} cannot be empty")
+            changes[key] = item[key]
+
+    if not changes:
+        raise ValueError("Nothing to update")
+    return product_id, changes
+
+
+def _case(column, entries):
+    """SET fragment "col = CASE id WHEN %s THEN <expr> ... ELSE col END" and its params."""
+    sql = [f"{column} = CASE id"]
+    params = []
+    for product_id, expr, value in entries:
+        sql.append(f"WHEN %s THEN {expr}")
+        params += [product_id, value]
+    sql.append(f"ELSE {column} END")
+    return " ".join(sql), params
+
+
+def apply_updates(conn, shop_id, items):
+    """Validate and apply the items; returns (results in item order, updated product rows).
+
+    Items for products that are missing, belong to another shop, or would
+    take stock below zero are reported and skipped; the rest are applied.
+    """
+    results = [None] * len(items)
+    parsed = {}
+    for i, item in enumerate(items):
+        try:
+            product_id, changes = parse_item(item)
+        except ValueError as e:
+            results[i] = {"product_id": item.get('product_id') if isinstance(item, dict) else None,
+                          "status": "error", "error": str(e)}
+            continue
+        if product_id in parsed:
+            results[i] = {"product_id": product_id, "status": "error", "error": "Duplicate product_id"}
+            continue
+        parsed[product_id] = (i, changes)
+
+    if not parsed:
+        return results, []
+
+    cursor = conn.cursor()
+    ids = list(parsed)
+    marks = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"SELECT id, shop_id, quantity_in_stock FROM products WHERE id IN ({marks}) FOR UPDATE", ids)
+    current = {row[0]: row for row in cursor.fetchall()}
+
+    apply = {}
+    for product_id, (i, changes) in parsed.items():
+        row = current.get(product_id)
+        if row is None:
+            error = "Product not found"
+        elif str(row[1]) != str(shop_id):
+            error = "Product belongs to another shop"
+        elif (row[2] or 0) + changes.get('stock_delta', 0) < 0:
+            error = "Not enough stock for stock_delta"
+        else:
+            apply[product_id] = changes
+            continue
+        results[i] = {"product_id": product_id, "status": "error", "error": error}
+
+    rows = []
+    if apply:
+        sets, params = [], []
+        columns = {
+            'price': [(pid, "%s", c['price']) for pid, c in apply.items() if 'price' in c],
+            'quantity_in_stock': [(pid, "%s", c['quantity_in_stock']) for pid, c in apply.items()
+                                  if 'quantity_in_stock' in c]
+                                 + [(pid, "COALESCE(quantity_in_stock, 0) + %s", c['stock_delta'])
+                                    for pid, c in apply.items() if 'stock_delta' in c],
+        }
+        for key in TEXT_FIELDS:
+            columns[key] = [(pid, "%s", c[key]) for pid, c in apply.items() if key in c]
+        for column, entries in columns.items():
+            if entries:
+                sql, values = _case(column, entries)
+                sets.append(sql)
+                params += values
+
+        ids = list(apply)
+        marks = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"UPDATE products SET {', '.join(sets)} WHERE id IN ({marks})", params + ids)
+        cursor.execute(f"SELECT {', '.join(PRODUCT_FIELDS)}, quantity_in_stock FROM products "
+                       f"WHERE id IN ({marks})", ids)
+        for row in cursor.fetchall():
+            product = dict(zip(PRODUCT_FIELDS + ('quantity_in_stock',), row))
+            rows.append(product)
+            results[parsed[product['id']][0]] = {
+                "product_id": product['id'], "status": "updated",
+                "price": float(product['price']), "quantity_in_stock": product['quantity_in_stock'],
+            }
+    cursor.close()
+    return results, rows
+
+
+def index_updates(rows):
+    """Apply the updated rows to the search index."""
+    for row in rows:
+        search_index.upsert({k: row[k] for k in PRODUCT_FIELDS})
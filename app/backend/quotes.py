@@ -0,0 +1,56 @@
+"""Short-lived signed delivery quotes.
+
+distance_finder signs the price it showed; buy_now can trust a valid quote
+instead of redoing shop selection and the distance maths, provided the
+quote is for the shop the order names and that shop is still active.
+"""
+import os
+from decimal import Decimal
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+QUOTE_TTL = int(os.environ.get('QUOTE_TTL', 600))  # seconds
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='delivery-quote')
+
+
+def coord_key(value):
+    """Coordinates as stored on an order, so a quote is bound to one location."""
+    return str(Decimal(str(value)).quantize(Decimal('0.00000001')))
+
+
+def items_total(items):
+    return sum(Decimal(str(i.get("cost", 0))) * int(i.get("quantity", 1)) for i in items)
+
+
+def issue_quote(latitude, longitude, shop_id, distance_km, delivery_charge, total_cost):
+    return _serializer().dumps({
+        "lat": coord_key(latitude),
+        "lon": coord_key(longitude),
+        "shop_id": shop_id,
+        "distance_km": str(distance_km),
+        "delivery_charge": str(delivery_charge),
+        "items_total": str(total_cost),
+    })
+
+
+def verify_quote(token, latitude, longitude, total_cost):
+    """Payload of a valid quote for this location and item total, else None."""
+    if not token:
+        return None
+    try:
+        quote = _serializer().loads(token, max_age=QUOTE_TTL)  # SignatureExpired is a BadSignature
+    except BadSignature:
+        return None
+    if quote["lat"] != coord_key(latitude) or quote["lon"] != coord_key(longitude):
+        return None
+    if Decimal(quote["items_total"]) != total_cost:
+        return None
+    return {
+        "shop_id": quote["shop_id"],
+        "distance_km": Decimal(quote["distance_km"]),
+        "delivery_charge": Decimal(quote["delivery_charge"]),
+    }
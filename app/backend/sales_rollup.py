@@ -0,0 +1,174 @@
+"""Per-shop daily sales rollups for owner dashboards.
+
+shop_sales_daily holds order count, quantity, revenue (item cost) and
+delivery charges per shop per day; product_sales_daily the same per
+product name. buy_now adds to them and remove_item subtracts, in the same
+transaction as the orders write, so a dashboard reads O(days) rows
+instead of every order.
+
+The tables come from migrations/0001_sales_rollups.sql; apply it before
+deploying (python sales_rollup.py create-tables does the same), then load
+orders placed before that with:
+    python sales_rollup.py backfill
+Requests never run DDL.
+"""
+import argparse
+import os
+from collections import defaultdict
+from decimal import Decimal
+
+from db import db_connection
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '0001_sales_rollups.sql')
+
+TODAY_SQL = "DATE(NOW())"  # the day orders inserted with created_at = NOW() fall on
+
+_SHOP_UPSERT = ("INSERT INTO shop_sales_daily (shop_id, day, order_count, quantity, revenue, delivery_charge) VALUES ",
+                """ ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+    quantity = quantity + VALUES(quantity), revenue = revenue + VALUES(revenue),
+    delivery_charge = delivery_charge + VALUES(delivery_charge)""")
+_PRODUCT_UPSERT = ("INSERT INTO product_sales_daily (shop_id, day, product_name, order_count, quantity, revenue) VALUES ",
+                   """ ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+    quantity = quantity + VALUES(quantity), revenue = revenue + VALUES(revenue)""")
+
+
+def create_tables(cursor):
+    """Apply the rollup migration (CREATE TABLE IF NOT EXISTS, so safe to repeat)."""
+    with open(MIGRATION) as f:
+        script = "".join(line for line in f if not line.lstrip().startswith("--"))
+    for statement in script.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def migrate():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        create_tables(cursor)
+        conn.commit()
+        cursor.close()
+
+
+def _apply(cursor, orders, day, sign):
+    """Add (sign=1) or subtract (sign=-1) orders: (shop_id, name, quantity, cost, delivery_charge)."""
+    shops = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+    products = defaultdict(lambda: [0, 0, Decimal(0)])
+    for shop_id, name, qty, cost, delivery_charge in orders:
+        cost, delivery_charge = Decimal(str(cost)), Decimal(str(delivery_charge or 0))
+        total = shops[shop_id]
+        total[0] += sign
+        total[1] += sign * qty
+        total[2] += sign * cost
+        total[3] += sign * delivery_charge
+        total = products[(shop_id, name)]
+        total[0] += sign
+        total[1] += sign * qty
+        total[2] += sign * cost
+
+    # Known day as a parameter, else the database's current date
+    day_sql, day_params = ("%s", [day]) if day is not None else (TODAY_SQL, [])
+    _upsert(cursor, _SHOP_UPSERT, f"(%s, {day_sql}, %s, %s, %s, %s)",
+            [[shop_id, *day_params, *total] for shop_id, total in sorted(shops.items())])
+    _upsert(cursor, _PRODUCT_UPSERT, f"(%s, {day_sql}, %s, %s, %s, %s)",
+            [[shop_id, *day_params, name, *total] for (shop_id, name), total in sorted(products.items())])
+
+
+def _upsert(cursor, statement, row_sql, rows):
+    head, tail = statement
+    # One statement per table; rows are sorted so concurrent checkouts lock keys in the same order
+    cursor.execute(head + ", ".join([row_sql] * len(rows)) + tail, [v for row in rows for v in row])
+
+
+def record_orders(cursor, orders):
+    """Count orders just inserted with created_at = NOW(); call before the commit."""
+    if orders:
+        _apply(cursor, orders, None, 1)
+
+
+def remove_order(cursor, order_id, user_id):
+    """Delete one of the user's orders and take it out of the rollups; False if not found."""
+    cursor.execute("""SELECT shop_id, DATE(created_at), pickles, quantity, cost, delivery_charge
+        FROM orders WHERE id = %s AND user_id = %s FOR UPDATE""", (order_id, user_id))
+    order = cursor.fetchone()
+    if order is None:
+        return False
+    cursor.execute("DELETE FROM orders WHERE id = %s AND user_id = %s", (order_id, user_id))
+    shop_id, day = order[0], order[1]
+    if shop_id is not None and day is not None:
+        _apply(cursor, [(shop_id, order[2] or '', *order[3:])], day, -1)
+    return True
+
+
+# ---------- reads ----------
+def shop_summary(cursor, shop_id, from_date=None, to_date=None, top=10):
+    """Totals, a per-day series and the top products by revenue for a date range."""
+    where, params = ["shop_id = %s"], [shop_id]
+    if from_date:
+        where.append("day >= %s")
+        params.append(from_date)
+    if to_date:
+        where.append("day <= %s")
+        params.append(to_date)
+    where = " AND ".join(where)
+
+    cursor.execute(f"""SELECT day, order_count, quantity, revenue, delivery_charge
+        FROM shop_sales_daily WHERE {where} AND order_count > 0 ORDER BY day""", params)
+    rows = cursor.fetchall()
+    totals = {
+        "orders": sum(r[1] for r in rows),
+        "quantity": sum(r[2] for r in rows),
+        "revenue": float(sum(Decimal(str(r[3])) for r in rows)),
+        "delivery_charge": float(sum(Decimal(str(r[4])) for r in rows)),
+    }
+    days = [{"day": str(day), "orders": count, "quantity": qty, "revenue": float(revenue),
+             "delivery_charge": float(delivery)}
+            for day, count, qty, revenue, delivery in rows]
+
+    cursor.execute(f"""SELECT product_name, SUM(order_count), SUM(quantity), SUM(revenue)
+        FROM product_sales_daily WHERE {where}
+        GROUP BY product_name HAVING SUM(order_count) > 0
+        ORDER BY SUM(revenue) DESC, product_name LIMIT %s""", params + [top])
+    products = [{"product_name": name, "orders": int(count), "quantity": int(qty), "revenue": float(revenue)}
+                for name, count, qty, revenue in cursor.fetchall()]
+    return {"totals": totals, "days": days, "top_products": products}
+
+
+# ---------- backfill ----------
+def backfill(shop_id=None):
+    """Rebuild the rollups from the orders table (all shops, or one), in one transaction."""
+    where, params = ("WHERE shop_id = %s", [shop_id]) if shop_id is not None else ("WHERE shop_id IS NOT NULL", [])
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        create_tables(cursor)
+        conn.commit()
+        try:
+            for table in ("shop_sales_daily", "product_sales_daily"):
+                cursor.execute(f"DELETE FROM {table} {where}", params)
+            cursor.execute(f"""INSERT INTO shop_sales_daily
+                (shop_id, day, order_count, quantity, revenue, delivery_charge)
+                SELECT shop_id, DATE(created_at), COUNT(*), SUM(quantity), SUM(cost), SUM(COALESCE(delivery_charge, 0))
+                FROM orders {where} GROUP BY shop_id, DATE(created_at)""", params)
+            days = cursor.rowcount
+            cursor.execute(f"""INSERT INTO product_sales_daily
+                (shop_id, day, product_name, order_count, quantity, revenue)
+                SELECT shop_id, DATE(created_at), COALESCE(pickles, ''), COUNT(*), SUM(quantity), SUM(cost)
+                FROM orders {where} GROUP BY shop_id, DATE(created_at), COALESCE(pickles, '')""", params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        cursor.close()
+    return days
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sales rollup maintenance")
+    parser.add_argument('command', choices=['create-tables', 'backfill'])
+    parser.add_argument('--shop-id', type=int, help='backfill one shop only')
+    args = parser.parse_args()
+
+    if args.command == 'create-tables':
+        migrate()
+        print("Rollup tables ready")
+    else:
+        print(f"Backfilled {backfill(args.shop_id)} shop-days")
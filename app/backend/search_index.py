@@ -0,0 +1,224 @@
+"""In-process product search over names and categories.
+
+Lowercased names are indexed by their 1-, 2- and 3-grams, so a substring
+query only looks at products that contain all of its grams. Sorted name
+and word lists answer prefix matches (and autocomplete) with a bisect, and
+results are produced best bucket first so a limited search stops early.
+"""
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from db import db_connection, CATALOG
+from statements import run
+
+SEARCH_INDEX_TTL = float(os.environ.get('SEARCH_INDEX_TTL', 300))  # full reload interval (other workers' writes)
+GRAM = 3
+
+PRODUCT_FIELDS = ("id", "name", "price", "image_url", "category", "shop_id")
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _normalize(text):
+    return (text or "").strip().lower()
+
+
+class SearchIndex:
+    def __init__(self, ttl=SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._docs = {}        # id -> product row
+        self._names = {}       # id -> normalized name
+        self._grams = {}       # gram -> set(ids)
+        self._sorted_names = []  # sorted (name, id)
+        self._categories = {}  # normalized category -> set(ids)
+        self._words = []       # sorted (word, id) for autocomplete
+        self._loaded_at = None
+
+    # ---------- maintenance ----------
+    def load(self, rows):
+        with self._lock:
+            self._docs, self._names, self._grams, self._categories = {}, {}, {}, {}
+            self._sorted_names, self._words = [], []
+            for row in rows:
+                self._add(row)
+            self._sorted_names.sort()
+            self._words.sort()
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self):
+        return self._loaded_at is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl)
+
+    def upsert(self, row):
+        with self._lock:
+            self._remove(row["id"])
+            self._add(row, keep_sorted=True)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, row, keep_sorted=False):
+        pid = row["id"]
+        name = _normalize(row["name"])
+        self._docs[pid] = {k: row.get(k) for k in PRODUCT_FIELDS}
+        self._names[pid] = name
+        for n in range(1, GRAM + 1):
+            for g in _grams(name, n):
+                self._grams.setdefault(g, set()).add(pid)
+        self._categories.setdefault(_normalize(row.get("category")), set()).add(pid)
+        entries = [(self._sorted_names, (name, pid))] + [(self._words, (w, pid)) for w in set(name.split())]
+        for target, entry in entries:
+            if keep_sorted:
+                insort(target, entry)
+            else:
+                target.append(entry)
+
+    def _remove(self, pid):
+        doc = self._docs.pop(pid, None)
+        if doc is None:
+            return
+        name = self._names.pop(pid)
+        for n in range(1, GRAM + 1):
+            for g in _grams(name, n):
+                ids = self._grams[g]
+                ids.discard(pid)
+                if not ids:
+                    del self._grams[g]
+        category = _normalize(doc.get("category"))
+        self._categories[category].discard(pid)
+        if not self._categories[category]:
+            del self._categories[category]
+        entries = [(self._sorted_names, (name, pid))] + [(self._words, (w, pid)) for w in set(name.split())]
+        for target, entry in entries:
+            i = bisect_left(target, entry)
+            if i < len(target) and target[i] == entry:
+                del target[i]
+
+    # ---------- queries ----------
+    def __len__(self):
+        return len(self._docs)
+
+    def search(self, query, limit=None):
+        """Products whose name (or category) contains the query, best match first.
+
+        Buckets: exact name, name prefix, word prefix, substring, category;
+        name order within a bucket.
+        """
+        q = _normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            results = []
+            taken = set()
+
+            def take(pids):
+                for pid in pids:
+                    if pid not in taken:
+                        taken.add(pid)
+                        results.append(pid)
+                return limit is not None and len(results) >= limit
+
+            def best(pairs):
+                # (name, id) pairs in order, only as many as can still be used
+                if limit is None:
+                    return [pid for _, pid in sorted(pairs)]
+                return [pid for _, pid in heapq.nsmallest(limit - len(results), pairs)]
+
+            # Exact name and name prefix: one walk over the sorted names
+            i = bisect_left(self._sorted_names, (q,))
+            exact, prefix = [], []
+            while i < len(self._sorted_names):
+                name, pid = self._sorted_names[i]
+                if not name.startswith(q):
+                    break
+                (exact if name == q else prefix).append(pid)
+                i += 1
+                if limit is not None and len(exact) + len(prefix) >= limit and name != q:
+                    break
+            if take(exact) or take(prefix):
+                return self._rows(results, limit)
+
+            # A later word of the name starts with the query
+            i = bisect_left(self._words, (q,))
+            words = set()
+            while i < len(self._words) and self._words[i][0].startswith(q):
+                words.add(self._words[i][1])
+                i += 1
+            if take(best((self._names[pid], pid) for pid in words - taken)):
+                return self._rows(results, limit)
+
+            # Substring anywhere in the name: intersect gram postings, rarest first
+            n = min(GRAM, len(q))
+            postings = sorted((self._grams.get(g, set()) for g in _grams(q, n)), key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+            if take(best((self._names[pid], pid) for pid in candidates - taken if q in self._names[pid])):
+                return self._rows(results, limit)
+
+            # Category matches last
+            in_category = set()
+            for category, ids in self._categories.items():
+                if q in category:
+                    in_category |= ids
+            take(best((self._names[pid], pid) for pid in in_category - taken))
+            return self._rows(results, limit)
+
+    def _rows(self, pids, limit):
+        if limit is not None:
+            pids = pids[:limit]
+        return [self._docs[pid] for pid in pids]
+
+    def autocomplete(self, prefix, limit=10):
+        """Distinct product names having a word that starts with prefix."""
+        p = _normalize(prefix)
+        if not p:
+            return []
+        with self._lock:
+            suggestions = []
+            seen = set()
+            i = bisect_left(self._words, (p,))
+            while i < len(self._words) and len(suggestions) < limit:
+                word, pid = self._words[i]
+                if not word.startswith(p):
+                    break
+                name = self._docs[pid]["name"]
+                if name not in seen:
+                    seen.add(name)
+                    suggestions.append(name)
+                i += 1
+            return suggestions
+
+
+search_index = SearchIndex()
+_reload_lock = threading.Lock()
+
+
+def get_search_index():
+    """The shared index, (re)built from the products table when stale."""
+    if search_index.is_stale():
+        with _reload_lock:
+            if search_index.is_stale():
+                with db_connection(read=True, sticky=CATALOG) as conn:
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute("SELECT id, name, price, image_url, category, shop_id FROM products")
+                    rows = cursor.fetchall()
+                    cursor.close()
+                search_index.load(rows)
+    return search_index
+
+
+def refresh_product(conn, product_id):
+    """Re-read one product after a write and update the index with it; returns the row (or None)."""
+    row = run(conn, 'product_for_index', (product_id,)).first_dict()
+    if row is None:
+        search_index.remove(product_id)
+        return None
+    search_index.upsert(row)
+    return row
@@ -0,0 +1,195 @@
+"""Process-local spatial index of active shops.
+
+Shops are stored as unit vectors on a uniform 3D grid, so nearest-k lookups
+only look at nearby cells. Straight-line (chord) distance on the unit sphere
+orders points exactly like great-circle distance, so results are exact.
+"""
+import os
+import threading
+import time
+from math import radians, sin, cos, floor, sqrt
+
+from db import db_connection, SHOPS
+from geo import ShopCoords
+
+EARTH_RADIUS_KM = 6371.0
+# Smallest grid cell; sparse data gets bigger cells so each holds about one shop
+SHOP_INDEX_CELL_KM = float(os.environ.get('SHOP_INDEX_CELL_KM', 5))
+# Full reload interval, so changes made through other worker processes show up
+SHOP_INDEX_TTL = float(os.environ.get('SHOP_INDEX_TTL', 60))
+
+
+def _unit_vector(lat, lon):
+    la, lo = radians(float(lat)), radians(float(lon))
+    return (cos(la) * cos(lo), cos(la) * sin(lo), sin(la))
+
+
+class ShopIndex:
+    def __init__(self, cell_km=SHOP_INDEX_CELL_KM, ttl=SHOP_INDEX_TTL):
+        self.min_cell = cell_km / EARTH_RADIUS_KM  # cell edge in unit-sphere units
+        self.cell = self.min_cell
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._shops = {}     # shop_id -> {"latitude", "longitude", "status"}
+        self._points = {}    # shop_id -> (xyz, cell) for indexed (active) shops
+        self._cells = {}     # cell -> {shop_id: xyz}
+        self._coords = None  # ShopCoords snapshot of indexed shops, built on demand
+        self._loaded_at = None
+
+    # ---------- maintenance ----------
+    def load(self, rows):
+        """Replace the index contents with (shop_id, latitude, longitude, status) rows."""
+        rows = list(rows)
+        with self._lock:
+            self._shops, self._points, self._cells = {}, {}, {}
+            self._coords = None
+            self.cell = self._cell_size(rows)
+            for shop_id, lat, lon, status in rows:
+                self._put(shop_id, {"latitude": lat, "longitude": lon, "status": status})
+            self._loaded_at = time.monotonic()
+
+    def _cell_size(self, rows):
+        # Shops lie on a surface, so ~sqrt(n) cells per axis spreads them about one per cell
+        points = [_unit_vector(lat, lon) for _, lat, lon, status in rows
+                  if status == 'active' and lat is not None and lon is not None]
+        if len(points) < 2:
+            return self.min_cell
+        extent = max(max(p[i] for p in points) - min(p[i] for p in points) for i in range(3))
+        return max(self.min_cell, extent / sqrt(len(points)))
+
+    def is_stale(self):
+        return self._loaded_at is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl)
+
+    def upsert(self, shop_id, **fields):
+        """Apply a (possibly partial) change of latitude, longitude or status."""
+        with self._lock:
+            if shop_id not in self._shops and not {"latitude", "longitude", "status"} <= fields.keys():
+                # Partial change to a shop we have never seen: reload on next query
+                self._loaded_at = None
+                return
+            shop = dict(self._shops.get(shop_id, {}))
+            shop.update({k: v for k, v in fields.items() if k in ("latitude", "longitude", "status")})
+            self._drop(shop_id)
+            self._put(shop_id, shop)
+
+    def remove(self, shop_id):
+        with self._lock:
+            self._drop(shop_id)
+            self._shops.pop(shop_id, None)
+
+    def _cell_of(self, xyz):
+        return tuple(floor(c / self.cell) for c in xyz)
+
+    def _put(self, shop_id, shop):
+        self._shops[shop_id] = shop
+        if shop["status"] != 'active' or shop["latitude"] is None or shop["longitude"] is None:
+            return
+        xyz = _unit_vector(shop["latitude"], shop["longitude"])
+        cell = self._cell_of(xyz)
+        self._points[shop_id] = (xyz, cell)
+        self._coords = None
+        self._cells.setdefault(cell, {})[shop_id] = xyz
+
+    def _drop(self, shop_id):
+        point = self._points.pop(shop_id, None)
+        if point is None:
+            return
+        self._coords = None
+        members = self._cells[point[1]]
+        del members[shop_id]
+        if not members:
+            del self._cells[point[1]]
+
+    # ---------- queries ----------
+    def __len__(self):
+        return len(self._points)
+
+    def get(self, shop_id):
+        """(shop_id, latitude, longitude) of an active shop, or None."""
+        with self._lock:
+            if shop_id not in self._points:
+                return None
+            shop = self._shops[shop_id]
+            return (shop_id, shop["latitude"], shop["longitude"])
+
+    def coords(self):
+        """ShopCoords snapshot of the active shops, for vectorized distance work."""
+        with self._lock:
+            if self._coords is None:
+                self._coords = ShopCoords(
+                    (sid, self._shops[sid]["latitude"], self._shops[sid]["longitude"])
+                    for sid in self._points
+                )
+            return self._coords
+
+    def nearest(self, lat, lon, k=1):
+        """The k active shops closest to (lat, lon), nearest first, as (shop_id, latitude, longitude)."""
+        with self._lock:
+            if not self._points:
+                return []
+            best = self._search(lat, lon, k)
+            return [(sid, self._shops[sid]["latitude"], self._shops[sid]["longitude"]) for sid in best]
+
+    def _search(self, lat, lon, k):
+        q = _unit_vector(lat, lon)
+        qc = self._cell_of(q)
+        found = []
+        visited = 0
+        r = 0
+        while True:
+            # Once the walk would touch more cells than there are shops, a flat scan is cheaper
+            shell_size = (2 * r + 1) ** 3 - (2 * r - 1) ** 3 if r else 1
+            visited += shell_size
+            if visited > len(self._points):
+                coords = self.coords()
+                return [coords.shop_ids[i] for i in coords.nearest(lat, lon, k)]
+
+            for cell in _shell(qc, r):
+                members = self._cells.get(cell)
+                if members:
+                    found.extend((_dist2(q, xyz), sid) for sid, xyz in members.items())
+
+            # Anything outside the searched cube is at least r cells away
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= (r * self.cell) ** 2:
+                    return [sid for _, sid in found[:k]]
+            r += 1
+
+
+def _dist2(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def _shell(center, r):
+    """Cells at Chebyshev distance exactly r from center."""
+    cx, cy, cz = center
+    if r == 0:
+        yield center
+        return
+    for dx in range(-r, r + 1):
+        for dy in range(-r, r + 1):
+            if abs(dx) == r or abs(dy) == r:
+                for dz in range(-r, r + 1):
+                    yield (cx + dx, cy + dy, cz + dz)
+            else:
+                yield (cx + dx, cy + dy, cz - r)
+                yield (cx + dx, cy + dy, cz + r)
+
+
+shop_index = ShopIndex()
+_reload_lock = threading.Lock()
+
+
+def get_shop_index():
+    """The shared index, (re)loaded from the shops table when stale."""
+    if shop_index.is_stale():
+        with _reload_lock:
+            if shop_index.is_stale():
+                with db_connection(read=True, sticky=SHOPS) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT shop_id, latitude, longitude, status FROM shops")
+                    rows = cursor.fetchall()
+                    cursor.close()
+                shop_index.load(rows)
+    return shop_index
@@ -0,0 +1,113 @@
+"""Registry of the hot SQL statements, run as server-side prepared statements.
+
+run(conn, name, params) executes a statement from STATEMENTS (or any SQL
+text, e.g. a keyset page built by paging.py) through mysql-connector's
+prepared cursor. Each pooled connection prepares a statement the first
+time it runs it and then keeps it, so later calls only send the
+parameters in the binary protocol. The server neither parses nor plans
+the statement again, and no SQL string is formatted on the client.
+
+Results are read completely before run() returns. A prepared statement
+with rows left unread would block the next statement on the connection.
+DB_PREPARED_STATEMENTS=0 falls back to ordinary text-protocol cursors.
+"""
+import os
+from collections import OrderedDict
+
+from json_provider import RowSet
+from metrics import instrument_cursor
+
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') == '1'
+# Statements kept per connection (the server's max_prepared_stmt_count is shared by all)
+PREPARED_CACHE_SIZE = int(os.environ.get('DB_PREPARED_CACHE_SIZE', 64))
+
+STATEMENTS = {
+    'product_for_index': "SELECT id, name, price, image_url, category, shop_id FROM products WHERE id = %s",
+    'cart_for_user': """SELECT id, user_id, pickle_name, quantity, cost, added_at, shop_id
+        FROM cart WHERE user_id = %s""",
+    'cart_fingerprint': "SELECT COUNT(*), MAX(id) FROM cart WHERE user_id = %s",
+    'orders_fingerprint': "SELECT COUNT(*), MAX(id) FROM orders WHERE user_id = %s",
+    'shop_by_email': "SELECT * FROM shops WHERE email = %s",
+    'shop_card_by_email': "SELECT shop_id, shop_name, image_url, address, status FROM shops WHERE email = %s",
+    'shop_email_taken': "SELECT 1 FROM shops WHERE email = %s",
+}
+
+
+class Result:
+    """Everything a statement returned: column names, row tuples, rowcount, lastrowid."""
+    __slots__ = ('columns', 'rows', 'rowcount', 'lastrowid')
+
+    def __init__(self, columns, rows, rowcount, lastrowid):
+        self.columns = columns
+        self.rows = rows
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def first_dict(self):
+        return dict(zip(self.columns, self.rows[0])) if self.rows else None
+
+    def rowset(self, **kwargs):
+        return RowSet(self.columns, self.rows, **kwargs)
+
+
+def _prepared_cursor(raw, sql):
+    """(cursor, statement text, cache) for sql on this connection.
+
+    The driver re-prepares unless it is handed the *same* string object as
+    last time, so the first text seen is kept and reused.
+    """
+    cache = getattr(raw, '_prepared_statements', None)
+    if cache is None:
+        cache = OrderedDict()
+        raw._prepared_statements = cache  # dies with the connection, which frees the statements
+    entry = cache.get(sql)
+    if entry is not None:
+        cache.move_to_end(sql)
+        return entry[0], entry[1], cache
+    cursor = raw.cursor(prepared=True)
+    cache[sql] = (cursor, sql)
+    if len(cache) > PREPARED_CACHE_SIZE:
+        _, (evicted, _) = cache.popitem(last=False)
+        _close_quietly(evicted)  # deallocates the server-side statement
+    return cursor, sql, cache
+
+
+def _close_quietly(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+def run(conn, name, params=()):
+    """Execute STATEMENTS[name] (or the SQL text `name`) on a pooled connection; returns a Result."""
+    sql = STATEMENTS.get(name, name)
+    if not DB_PREPARED_STATEMENTS:
+        cursor = conn.cursor()
+        try:
+            return _execute(cursor, sql, params)
+        finally:
+            cursor.close()
+
+    cursor, sql, cache = _prepared_cursor(conn.driver_connection, sql)
+    try:
+        return _execute(instrument_cursor(cursor), sql, params)
+    except Exception:
+        # Re-prepare next time rather than reuse a statement in an unknown state
+        cache.pop(sql, None)
+        _close_quietly(cursor)
+        raise
+
+
+def _execute(cursor, sql, params):
+    cursor.execute(sql, tuple(params))
+    columns = tuple(d[0] for d in cursor.description) if cursor.description else ()
+    rows = cursor.fetchall() if columns else []
+    result = Result(columns, rows, cursor.rowcount, cursor.lastrowid)
+    flush = getattr(cursor, 'flush', None)
+    if flush:
+        flush()  # record the statement's metrics now; the cursor outlives the request
+    return result
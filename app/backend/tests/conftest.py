@@ -0,0 +1,127 @@
+"""Shared fixtures: the app runs against the SQLite stand-in in benchmarks/sqlite_db.py."""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, 'benchmarks'))
+
+# Set before the app modules read them at import time
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('IMAGE_CACHE_DIR', tempfile.mkdtemp(prefix='taaja-test-images-'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+import pytest
+
+import db
+import sqlite_db
+
+
+@pytest.fixture
+def database(tmp_path):
+    """An empty schema; every pooled connection opens this file."""
+    path = str(tmp_path / 'shop.db')
+    sqlite_db.create_schema(path)
+    db.use_connection_factory(sqlite_db.factory(path))
+    return path
+
+
+@pytest.fixture
+def seeded(database):
+    """A few shops, products, users, cart rows and orders; see sqlite_db.seed()."""
+    with db.db_connection() as conn:
+        data = sqlite_db.seed(conn.cursor(), shops=3, products_per_shop=4, users=3,
+                              cart_items=0, orders=6)
+        conn.commit()
+    return data
+
+
+@pytest.fixture
+def client(database):
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_state():
+    """Drop what the process-wide caches and indexes kept from the last test."""
+    yield
+    from catalog_cache import catalog_cache, shops_cache
+    from coalesce import coalescer
+    from etags import user_tags
+    from search_index import search_index
+    from shop_index import shop_index
+    catalog_cache.clear()
+    shops_cache.clear()
+    user_tags.clear()
+    coalescer.clear()
+    search_index._loaded_at = None
+    shop_index._loaded_at = None
+
+
+class Upstream:
+    """A local image host: serves self.files (path -> (content_type, body)) with ETags."""
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []  # (path, If-None-Match) per request
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                upstream.requests.append((self.path, self.headers.get('If-None-Match')))
+                if self.path not in upstream.files:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                content_type, body = upstream.files[self.path]
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def hits(self, path):
+        return sum(1 for p, _ in self.requests if p == path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    """An empty image cache in its own directory."""
+    import image_cache
+    cache = image_cache.ImageCache(str(tmp_path / 'images'))
+    monkeypatch.setattr(image_cache, 'image_cache', cache)
+    return cache
@@ -0,0 +1,123 @@
+import asyncio
+import os
+from io import BytesIO
+
+import httpx
+import pytest
+from PIL import Image
+
+import asgi
+from search_index import search_index
+from shop_index import shop_index
+
+
+def _png():
+    out = BytesIO()
+    Image.new('RGB', (64, 32), 'red').save(out, 'PNG')
+    return out.getvalue()
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """Run requests(client) against the ASGI app on a fresh event loop."""
+    def run(requests):
+        async def main():
+            monkeypatch.setattr(asgi, '_client', None)  # the upstream client belongs to one loop
+            transport = httpx.ASGITransport(app=asgi.application)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                    return await requests(client)
+            finally:
+                if asgi._client is not None:
+                    await asgi._client.aclose()
+        return asyncio.run(main())
+    return run
+
+
+def test_concurrent_image_requests_share_one_fetch(run, images, upstream):
+    upstream.files['/a.png'] = ('image/png', _png())
+    url = upstream.url('/a.png')
+
+    async def requests(client):
+        responses = await asyncio.gather(*[client.get('/proxy_image', params={"url": url}) for _ in range(5)])
+        again = await client.get('/proxy_image', params={"url": url},
+                                 headers={"If-None-Match": responses[0].headers['etag']})
+        return responses, again
+
+    responses, again = run(requests)
+    assert [r.status_code for r in responses] == [200] * 5
+    assert responses[0].content == _png()
+    assert responses[0].headers['access-control-allow-origin'] == '*'
+    assert upstream.hits('/a.png') == 1
+    assert again.status_code == 304
+
+
+def test_variants_match_the_flask_route(run, client, images, upstream):
+    upstream.files['/a.png'] = ('image/png', _png())
+    query = {"url": upstream.url('/a.png'), "width": "16", "format": "jpeg"}
+
+    async def requests(client):
+        return await client.get('/proxy_image', params=query)
+
+    response = run(requests)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'image/jpeg'
+    assert Image.open(BytesIO(response.content)).size == (16, 8)
+    assert client.get('/proxy_image', query_string=query).data == response.content
+
+
+def test_image_errors(run, images, upstream):
+    async def requests(client):
+        return (await client.get('/proxy_image'),
+                await client.get('/proxy_image', params={"url": upstream.url('/a.png'), "quality": "0"}),
+                await client.get('/proxy_image', params={"url": upstream.url('/missing.png')}))
+
+    missing_url, bad_param, upstream_404 = run(requests)
+    assert missing_url.status_code == 400 and missing_url.json() == {"error": "Missing URL"}
+    assert bad_param.status_code == 400
+    assert upstream_404.status_code == 400
+
+
+def test_oversized_images_are_refused(run, images, upstream, monkeypatch):
+    monkeypatch.setattr(asgi, 'IMAGE_MAX_BYTES', 100)  # the writer's limit; stops the download mid-stream
+    upstream.files['/a.png'] = ('image/png', _png())
+
+    async def requests(client):
+        return await client.get('/proxy_image', params={"url": upstream.url('/a.png')})
+
+    response = run(requests)
+    assert response.status_code == 400 and "larger than" in response.json()["error"]
+    assert [e.name for e in os.scandir(images.directory)] == []
+
+
+def test_other_routes_run_the_flask_app(run, seeded):
+    user_id = seeded["user_ids"][0]
+    shop_id, name, price = seeded["products"][0]
+
+    async def requests(client):
+        products = await client.get('/products')
+        added = await client.post('/add_to_cart', json={"user_id": user_id, "items": [
+            {"pickle_name": name, "quantity": 1, "cost": price, "shop_id": shop_id}]})
+        cart = await client.get('/your_cart', params={"user_id": user_id})
+        return products, added, cart
+
+    products, added, cart = run(requests)
+    assert len(products.json()["products"]) == len(seeded["products"])
+    assert added.json() == {"success": True}
+    assert [item["pickle_name"] for item in cart.json()["cart_items"]] == [name]
+
+
+def test_startup_builds_the_indexes(seeded):
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi.application({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert not shop_index.is_stale() and len(shop_index) == len(seeded["shop_ids"])
+    assert not search_index.is_stale() and len(search_index) == len(seeded["products"])
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import auth
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHOP = {"shop_name": "Amma Pickles", "email": "amma@example.com", "password": "s3cret",
+        "latitude": 17.4, "longitude": 78.5}
+
+
+def _register(client, **fields):
+    return client.post('/shop_register', json=dict(SHOP, **fields)).get_json()
+
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_password_hashing():
+    hashed = auth.hash_password("s3cret").decode()
+    assert auth.check_password("s3cret", hashed)
+    assert not auth.check_password("wrong", hashed)
+
+
+def test_register_and_login_issue_tokens(client, database):
+    registered = _register(client)
+    assert registered["status"] == "ok" and registered["token"]
+
+    login = client.post('/shop_login', json={"email": SHOP["email"], "password": SHOP["password"]}).get_json()
+    assert login["shop"]["shop_id"] == registered["shop_id"]
+    with client.application.app_context():
+        assert auth.verify_shop_token(login["token"]) == {"shop_id": registered["shop_id"]}
+
+
+def test_login_with_a_wrong_password(client, database):
+    _register(client)
+    response = client.post('/shop_login', json={"email": SHOP["email"], "password": "nope"})
+    assert response.status_code == 400
+    assert "token" not in response.get_json()
+    assert _register(client)["message"] == "Email already registered"
+
+
+def test_owner_routes_check_the_token(client, database):
+    mine = _register(client)
+    other = _register(client, email="other@example.com")
+    product = {"shop_id": mine["shop_id"], "name": "Avakaya", "category": "pickles",
+               "price": 120, "quantity_in_stock": 4}
+
+    assert client.post('/add_owner_product', json=product,
+                       headers=_bearer(mine["token"])).status_code == 200
+    assert client.post('/add_owner_product', json=product,
+                       headers=_bearer(other["token"])).status_code == 403
+    assert client.post('/add_owner_product', json=product,
+                       headers=_bearer("forged")).status_code == 401
+
+    product_id = client.post('/ownerproducts', json={"shop_id": mine["shop_id"]},
+                             headers=_bearer(mine["token"])).get_json()[0]["id"]
+    update = dict(product, product_id=product_id, price=130)
+    assert client.post('/update_product_owner', json=update,
+                       headers=_bearer(other["token"])).status_code == 403
+    assert client.post('/delete_owner_product', json={"product_id": product_id},
+                       headers=_bearer(other["token"])).status_code == 403
+    assert client.post('/delete_owner_product', json={"product_id": product_id},
+                       headers=_bearer(mine["token"])).status_code == 200
+
+
+def test_missing_token_is_refused_when_required(client, database, monkeypatch):
+    shop = _register(client)
+    assert client.put(f'/update-owner-details/{shop["shop_id"]}', json={"city": "Guntur"}).status_code == 200
+    monkeypatch.setattr(auth, 'SHOP_AUTH_REQUIRED', True)
+    assert client.put(f'/update-owner-details/{shop["shop_id"]}', json={"city": "Guntur"}).status_code == 401
+
+
+def test_required_auth_needs_a_secret_key():
+    env = dict(os.environ, SHOP_AUTH_REQUIRED='1')
+    env.pop('SECRET_KEY', None)
+    result = subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "SECRET_KEY" in result.stderr
+
+
+def test_missing_secret_key_is_logged():
+    env = dict(os.environ)
+    env.pop('SECRET_KEY', None)
+    env.pop('SHOP_AUTH_REQUIRED', None)
+    result = subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "SECRET_KEY is not set" in result.stderr and result.stdout == ""
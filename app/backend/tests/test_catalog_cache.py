@@ -0,0 +1,75 @@
+from catalog_cache import CatalogCache, catalog_cache, content_tag
+from coalesce import coalescer
+
+
+def _loader(value, calls):
+    def load():
+        calls.append(value)
+        return value
+    return load
+
+
+def test_loads_once_until_invalidated():
+    cache, calls = CatalogCache(), []
+    assert cache.get_or_load('a', _loader([1], calls), shop_id=1) == [1]
+    assert cache.get_or_load('a', _loader([2], calls), shop_id=1) == [1]
+    assert calls == [[1]]
+    cache.invalidate_shop(1)
+    assert cache.get_or_load('a', _loader([2], calls), shop_id=1) == [2]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_shop_write_drops_that_shop_and_the_global_entries_only():
+    cache, calls = CatalogCache(), []
+    cache.get_or_load('all', _loader('all', calls))
+    cache.get_or_load('one', _loader('one', calls), shop_id=1)
+    cache.get_or_load('two', _loader('two', calls), shop_id=2)
+    cache.invalidate_shop(1)
+    assert cache.fresh_tag('all') is None
+    assert cache.fresh_tag('one') is None
+    assert cache.fresh_tag('two') == content_tag('two')
+
+
+def test_load_racing_a_write_is_not_stored():
+    cache = CatalogCache()
+
+    def load():
+        cache.invalidate_shop(1)  # a write lands while the rows are being read
+        return ['stale']
+
+    value, tag = cache.get_or_load_tagged('a', load, shop_id=1)
+    assert value == ['stale'] and tag is None
+    assert cache.fresh_tag('a') is None
+
+
+def test_expired_and_evicted_entries_reload():
+    cache, calls = CatalogCache(ttl=0), []
+    cache.get_or_load('a', _loader(1, calls))
+    cache.get_or_load('a', _loader(1, calls))
+    assert len(calls) == 2
+
+    cache = CatalogCache(max_entries=2)
+    for key in 'abc':
+        cache.get_or_load(key, _loader(key, calls))
+    assert cache.fresh_tag('a') is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_tags_follow_content():
+    assert content_tag({"a": [1, 2]}) == content_tag({"a": [1, 2]})
+    assert content_tag({"a": [1, 2]}) != content_tag({"a": [2, 1]})
+
+
+def test_items_are_cached_until_a_product_write(client, seeded, monkeypatch):
+    monkeypatch.setattr(coalescer, 'enabled', False)
+    shop_id = seeded["shop_ids"][0]
+    before = client.get(f'/items/{shop_id}').get_json()
+    hits = catalog_cache.stats()["hits"]
+    assert client.get(f'/items/{shop_id}').get_json() == before
+    assert catalog_cache.stats()["hits"] == hits + 1
+
+    client.post('/add_owner_product', json={"shop_id": shop_id, "name": "Fresh Ginger", "category": "pickles",
+                                            "price": 75, "quantity_in_stock": 3})
+    after = client.get(f'/items/{shop_id}').get_json()
+    assert len(after) == len(before) + 1
+    assert any(item["name"] == "Fresh Ginger" for item in client.get('/products').get_json()["products"])
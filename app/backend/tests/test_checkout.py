@@ -0,0 +1,80 @@
+import pytest
+
+import db
+import metrics
+
+
+def _add(client, user_id, *products, quantity=2, cost=0.01):
+    items = [{"pickle_name": name, "quantity": quantity, "cost": cost, "shop_id": shop_id}
+             for shop_id, name, _ in products]
+    assert client.post('/add_to_cart', json={"user_id": user_id, "items": items}).get_json() == {"success": True}
+
+
+def _checkout(client, user_id):
+    return client.post('/buy_now', json={"user_id": user_id, "from_cart": True,
+                                         "latitude": 17.385, "longitude": 78.4867})
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """Count SQL statements run through instrumented cursors."""
+    seen = []
+    observe = metrics.db_latency.observe
+
+    def counting(labels, value):
+        seen.append(labels)
+        observe(labels, value)
+    monkeypatch.setattr(metrics.db_latency, 'observe', counting)
+    return seen
+
+
+def test_checkout_orders_the_cart_at_current_prices(client, seeded):
+    user_id = seeded["user_ids"][0]
+    products = seeded["products"]
+    _add(client, user_id, products[0], products[4])
+
+    response = _checkout(client, user_id)
+    body = response.get_json()
+    assert response.status_code == 200 and body["success"]
+    assert [(o["shop_id"], o["pickle_name"], o["quantity"]) for o in body["orders"]] == \
+        [(shop_id, name, 2) for shop_id, name, _ in (products[0], products[4])]
+    assert [o["cost"] for o in body["orders"]] == [round(price * 2, 2) for _, _, price in (products[0], products[4])]
+    assert sorted(s["shop_id"] for s in body["shops"]) == sorted({products[0][0], products[4][0]})
+    for order in body["orders"]:
+        assert order["final_cost"] == pytest.approx(order["cost"] + order["delivery_charge"])
+
+    assert client.get('/your_cart', query_string={"user_id": user_id}).get_json()["cart_items"] == []
+    names = [o["pickles"] for o in client.get('/orders_info', query_string={"user_id": user_id}).get_json()["orders"]]
+    assert products[0][1] in names and products[4][1] in names
+
+
+def test_checkout_statement_count_does_not_grow_with_the_cart(client, seeded, statements):
+    small, large, warm = seeded["user_ids"]
+    _add(client, warm, seeded["products"][0])
+    _checkout(client, warm)  # loads the shop index
+    _add(client, small, seeded["products"][0])
+    _add(client, large, *seeded["products"][:6])
+
+    statements.clear()
+    assert _checkout(client, small).status_code == 200
+    small_count = len(statements)
+    assert small_count >= 3
+    statements.clear()
+    assert len(_checkout(client, large).get_json()["orders"]) == 6
+    assert len(statements) == small_count
+
+
+def test_checkout_errors(client, seeded):
+    user_id = seeded["user_ids"][0]
+    assert client.post('/buy_now', json={"user_id": user_id, "from_cart": True}).status_code == 400
+    empty = _checkout(client, user_id)
+    assert empty.status_code == 400 and empty.get_json()["message"] == "Cart is empty"
+
+    shop_id, name, _ = seeded["products"][0]
+    _add(client, user_id, seeded["products"][0], seeded["products"][1])
+    with db.db_connection() as conn:
+        conn.cursor().execute("DELETE FROM products WHERE shop_id = %s AND name = %s", (shop_id, name))
+        conn.commit()
+    gone = _checkout(client, user_id)
+    assert gone.status_code == 409 and gone.get_json()["unavailable"] == [name]
+    assert len(client.get('/your_cart', query_string={"user_id": user_id}).get_json()["cart_items"]) == 2
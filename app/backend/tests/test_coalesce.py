@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+
+import pytest
+from flask import jsonify
+
+import app as backend
+from coalesce import Coalescer, coalescer
+
+
+@pytest.fixture
+def context():
+    with backend.app.test_request_context():
+        yield
+
+
+def _json(body, tag=None, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    if tag:
+        response.set_etag(tag)
+    return response
+
+
+def _concurrent(coalescing, key, build, followers=4, tag=None):
+    """Run one leader and `followers` identical requests while build() is blocked."""
+    release = threading.Event()
+    results = [None] * (followers + 1)
+
+    def blocked_build():
+        release.wait(5)
+        return build()
+
+    def request(i):
+        with backend.app.test_request_context():
+            response = coalescing.respond(key, blocked_build, tag)
+            results[i] = (response.status_code, response.get_data())
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(followers + 1)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coalescing.stats()["collapsed"] < followers and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_followers_share_the_leaders_response():
+    coalescing = Coalescer(grace=0)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _json({"n": len(calls)}, tag="v1")
+
+    results = _concurrent(coalescing, ('/products',), build)
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+    status, body = results[0]
+    assert status == 200 and json.loads(body) == {"n": 1}
+    stats = coalescing.stats()
+    assert (stats["leaders"], stats["collapsed"], stats["in_flight"]) == (1, 4, 0)
+
+
+def test_errors_are_not_shared():
+    coalescing = Coalescer(grace=0)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _json({"error": "down"}, status=500)
+
+    results = _concurrent(coalescing, ('/shops',), build, followers=2)
+    assert len(calls) == 3 and {status for status, _ in results} == {500}
+    assert coalescing.stats()["fallbacks"] == 2
+
+
+def test_untagged_responses_are_not_shared():
+    coalescing = Coalescer(grace=60)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _json({"n": len(calls)})
+
+    results = _concurrent(coalescing, ('/your_cart',), build, followers=2)
+    assert len(calls) == 3 and sorted(json.loads(body)["n"] for _, body in results) == [1, 2, 3]
+    assert coalescing.stats()["fallbacks"] == 2
+
+
+def test_grace_reuse_needs_the_current_tag(context):
+    coalescing = Coalescer(grace=60)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _json({"n": len(calls)}, tag="v1")
+
+    coalescing.respond(('/items', 1), build, None)
+    assert coalescing.respond(('/items', 1), build, "v1").get_data() == coalescing.respond(
+        ('/items', 1), build, "v1").get_data()
+    assert len(calls) == 1 and coalescing.stats()["grace_hits"] == 2
+    coalescing.respond(('/items', 1), build, "v2")  # a write replaced the page
+    coalescing.respond(('/items', 1), build, None)  # not cached
+    coalescing.respond(('/items', 2), build, "v1")  # another key
+    assert len(calls) == 4
+
+    coalescing.clear()
+    coalescing.respond(('/items', 1), build, "v1")
+    assert len(calls) == 5
+
+
+def test_shared_response_honours_if_none_match():
+    coalescing = Coalescer(grace=60)
+    with backend.app.test_request_context():
+        coalescing.respond(('/shops',), lambda: _json({"n": 1}, tag="v1"))
+    with backend.app.test_request_context(headers={"If-None-Match": '"v1"'}):
+        assert coalescing.respond(('/shops',), lambda: _json({"n": 2}, tag="v1"), "v1").status_code == 304
+
+
+def test_disabled(context):
+    coalescing = Coalescer(grace=60)
+    coalescing.enabled = False
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _json({}, tag="v1")
+
+    for _ in range(3):
+        coalescing.respond(('/products',), build, "v1")
+    assert len(calls) == 3 and coalescing.stats()["leaders"] == 0
+
+
+def test_products_route_reuses_a_recent_body(client, seeded, monkeypatch):
+    monkeypatch.setattr(coalescer, 'grace', 60)
+    before = coalescer.stats()
+    first = client.get('/products')
+    second = client.get('/products')
+    after = client.get('/cache_stats').get_json()["coalescing"]
+    assert first.data == second.data and first.headers['ETag'] == second.headers['ETag']
+    assert after["grace_hits"] == before["grace_hits"] + 1
+    assert after["leaders"] == before["leaders"] + 1
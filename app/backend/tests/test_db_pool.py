@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+import db
+
+
+class FakeConnection:
+    def __init__(self, **config):
+        self.closed = False
+        self.in_transaction = False
+        self.rolled_back = False
+        self.ping_error = None
+
+    def ping(self, reconnect=False):
+        if self.ping_error:
+            raise self.ping_error
+
+    def rollback(self):
+        self.rolled_back = True
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect(**config):
+        conn = FakeConnection(**config)
+        opened.append(conn)
+        return conn
+    return db.ConnectionPool({}, size=2, max_overflow=1, timeout=0.1, connect=connect)
+
+
+def test_connections_are_reused(pool, opened):
+    with pool.connect():
+        pass
+    with pool.connect():
+        pass
+    assert len(opened) == 1
+    assert pool.stats()["checkouts"] == 2
+    assert pool.stats()["idle"] == 1
+
+
+def test_checkout_times_out_when_pool_and_overflow_are_used_up(pool, opened):
+    held = [pool.connect() for _ in range(3)]
+    with pytest.raises(db.PoolTimeout):
+        pool.connect()
+    assert pool.stats()["timeouts"] == 1
+
+    for conn in held:
+        conn.close()
+    # Two stay idle; the overflow connection is closed instead
+    assert [conn.closed for conn in opened] == [False, False, True]
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["idle"] == 2
+
+
+def test_waiting_checkout_gets_a_released_connection(pool):
+    held = [pool.connect() for _ in range(3)]
+    timer = threading.Timer(0.02, held[0].close)
+    timer.start()
+    pool.timeout = 2
+    with pool.connect():
+        pass
+    timer.join()
+    for conn in held[1:]:
+        conn.close()
+
+
+def test_failed_ping_replaces_the_connection(pool, opened):
+    with pool.connect():
+        pass
+    opened[0].ping_error = ConnectionError("server has gone away")
+    with pool.connect() as conn:
+        assert conn.driver_connection is opened[1]
+    assert opened[0].closed
+    assert pool.stats()["ping_failures"] == 1
+
+
+def test_open_transaction_is_rolled_back_on_release(pool, opened):
+    conn = pool.connect()
+    opened[0].in_transaction = True
+    conn.close()
+    assert opened[0].rolled_back
+
+
+def test_stale_connections_are_recycled(pool, opened):
+    pool.recycle = 0.000001
+    with pool.connect():
+        pass
+    with pool.connect():
+        pass
+    assert opened[0].closed
+    assert pool.stats()["recycled"] == 1
+
+
+def test_returned_connection_cannot_be_used(pool):
+    conn = pool.connect()
+    conn.close()
+    with pytest.raises(AttributeError):
+        conn.cursor()
+
+
+def test_connect_error_frees_the_slot(opened):
+    def refuse(**config):
+        raise ConnectionError("refused")
+    pool = db.ConnectionPool({}, size=1, max_overflow=0, timeout=0.1, connect=refuse)
+    with pytest.raises(ConnectionError):
+        pool.connect()
+    assert pool.stats()["opened"] == 0
+    assert pool.stats()["in_use"] == 0
+
+
+def test_db_connection_rolls_back_on_error(database):
+    with pytest.raises(RuntimeError):
+        with db.db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO users (name, email) VALUES (%s, %s)", ("A", "a@example.com"))
+            raise RuntimeError("route failed")
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        assert cursor.fetchone()[0] == 0
+
+
+def test_pool_stats_route(client):
+    response = client.get('/db_pool_stats')
+    assert response.status_code == 200
+    assert {"size", "in_use", "checkouts"} <= response.get_json()["pool"].keys()
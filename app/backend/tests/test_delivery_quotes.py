@@ -0,0 +1,52 @@
+import pytest
+
+POINTS = [{"latitude": 17.385, "longitude": 78.4867}, {"latitude": 17.45, "longitude": 78.38},
+          {"latitude": "17.3", "longitude": "78.55"}]
+
+
+def _quotes(client, **body):
+    return client.post('/delivery_quotes', json={"points": POINTS, **body})
+
+
+def test_matrix_matches_distance_finder(client, seeded):
+    body = _quotes(client).get_json()
+    assert body["success"] and sorted(body["shop_ids"]) == sorted(seeded["shop_ids"])
+    assert body["unknown_shop_ids"] == []
+    for point, distances, charges in zip(POINTS, body["distance_km"], body["delivery_charge"]):
+        for shop_id, distance_km, charge in zip(body["shop_ids"], distances, charges):
+            single = client.post('/distance_finder', json={
+                **point, "shop_id": shop_id, "items": [{"cost": 1, "quantity": 1}]}).get_json()
+            assert (single["shop_id"], single["distance_km"], single["delivery_charge"]) == \
+                (shop_id, distance_km, charge)
+
+
+def test_requested_shops_keep_their_order(client, seeded):
+    shop_ids = seeded["shop_ids"]
+    everything = _quotes(client).get_json()
+    body = _quotes(client, shop_ids=[shop_ids[2], 999, str(shop_ids[0]), "x"]).get_json()
+    assert body["shop_ids"] == [shop_ids[2], shop_ids[0]]
+    assert body["unknown_shop_ids"] == [999, "x"]
+    column = everything["shop_ids"].index(shop_ids[2])
+    assert [row[0] for row in body["distance_km"]] == [row[column] for row in everything["distance_km"]]
+
+
+def test_no_known_shops(client, seeded):
+    response = _quotes(client, shop_ids=[999])
+    assert response.status_code == 404
+    assert response.get_json()["unknown_shop_ids"] == [999]
+
+
+@pytest.mark.parametrize("points", [None, [], [{"latitude": 17.4}], [{"latitude": 91, "longitude": 78}],
+                                    [{"latitude": "north", "longitude": 78}]])
+def test_bad_points(client, seeded, points):
+    assert client.post('/delivery_quotes', json={"points": points}).status_code == 400
+
+
+def test_request_size_limits(client, seeded, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'QUOTE_MATRIX_MAX_POINTS', 2)
+    assert "At most 2 points" in _quotes(client).get_json()["message"]
+    monkeypatch.setattr(app, 'QUOTE_MATRIX_MAX_POINTS', 1000)
+    monkeypatch.setattr(app, 'QUOTE_MATRIX_MAX_CELLS', len(POINTS) * len(seeded["shop_ids"]) - 1)
+    assert _quotes(client).status_code == 400
+    assert _quotes(client, shop_ids=seeded["shop_ids"][:1]).status_code == 200
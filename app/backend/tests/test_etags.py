@@ -0,0 +1,97 @@
+from catalog_cache import catalog_cache, shops_cache
+from etags import RecentTags, fingerprint
+
+
+def test_fingerprint_is_stable():
+    assert fingerprint('cart', 1, 3) == fingerprint('cart', 1, 3)
+    assert fingerprint('cart', 1, 3) != fingerprint('cart', 1, 4)
+
+
+def test_recent_tags_skip_the_compute_within_the_ttl():
+    tags, calls = RecentTags(ttl=60), []
+    compute = lambda: calls.append(1) or f"tag{len(calls)}"
+    assert tags.get_or_compute('k', compute) == 'tag1'
+    assert tags.get_or_compute('k', compute) == 'tag1'
+    tags.invalidate('k')
+    assert tags.get_or_compute('k', compute) == 'tag2'
+    assert tags.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_tag_computed_across_a_write_is_not_kept():
+    tags = RecentTags(ttl=60)
+
+    def compute():
+        tags.invalidate('k')  # a write lands while the tag is being computed
+        return 'old'
+
+    assert tags.get_or_compute('k', compute) == 'old'
+    assert tags.get_or_compute('k', lambda: 'new') == 'new'
+
+
+def _conditional(client, url, response):
+    return client.get(url, headers={"If-None-Match": response.headers['ETag']})
+
+
+def test_catalog_lists_answer_304_until_they_change(client, seeded):
+    shop_id = seeded["shop_ids"][0]
+    for url in ('/products', f'/items/{shop_id}', '/shops'):
+        first = client.get(url)
+        assert first.headers['ETag']
+        assert _conditional(client, url, first).status_code == 304
+
+    products = client.get('/products')
+    client.post('/add_owner_product', json={"shop_id": shop_id, "name": "Red Chilli", "category": "pickles",
+                                            "price": 60, "quantity_in_stock": 9})
+    changed = _conditional(client, '/products', products)
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != products.headers['ETag']
+
+
+def test_equal_content_gives_the_same_tag(client, seeded):
+    first = client.get('/products')
+    catalog_cache.clear()  # as if another worker or a restart served the next request
+    assert client.get('/products').headers['ETag'] == first.headers['ETag']
+
+
+def test_expired_cache_entries_still_answer_304(client, seeded, monkeypatch):
+    monkeypatch.setattr(catalog_cache, 'ttl', 0)
+    monkeypatch.setattr(shops_cache, 'ttl', 0)
+    for url in ('/products', '/products?limit=2', f'/items/{seeded["shop_ids"][0]}', '/shops'):
+        first = client.get(url)
+        assert first.status_code == 200
+        again = _conditional(client, url, first)
+        assert again.status_code == 304, url
+        assert again.headers['ETag'] == first.headers['ETag'] and again.data == b''
+
+
+def test_cart_tag_changes_with_the_cart(client, seeded):
+    user_id = seeded["user_ids"][0]
+    shop_id, name, price = seeded["products"][0]
+    url = f'/your_cart?user_id={user_id}'
+    cart = client.get(url)
+    assert _conditional(client, url, cart).status_code == 304
+
+    client.post('/add_to_cart', json={"user_id": user_id, "items": [
+        {"pickle_name": name, "quantity": 1, "cost": price, "shop_id": shop_id}]})
+    changed = _conditional(client, url, cart)
+    assert changed.status_code == 200
+    assert len(changed.get_json()["cart_items"]) == 1
+
+
+def test_order_pages_have_their_own_tags(client, seeded):
+    user_id = seeded["user_ids"][0]
+    url = f'/orders_info?user_id={user_id}'
+    everything = client.get(url)
+    page = client.get(url + '&limit=1')
+    assert everything.headers['ETag'] != page.headers['ETag']
+    assert _conditional(client, url, everything).status_code == 304
+
+    order_id = everything.get_json()["orders"][0]["id"]
+    client.post('/remove_item', json={"user_id": user_id, "order_id": order_id})
+    assert _conditional(client, url, everything).status_code == 200
+
+
+def test_unknown_tag_gets_the_full_body(client, seeded):
+    response = client.get('/products', headers={"If-None-Match": '"nope"'})
+    assert response.status_code == 200
+    assert response.get_json()["products"]
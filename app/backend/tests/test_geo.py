@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from geo import ShopCoords, calc_distance, near_rounding_tie
+
+
+def _coords(n=200, seed=11):
+    rng = random.Random(seed)
+    return ShopCoords((i, 17.0 + rng.uniform(-2, 2), 78.0 + rng.uniform(-2, 2)) for i in range(n))
+
+
+def test_distances_match_the_scalar_formula():
+    coords = _coords()
+    km = coords.distances_from(17.4, 78.5)
+    expected = [calc_distance(17.4, 78.5, lat, lon) for lat, lon in zip(coords.lat, coords.lon)]
+    assert np.allclose(km, expected, rtol=0, atol=1e-9)
+
+
+def test_distances_to_a_subset_of_shops():
+    coords = _coords()
+    positions = [coords.position(5), coords.position(9)]
+    km = coords.distances_from(17.4, 78.5, positions)
+    assert km.tolist() == coords.distances_from(17.4, 78.5)[positions].tolist()
+
+
+def test_matrix_rows_match_single_point_distances():
+    coords = _coords(50)
+    lats, lons = [17.1, 17.9, 16.5], [78.2, 78.0, 79.1]
+    matrix = coords.distance_matrix(lats, lons)
+    assert matrix.shape == (3, 50)
+    for row, lat, lon in zip(matrix, lats, lons):
+        assert np.allclose(row, coords.distances_from(lat, lon), rtol=0, atol=1e-9)
+
+
+def test_nearest_orders_shops_by_distance():
+    coords = _coords()
+    km = coords.distances_from(17.4, 78.5)
+    nearest = coords.nearest(17.4, 78.5, k=4)
+    assert nearest == sorted(range(len(km)), key=lambda i: km[i])[:4]
+    assert len(coords.nearest(17.4, 78.5, k=1000)) == len(coords)
+
+
+def test_no_shops():
+    coords = ShopCoords([])
+    assert len(coords) == 0
+    assert coords.position(1) is None
+    assert coords.nearest(17.4, 78.5) == []
+
+
+def test_rounding_ties_are_flagged():
+    assert near_rounding_tie(np.array([1.000000005, 1.000000002])).tolist() == [True, False]
+
+
+def test_vectorized_pricing_matches_decimal_pricing():
+    import app
+    rng = random.Random(5)
+    km = np.array([rng.uniform(0, 30) for _ in range(500)] + [1.000000005, 0.5, 2.0])
+    distance_km, charge = app.price_distances(km)
+    for i, value in enumerate(km):
+        d, c = app.price_distance(float(value))
+        assert (distance_km[i], charge[i]) == (float(d), float(c))
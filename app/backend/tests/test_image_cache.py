@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+import pytest
+
+import image_cache
+from image_cache import ImageCache, ImageTooLarge, UpstreamBusy, UpstreamError, load_image, store_response
+
+JPEG = b'\xff\xd8\xff' + b'x' * 2000
+
+
+def test_cache_round_trip(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    writer = cache.writer('k')
+    writer.write(b'abc')
+    writer.write(b'def')
+    meta = writer.commit({"content_type": "image/png"})
+    assert cache.get('k') == (meta, b'abcdef')
+    assert meta["size"] == 6 and meta["etag"]
+
+    # A new instance finds the entry on disk
+    assert ImageCache(str(tmp_path)).get('k')[1] == b'abcdef'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=25, hot_bytes=0)
+    for key in ('a', 'b', 'c'):
+        writer = cache.writer(key)
+        writer.write(b'x' * 10)
+        writer.commit({"content_type": "image/png"})
+        if key == 'b':
+            cache.get('a')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_aborted_write_leaves_nothing(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    writer = cache.writer('k')
+    writer.write(b'partial')
+    writer.abort()
+    assert cache.get('k') is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_misses_are_fetched_once_then_served_from_the_cache(images, upstream):
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    meta, body = load_image(upstream.url('/a.jpg'))
+    assert body == JPEG and meta["content_type"] == 'image/jpeg'
+    assert load_image(upstream.url('/a.jpg'))[1] == JPEG
+    assert upstream.hits('/a.jpg') == 1
+
+
+def test_concurrent_misses_share_one_fetch(images, upstream):
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    bodies = []
+    threads = [threading.Thread(target=lambda: bodies.append(load_image(upstream.url('/a.jpg'))[1]))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bodies == [JPEG] * 8
+    assert upstream.hits('/a.jpg') <= 2
+
+
+def test_stale_entries_are_revalidated(images, upstream, monkeypatch):
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    first, _ = load_image(upstream.url('/a.jpg'))
+    monkeypatch.setattr(image_cache, 'IMAGE_CACHE_TTL', 0)
+    time.sleep(0.01)
+    meta, body = load_image(upstream.url('/a.jpg'))
+    assert body == JPEG and meta["etag"] == first["etag"]
+    assert upstream.requests[-1][1] == first["upstream_etag"]  # a conditional request, answered 304
+
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG + b'v2')
+    assert load_image(upstream.url('/a.jpg'))[1] == JPEG + b'v2'
+
+
+def test_upstream_errors_are_not_cached(images, upstream):
+    with pytest.raises(UpstreamError) as error:
+        load_image(upstream.url('/missing.jpg'))
+    assert error.value.status == 404
+    with pytest.raises(UpstreamError):
+        load_image(upstream.url('/missing.jpg'))
+    assert upstream.hits('/missing.jpg') == 2
+
+
+def test_saturated_host_raises_upstream_busy(images, upstream, monkeypatch):
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    monkeypatch.setattr(image_cache, 'IMAGE_UPSTREAM_POOL_TIMEOUT', 0.05)
+    host = upstream.url('')
+    monkeypatch.setitem(image_cache._host_slots, host, threading.BoundedSemaphore(1))
+    image_cache._host_slots[host].acquire()
+    with pytest.raises(UpstreamBusy):
+        load_image(upstream.url('/a.jpg'))
+
+
+def test_proxy_image_route(client, images, upstream):
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    response = client.get('/proxy_image', query_string={"url": upstream.url('/a.jpg')})
+    assert response.status_code == 200
+    assert response.data == JPEG
+    assert response.headers['Cache-Control'].startswith('public')
+
+    again = client.get('/proxy_image', query_string={"url": upstream.url('/a.jpg')},
+                       headers={"If-None-Match": response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_proxy_image_errors(client, images, upstream):
+    assert client.get('/proxy_image').status_code == 400
+    missing = client.get('/proxy_image', query_string={"url": upstream.url('/missing.jpg')})
+    assert missing.status_code == 400
+
+
+def test_large_bodies_are_streamed_to_disk(images, upstream, monkeypatch):
+    big = JPEG * 100  # several chunks
+    upstream.files['/big.jpg'] = ('image/jpeg', big)
+    monkeypatch.setattr(images, 'hot_item_max', 1000)
+    meta, body = load_image(upstream.url('/big.jpg'))
+    assert body == big and meta["size"] == len(big)
+    assert images.get(ImageCache.key_for(upstream.url('/big.jpg'))) == (meta, big)
+    assert images.stats()["hot_entries"] == 0
+
+
+def test_oversized_images_are_refused(client, images, upstream, monkeypatch):
+    monkeypatch.setattr(image_cache, 'IMAGE_MAX_BYTES', len(JPEG) - 1)
+    upstream.files['/a.jpg'] = ('image/jpeg', JPEG)
+    with pytest.raises(ImageTooLarge):
+        load_image(upstream.url('/a.jpg'))
+    response = client.get('/proxy_image', query_string={"url": upstream.url('/a.jpg')})
+    assert response.status_code == 400 and "larger than" in response.get_json()["error"]
+    assert list(os.scandir(images.directory)) == []
+
+
+class ChunkedResponse:
+    """An upstream response without Content-Length."""
+    headers = {"Content-Type": "image/jpeg"}
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    def iter_content(self, size):
+        return iter(self.chunks)
+
+
+def test_body_over_the_limit_is_abandoned_mid_stream(images, monkeypatch):
+    monkeypatch.setattr(image_cache, 'IMAGE_MAX_BYTES', 10)
+    with pytest.raises(ImageTooLarge):
+        store_response(images, 'k', ChunkedResponse(b'x' * 6, b'y' * 6))
+    assert images.get('k') is None
+    assert list(os.scandir(images.directory)) == []
+    assert store_response(images, 'k', ChunkedResponse(b'x' * 6, b'y' * 4))[1] == b'x' * 6 + b'y' * 4
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import MultiDict
+
+from image_variants import IMAGE_MAX_DIMENSION, render_variant, variant_params
+
+
+def _png(width=400, height=200, mode='RGBA'):
+    out = BytesIO()
+    Image.new(mode, (width, height), (200, 80, 20, 255)[:len(mode)]).save(out, 'PNG')
+    return out.getvalue()
+
+
+def test_variant_params():
+    assert variant_params(MultiDict()) is None
+    assert variant_params(MultiDict({'width': '100'})) == (100, None, 80, 'webp')
+    assert variant_params(MultiDict({'height': '50', 'quality': '60', 'format': 'JPEG'})) == (None, 50, 60, 'jpeg')
+
+
+@pytest.mark.parametrize("args", [
+    {'width': '0'},
+    {'height': str(IMAGE_MAX_DIMENSION + 1)},
+    {'quality': '101'},
+    {'format': 'gif'},
+])
+def test_variant_params_rejects_bad_values(args):
+    with pytest.raises(ValueError):
+        variant_params(MultiDict(args))
+
+
+def test_render_fits_the_box_without_upscaling():
+    image = Image.open(BytesIO(render_variant(_png(), 100, 100, 80, 'webp')))
+    assert image.format == 'WEBP' and image.size == (100, 50)
+
+    image = Image.open(BytesIO(render_variant(_png(40, 20), 100, None, 80, 'jpeg')))
+    assert image.format == 'JPEG' and image.size == (40, 20)
+
+
+def test_variant_route_renders_once_per_source_version(client, images, upstream):
+    upstream.files['/a.png'] = ('image/png', _png())
+    query = {"url": upstream.url('/a.png'), "width": "80", "format": "jpeg"}
+
+    response = client.get('/proxy_image', query_string=query)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert Image.open(BytesIO(response.data)).size == (80, 40)
+    entries = images.stats()["entries"]  # the source and the variant
+
+    again = client.get('/proxy_image', query_string=query)
+    assert again.data == response.data
+    assert images.stats()["entries"] == entries
+    assert upstream.hits('/a.png') == 1
+
+    assert client.get('/proxy_image', query_string=query,
+                      headers={"If-None-Match": response.headers['ETag']}).status_code == 304
+
+
+def test_variant_route_errors(client, images, upstream):
+    upstream.files['/not-an-image'] = ('image/png', b'plain text')
+    bad = client.get('/proxy_image', query_string={"url": upstream.url('/a.png'), "width": "-5"})
+    assert bad.status_code == 400
+    broken = client.get('/proxy_image', query_string={"url": upstream.url('/not-an-image'), "width": "10"})
+    assert broken.status_code == 500
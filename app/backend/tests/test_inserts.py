@@ -0,0 +1,70 @@
+import db
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+
+
+def _count(sql, *params):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def test_insert_many_chunks_rows():
+    cursor = RecordingCursor()
+    rows = [(i, f"n{i}") for i in range(5)]
+    db.insert_many(cursor, "INSERT INTO t (a, b) VALUES ", "(%s, %s)", rows, chunk_size=2)
+    assert [sql for sql, _ in cursor.statements] == [
+        "INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)",
+        "INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)",
+        "INSERT INTO t (a, b) VALUES (%s, %s)",
+    ]
+    assert cursor.statements[2][1] == [4, "n4"]
+
+
+def test_insert_many_without_rows_runs_nothing():
+    cursor = RecordingCursor()
+    db.insert_many(cursor, "INSERT INTO t (a) VALUES ", "(%s)", [])
+    assert cursor.statements == []
+
+
+def test_add_to_cart_inserts_every_valid_item(client, seeded):
+    user_id = seeded["user_ids"][0]
+    shop_id, name, price = seeded["products"][0]
+    items = [{"pickle_name": name, "quantity": 2, "cost": price, "shop_id": shop_id},
+             {"pickle_name": "Lemon Pickle", "quantity": 1, "cost": 80, "shop_id": shop_id},
+             {"pickle_name": "", "quantity": 1, "cost": 80, "shop_id": shop_id}]
+    response = client.post('/add_to_cart', json={"user_id": user_id, "items": items})
+    assert response.get_json() == {"success": True}
+    assert _count("SELECT COUNT(*) FROM cart WHERE user_id = %s", user_id) == 2
+
+
+def test_add_to_cart_requires_items(client, seeded):
+    response = client.post('/add_to_cart', json={"user_id": seeded["user_ids"][0], "items": []})
+    assert response.status_code == 400
+
+
+def test_buy_now_inserts_all_items(client, seeded):
+    user_id = seeded["user_ids"][1]
+    before = _count("SELECT COUNT(*) FROM orders WHERE user_id = %s", user_id)
+    items = [{"pickle_name": f"Pickle {i}", "quantity": 1, "cost": 50 + i} for i in range(7)]
+    response = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                             "items": items})
+    assert response.get_json()["success"]
+    assert _count("SELECT COUNT(*) FROM orders WHERE user_id = %s", user_id) == before + 7
+
+
+def test_buy_now_inserts_nothing_when_an_item_is_invalid(client, seeded):
+    user_id = seeded["user_ids"][1]
+    before = _count("SELECT COUNT(*) FROM orders WHERE user_id = %s", user_id)
+    items = [{"pickle_name": "Pickle", "quantity": 1, "cost": 50}, {"quantity": 1, "cost": 50}]
+    response = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                             "items": items})
+    assert response.status_code == 400
+    assert _count("SELECT COUNT(*) FROM orders WHERE user_id = %s", user_id) == before
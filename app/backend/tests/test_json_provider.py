@@ -0,0 +1,75 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date as werkzeug_http_date
+
+from json_provider import RowJSONProvider, RowSet, ascii_only, default, http_date, orjson
+
+COLUMNS = ("id", "name", "price", "created_at", "opening_time", "note", "ratio")
+ROWS = [
+    (1, "Mango ñ 漬物 😀", Decimal("120.50"), datetime(2024, 3, 5, 14, 7, 9), timedelta(hours=9), None, 0.1),
+    (2, 'quote " and \\ slash', Decimal("0.05"), date(2024, 1, 1), time(21, 0), True, 2.5),
+]
+
+MODES = [False] + ([True] if orjson is not None else [])
+
+
+@pytest.fixture(params=MODES, ids=lambda fast: "orjson" if fast else "rowset")
+def provider(request):
+    provider = RowJSONProvider(Flask(__name__))
+    provider.fast = request.param
+    return provider
+
+
+def stdlib(obj):
+    """The stdlib encoder with the provider's type hook, as Flask writes a response body."""
+    return json.dumps(obj, default=default, sort_keys=True, separators=(",", ":"))
+
+
+def _as_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def test_rows_encode_like_the_default_provider(provider):
+    rows = RowSet(COLUMNS, ROWS)
+    assert provider.dumps(rows) == stdlib(_as_dicts(ROWS))
+    body = {"status": "ok", "products": rows}
+    assert provider.dumps(body) == stdlib({"status": "ok", "products": _as_dicts(ROWS)})
+
+
+def test_single_row_and_conversions(provider):
+    rows = RowSet(COLUMNS, ROWS).with_convert(price=float)
+    assert json.loads(provider.dumps(rows.first()))["price"] == 120.5
+    assert provider.dumps(RowSet(COLUMNS, []).first()) == "null"
+
+
+def test_plain_rows(provider):
+    decoded = json.loads(provider.dumps(RowSet(COLUMNS, ROWS, plain=True)))
+    assert decoded[0]["price"] == 120.5
+    assert decoded[0]["created_at"] == "2024-03-05 14:07:09"
+    assert decoded[1]["opening_time"] == "21:00:00"
+
+
+def test_encode_rows_gives_one_text_per_row(provider):
+    encoded = provider.encode_rows(RowSet(COLUMNS, ROWS))
+    assert encoded == [stdlib(row) for row in _as_dicts(ROWS)]
+
+
+def test_values_orjson_cannot_encode_fall_back(provider):
+    huge = {"n": 2 ** 70}
+    assert provider.dumps(huge, separators=(",", ":")) == stdlib(huge)
+    with pytest.raises(TypeError):
+        provider.dumps({"x": object()})
+
+
+def test_http_date_matches_werkzeug():
+    for value in (datetime(2024, 2, 29, 23, 59, 1), date(1999, 12, 31)):
+        assert http_date(value) == werkzeug_http_date(value)
+
+
+def test_ascii_only_matches_ensure_ascii():
+    text = json.dumps("naïve 😀", ensure_ascii=False)
+    assert ascii_only(text) == json.dumps("naïve 😀")
@@ -0,0 +1,79 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import db
+import load_test
+import sqlite_db
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(BACKEND, 'benchmarks', 'load_test.py')
+
+
+def test_translate_mysql_sql():
+    assert sqlite_db.translate("SELECT * FROM cart WHERE id = %s FOR UPDATE") == "SELECT * FROM cart WHERE id = ?"
+    assert sqlite_db.translate("INSERT INTO t (a) VALUES (NOW())") == "INSERT INTO t (a) VALUES (CURRENT_TIMESTAMP)"
+    assert sqlite_db.translate(
+        "INSERT INTO t (k, n) VALUES (%s, %s) ON DUPLICATE KEY UPDATE n = n + VALUES(n)"
+    ) == "INSERT INTO t (k, n) VALUES (?, ?) ON CONFLICT DO UPDATE SET n = n + excluded.n"
+
+
+def test_stand_in_cursors(database):
+    connect = sqlite_db.factory(database)
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("INSERT INTO users (name, email) VALUES (%s, %s)", ("A", "a@example.com"))
+    assert cursor.lastrowid == 1 and conn.in_transaction
+    conn.commit()
+    cursor.execute("SELECT id, name FROM users")
+    assert cursor.fetchall() == [{"id": 1, "name": "A"}]
+    conn.close()
+
+
+def test_percentile():
+    values = [i / 100 for i in range(1, 101)]
+    assert load_test.percentile(values, 50) == 0.5
+    assert load_test.percentile(values, 99) == 0.99
+    assert load_test.percentile(values, 100) == 1.0
+    assert load_test.percentile([], 95) == 0.0
+
+
+@pytest.mark.parametrize("route", load_test.ROUTES)
+def test_generated_requests_succeed(client, database, route):
+    with db.db_connection() as conn:
+        data = sqlite_db.seed(conn.cursor(), shops=3, products_per_shop=4, users=3, cart_items=5, orders=60)
+        conn.commit()
+    rng = random.Random(1)
+    for _ in range(3):
+        method, path, body = load_test.make_request(route, rng, data)
+        response = client.open(path, method=method, json=body)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_unknown_route():
+    with pytest.raises(ValueError):
+        load_test.make_request('nope', random.Random(1), {"products": [], "user_ids": [], "shop_ids": []})
+
+
+def test_cli_writes_a_report(tmp_path):
+    out = tmp_path / 'load.json'
+    result = subprocess.run(
+        [sys.executable, SCRIPT, '--routes', 'products,search_items', '--requests', '5', '--concurrency', '2',
+         '--client-processes', '1', '--db', str(tmp_path / 'bench.db'), '--out', str(out)],
+        cwd=BACKEND, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(out.read_text())
+    assert set(report["routes"]) == {"products", "search_items"}
+    assert report["routes"]["products"]["requests"] == 5
+    assert report["routes"]["products"]["errors"] == 0
+
+
+def test_cli_rejects_unknown_routes(tmp_path):
+    result = subprocess.run([sys.executable, SCRIPT, '--routes', 'nope', '--out', str(tmp_path / 'x.json')],
+                            cwd=BACKEND, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 2
+    assert "unknown routes" in result.stderr
@@ -0,0 +1,90 @@
+import re
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, InstrumentedCursor, query_label
+
+
+def _value(text, line_start):
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_query_labels_hide_literals_and_collapse_lists():
+    assert query_label("SELECT * FROM products  WHERE id = 5 AND name = 'x'") == \
+        "SELECT * FROM products WHERE id = ? AND name = ?"
+    assert query_label("INSERT INTO cart (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == \
+        "INSERT INTO cart (a, b) VALUES (?, ?), ..."
+    assert query_label("DELETE FROM cart WHERE id IN (%s, %s, %s)") == "DELETE FROM cart WHERE id IN (...)"
+
+
+def test_label_count_is_capped(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_MAX_QUERY_LABELS', 2)
+    monkeypatch.setattr(metrics, '_known_queries', set())
+    keys = [metrics._query_key(f"SELECT c{i} FROM t") for i in range(4)]
+    assert keys == [("SELECT c0 FROM t",), ("SELECT c1 FROM t",), ("other",), ("other",)]
+    assert metrics._query_key("SELECT c0 FROM t") == ("SELECT c0 FROM t",)
+
+
+def test_histogram_and_counter_render():
+    histogram = Histogram("h", "help", ("route",), (0.1, 1))
+    histogram.observe(("/a",), 0.05)
+    histogram.observe(("/a",), 5)
+    out = []
+    histogram.render(out)
+    assert 'h_bucket{route="/a",le="0.1"} 1' in out
+    assert 'h_bucket{route="/a",le="1"} 1' in out
+    assert 'h_bucket{route="/a",le="+Inf"} 2' in out
+    assert 'h_count{route="/a"} 2' in out
+
+    counter = Counter("c", "help", ("q",))
+    counter.inc(('say "hi"',), 3)
+    out = []
+    counter.render(out)
+    assert 'c{q="say \\"hi\\""} 3' in out
+
+
+class FakeCursor:
+    rowcount = -1
+
+    def execute(self, sql, params=()):
+        if "boom" in sql:
+            raise RuntimeError("bad SQL")
+
+    def fetchall(self):
+        return [(1,), (2,), (3,)]
+
+    def close(self):
+        pass
+
+
+def test_cursor_records_rows_and_errors():
+    label = ("SELECT id FROM metrics_test WHERE x = ?",)
+    rows_before = metrics.db_rows._values.get(label, 0)
+    cursor = InstrumentedCursor(FakeCursor())
+    cursor.execute("SELECT id FROM metrics_test WHERE x = %s", (1,))
+    assert len(cursor.fetchall()) == 3
+    cursor.close()
+    assert metrics.db_rows._values[label] == rows_before + 3
+
+    error_label = ("SELECT boom FROM metrics_test",)
+    errors_before = metrics.db_errors._values.get(error_label, 0)
+    with pytest.raises(RuntimeError):
+        InstrumentedCursor(FakeCursor()).execute("SELECT boom FROM metrics_test")
+    assert metrics.db_errors._values[error_label] == errors_before + 1
+
+
+def test_metrics_route(client, seeded):
+    before = _value(client.get('/metrics').get_data(as_text=True),
+                    'http_requests_total{route="/items/<int:shop_id>",method="GET",status="200"}')
+    client.get(f'/items/{seeded["shop_ids"][0]}')
+    client.get('/no/such/route')
+    text = client.get('/metrics').get_data(as_text=True)
+
+    assert _value(text, 'http_requests_total{route="/items/<int:shop_id>",method="GET",status="200"}') == before + 1
+    assert 'http_requests_total{route="unmatched",method="GET",status="404"}' in text
+    assert re.search(r'db_query_duration_seconds_count\{query="SELECT id, shop_id, name', text)
+    assert 'db_pool{stat="checkouts"}' in text
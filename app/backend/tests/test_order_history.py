@@ -0,0 +1,110 @@
+import pytest
+
+import db
+from paging import decode_cursor, encode_cursor, history_params, history_sql
+
+
+def _all_pages(fetch):
+    """Follow next cursors from fetch(cursor) -> (rows, next_cursor)."""
+    rows, cursor = [], None
+    while True:
+        page, cursor = fetch(cursor)
+        rows += page
+        if cursor is None:
+            return rows
+
+
+def _add_orders(user_id, shop_id, *rows):
+    """rows of (created_at, status)"""
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        for created_at, status in rows:
+            cursor.execute("""INSERT INTO orders (user_id, pickles, quantity, cost, status, created_at,
+                latitude, longitude, distance, delivery_charge, final_cost, shop_id)
+                VALUES (%s, 'Test Pickle', 1, 10, %s, %s, 17.4, 78.5, 1, 10, 20, %s)""",
+                           (user_id, status, created_at, shop_id))
+        conn.commit()
+
+
+def test_cursor_round_trip():
+    token = encode_cursor("2024-01-01 10:00:00", 42)
+    assert '=' not in token
+    assert decode_cursor(token) == ("2024-01-01 10:00:00", 42)
+    for bad in ("x", encode_cursor("not a date", 1)):
+        with pytest.raises(ValueError, match="invalid cursor"):
+            decode_cursor(bad)
+
+
+def test_history_params_and_sql():
+    limit, cursor, filters = history_params({"limit": "5", "cursor": encode_cursor("2024-01-02", 7),
+                                             "to_date": "2024-01-31", "status": "Ordered", "other": "x"})
+    assert (limit, cursor) == (5, ("2024-01-02", 7))
+    sql, params = history_sql("SELECT id FROM orders", ["user_id = %s"], [1], filters, cursor, limit + 1)
+    assert sql == ("SELECT id FROM orders WHERE user_id = %s AND created_at < %s AND status = %s"
+                   " AND (created_at < %s OR (created_at = %s AND id < %s))"
+                   " ORDER BY created_at DESC, id DESC LIMIT %s")
+    assert params[2:] == ["Ordered", "2024-01-02", "2024-01-02", 7, 6]
+    with pytest.raises(ValueError, match="from_date"):
+        history_sql("SELECT id FROM orders", [], [], {"from_date": "yesterday"})
+
+
+def test_orders_info_pages_cover_the_history(client, seeded):
+    user_id = seeded["user_ids"][0]
+    # Same created_at on several orders: the id breaks the tie
+    _add_orders(user_id, seeded["shop_ids"][0], *[("2024-01-01 00:03:00", "Ordered")] * 4)
+    unpaged = client.get('/orders_info', query_string={"user_id": user_id}).get_json()
+    assert "next_cursor" not in unpaged
+    everything = unpaged["orders"]
+    keys = [(o["created_at"], o["id"]) for o in everything]
+    assert keys == sorted(keys, reverse=True)
+
+    def fetch(cursor):
+        response = client.get('/orders_info', query_string={"user_id": user_id, "limit": 2, "cursor": cursor or ""})
+        body = response.get_json()
+        assert response.headers.get('X-Next-Cursor') == body["next_cursor"]
+        assert len(body["orders"]) <= 2
+        return body["orders"], body["next_cursor"]
+
+    assert _all_pages(fetch) == everything
+
+
+def test_orders_info_filters(client, seeded):
+    user_id, shop_id = seeded["user_ids"][1], seeded["shop_ids"][0]
+    _add_orders(user_id, shop_id, ("2023-05-01 09:00:00", "Delivered"), ("2023-05-02 23:59:00", "Ordered"),
+                ("2023-05-03 00:00:00", "Delivered"))
+
+    def dates(**filters):
+        body = client.get('/orders_info', query_string={"user_id": user_id, **filters}).get_json()
+        return [o["created_at"][:10] for o in body["orders"]]
+
+    assert dates(from_date="2023-05-01", to_date="2023-05-02") == ["2023-05-02", "2023-05-01"]
+    assert dates(to_date="2023-05-03", status="Delivered") == ["2023-05-03", "2023-05-01"]
+    assert dates(from_date="2023-05-02T12:00:00", to_date="2023-05-31") == ["2023-05-03", "2023-05-02"]
+
+
+def test_orders_info_rejects_bad_paging(client, seeded):
+    user_id = seeded["user_ids"][0]
+    for args in ({"cursor": "!!"}, {"limit": "0"}, {"from_date": "soon"}):
+        response = client.get('/orders_info', query_string={"user_id": user_id, **args})
+        assert response.status_code == 400
+    assert client.get('/orders_info').status_code == 400
+
+
+def test_shop_orders_pages(client, seeded):
+    shop_id = seeded["shop_ids"][2]
+    _add_orders(seeded["user_ids"][0], shop_id, *[("2024-02-01 00:00:00", "Ordered")] * 2)
+    everything = client.post('/shop_orders', json={"shop_id": shop_id}).get_json()
+    assert {"order_id", "ordered_product", "user_name", "order_date"} <= set(everything[0])
+
+    def fetch(cursor):
+        response = client.post('/shop_orders', json={"shop_id": shop_id, "limit": 1, "cursor": cursor})
+        return response.get_json(), response.headers.get('X-Next-Cursor')
+
+    assert len(everything) >= 2 and _all_pages(fetch) == everything
+    assert client.post('/shop_orders', json={"shop_id": shop_id, "cursor": "!!"}).status_code == 400
+    for dates in ({"from_date": "yesterday"}, {"to_date": "2024-02-30"}):
+        response = client.post('/shop_orders', json={"shop_id": shop_id, **dates})
+        assert response.status_code == 400
+        assert "must be an ISO date" in response.get_json()["error"]
+    empty = client.post('/shop_orders', json={"shop_id": shop_id, "from_date": "1999-01-01", "to_date": "1999-01-02"})
+    assert empty.status_code == 404
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from paging import MAX_PAGE_SIZE, keyset_sql, page_params, split_page
+
+
+def test_page_params():
+    assert page_params({}) == (None, None, None)
+    assert page_params({'limit': '5', 'after': '10', 'stream': 'ndjson'}) == (5, 10, 'ndjson')
+    assert page_params({'limit': str(MAX_PAGE_SIZE + 1)})[0] == MAX_PAGE_SIZE
+
+
+@pytest.mark.parametrize("args", [{'limit': '0'}, {'limit': 'x'}, {'after': 'x'}, {'stream': 'csv'}])
+def test_page_params_rejects_bad_input(args):
+    with pytest.raises(ValueError):
+        page_params(args)
+
+
+def test_keyset_sql():
+    sql, params = keyset_sql("SELECT id FROM products", ["shop_id = %s"], [3], after=20, limit=11)
+    assert sql == "SELECT id FROM products WHERE shop_id = %s AND id > %s ORDER BY id LIMIT %s"
+    assert params == [3, 20, 11]
+    assert keyset_sql("SELECT id FROM products") == ("SELECT id FROM products", [])
+
+
+def test_split_page():
+    rows = [{'id': i} for i in range(1, 5)]
+    assert split_page(rows, 3) == (rows[:3], 3)
+    assert split_page(rows, 4) == (rows, None)
+    assert split_page(rows, None) == (rows, None)
+
+
+def test_products_pages_cover_the_catalog(client, seeded):
+    everything = client.get('/products').get_json()["products"]
+    assert len(everything) == len(seeded["products"])
+
+    seen, after = [], None
+    while True:
+        query = '/products?limit=5' + (f'&after={after}' if after else '')
+        response = client.get(query)
+        body = response.get_json()
+        seen += body["products"]
+        after = body["next_after"]
+        assert response.headers.get('X-Next-After') == (str(after) if after else None)
+        if after is None:
+            break
+    assert seen == everything
+
+
+def test_streamed_products_match_the_buffered_body(client, seeded):
+    buffered = client.get('/products?limit=7').get_json()
+    streamed = client.get('/products?limit=7&stream=json')
+    assert streamed.is_streamed
+    assert json.loads(streamed.get_data()) == {"products": buffered["products"], "status": "ok"}
+
+    lines = client.get('/products?stream=ndjson').get_data(as_text=True).splitlines()
+    assert len(lines) == len(seeded["products"])
+    assert json.loads(lines[0]) == buffered["products"][0]
+
+
+def test_items_for_one_shop(client, seeded):
+    shop_id = seeded["shop_ids"][0]
+    first = client.get(f'/items/{shop_id}?limit=3')
+    second = client.get(f'/items/{shop_id}?limit=3&after={first.headers["X-Next-After"]}')
+    items = first.get_json() + second.get_json()
+    assert len(items) == sum(1 for p in seeded["products"] if p[0] == shop_id)
+    assert {item["shop_id"] for item in items} == {shop_id}
+
+
+def test_bad_paging_arguments_are_rejected(client, seeded):
+    assert client.get('/products?limit=0').status_code == 400
+    assert client.get(f'/items/{seeded["shop_ids"][0]}?stream=xml').status_code == 400
+    response = client.post('/ownerproducts?limit=-1', json={"shop_id": seeded["shop_ids"][0]})
+    assert response.status_code == 400
+
+
+def test_owner_products(client, seeded):
+    shop_id = seeded["shop_ids"][1]
+    response = client.post('/ownerproducts', json={"shop_id": shop_id, "limit": 2})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+    assert client.post('/ownerproducts', json={}).status_code == 400
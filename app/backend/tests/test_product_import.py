@@ -0,0 +1,98 @@
+import io
+import json
+
+import pytest
+
+from product_import import import_format, import_products, read_records, validate
+
+CSV = ("name,category,price,quantity_in_stock,image_url\n"
+       + "".join(f"Pickle {i},veg,{i}.50,{i},\n" for i in range(1, 8))
+       + "Bad Price,veg,abc,1,\n"
+       + ",veg,1,1,\n"
+       + "Extra,veg,2,3,u,surplus\n")
+
+
+def _items(client, shop_id):
+    return client.get(f'/items/{shop_id}').get_json()
+
+
+def test_import_format():
+    assert import_format('CSV', None) == 'csv'
+    assert import_format(None, 'text/csv; charset=utf-8') == 'csv'
+    assert import_format(None, 'multipart/form-data', 'items.jsonl') == 'ndjson'
+    with pytest.raises(ValueError):
+        import_format(None, 'application/octet-stream')
+
+
+def test_read_records_reports_bad_lines():
+    body = b'{"name": "A"}\n\n[1]\n{bad\n'
+    records = list(read_records(io.BytesIO(body), 'ndjson'))
+    assert records[0] == (1, {"name": "A"}, None)
+    assert [(line, error.split(':')[0]) for line, _, error in records[1:]] == [
+        (3, "Each line must be a JSON object"), (4, "Invalid JSON")]
+
+
+def test_validate():
+    row = validate({"name": " Lime ", "category": "veg", "price": "12.5", "quantity_in_stock": "3"}, 1, "now")
+    assert row[:5] == (1, "Lime", "veg", 12.5, 3)
+    for record, message in (({"name": "A", "category": "c", "price": "1", "quantity_in_stock": ""},
+                             "Missing required fields"),
+                            ({"name": "A", "category": "c", "price": "NaN", "quantity_in_stock": 1},
+                             "price must be a number"),
+                            ({"name": "A", "category": "c", "price": 1, "quantity_in_stock": 1, "shop_id": 2},
+                             "shop_id does not match the import's shop")):
+        with pytest.raises(ValueError, match=message):
+            validate(record, 1, "now")
+
+
+def test_csv_import_skips_bad_rows(client, seeded):
+    shop_id = seeded["shop_ids"][0]
+    before = len(_items(client, shop_id))
+    response = client.post(f'/import_owner_products?shop_id={shop_id}&batch_size=3', data=CSV,
+                           content_type='text/csv')
+    report = response.get_json()
+    assert response.status_code == 200
+    assert report["imported"] == 7 and report["failed"] == 3
+    assert [e["line"] for e in report["errors"]] == [9, 10, 11]
+    assert len(_items(client, shop_id)) == before + 7
+    assert client.get('/search_items?query=pickle 7').get_json()["count"] == 1
+
+
+def test_ndjson_upload_as_a_file(client, seeded):
+    shop_id = seeded["shop_ids"][1]
+    lines = [{"name": "Nimbu", "category": "veg", "price": 3, "quantity_in_stock": 2}, {"name": "No price"}]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    response = client.post(f'/import_owner_products?shop_id={shop_id}',
+                           data={"file": (io.BytesIO(body), "products.ndjson")},
+                           content_type='multipart/form-data')
+    assert response.get_json()["imported"] == 1
+    assert response.get_json()["errors"] == [{"line": 2, "error": "Missing required fields"}]
+
+
+def test_import_request_errors(client, seeded):
+    assert client.post('/import_owner_products', data=CSV, content_type='text/csv').status_code == 400
+    shop_id = seeded["shop_ids"][0]
+    unknown = client.post(f'/import_owner_products?shop_id={shop_id}', data=b'x',
+                          content_type='application/octet-stream')
+    assert unknown.status_code == 400
+    bad_batch = client.post(f'/import_owner_products?shop_id={shop_id}&batch_size=0', data=CSV,
+                            content_type='text/csv')
+    assert bad_batch.status_code == 400
+
+
+def test_non_numeric_shop_id_imports_nothing(client, seeded):
+    before = client.get('/products').get_json()["products"]
+    response = client.post('/import_owner_products?shop_id=abc', data=CSV, content_type='text/csv')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "shop_id must be an integer"}
+    assert client.get('/products').get_json()["products"] == before
+    with pytest.raises(ValueError):
+        import_products(io.BytesIO(CSV.encode()), 'csv', '1x')
+
+
+def test_invalid_utf8_stops_the_import(client, seeded):
+    body = "name,category,price,quantity_in_stock\nA,veg,1,1\n".encode() + b"\xff\xfe,veg,1,1\n"
+    response = client.post(f'/import_owner_products?shop_id={seeded["shop_ids"][0]}', data=body,
+                           content_type='text/csv')
+    assert response.status_code == 200
+    assert "not valid UTF-8" in response.get_json()["errors"][-1]["error"]
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+import pytest
+
+import db
+from product_updates import parse_item
+
+
+def _products(shop_id):
+    with db.db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, name, price, quantity_in_stock FROM products WHERE shop_id = %s ORDER BY id",
+                       (shop_id,))
+        return cursor.fetchall()
+
+
+def test_parse_item():
+    assert parse_item({"product_id": "5", "price": "12.50", "stock_delta": -2}) == \
+        (5, {"price": Decimal("12.50"), "stock_delta": -2})
+    assert parse_item({"product_id": 5, "image_url": None}) == (5, {"image_url": None})
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"price": 1}, "product_id is required"),
+    ({"product_id": 1}, "Nothing to update"),
+    ({"product_id": 1, "price": -1}, "non-negative"),
+    ({"product_id": 1, "quantity_in_stock": 1, "stock_delta": 1}, "not both"),
+    ({"product_id": 1, "quantity_in_stock": -3}, "cannot be negative"),
+    ({"product_id": 1, "stock_delta": 1.5}, "must be an integer"),
+    ({"product_id": 1, "name": ""}, "name cannot be empty"),
+])
+def test_parse_item_rejects(item, message):
+    with pytest.raises(ValueError, match=message):
+        parse_item(item)
+
+
+def test_batch_update_applies_the_valid_items(client, seeded):
+    shop_id, other_shop = seeded["shop_ids"][:2]
+    mine = _products(shop_id)
+    theirs = _products(other_shop)
+    items = [
+        {"product_id": mine[0]["id"], "price": 99, "stock_delta": 1},
+        {"product_id": mine[1]["id"], "quantity_in_stock": 7, "name": "Renamed Pickle"},
+        {"product_id": mine[2]["id"], "stock_delta": -(mine[2]["quantity_in_stock"] + 1)},
+        {"product_id": theirs[0]["id"], "price": 1},
+        {"product_id": 999999, "price": 1},
+        {"product_id": mine[0]["id"], "price": 5},
+        {"product_id": mine[3]["id"], "price": "x"},
+    ]
+    body = client.post('/update_owner_products', json={"shop_id": shop_id, "items": items}).get_json()
+    assert (body["updated"], body["failed"]) == (2, 5)
+    assert [r["status"] for r in body["results"]] == ["updated", "updated"] + ["error"] * 5
+    assert [r.get("error") for r in body["results"][2:]] == [
+        "Not enough stock for stock_delta", "Product belongs to another shop", "Product not found",
+        "Duplicate product_id", "price must be a number"]
+
+    after = _products(shop_id)
+    assert float(after[0]["price"]) == 99 and after[0]["quantity_in_stock"] == mine[0]["quantity_in_stock"] + 1
+    assert after[1]["quantity_in_stock"] == 7 and after[1]["name"] == "Renamed Pickle"
+    assert after[2]["quantity_in_stock"] == mine[2]["quantity_in_stock"]
+    assert _products(other_shop) == theirs
+
+    names = [item["name"] for item in client.get(f'/items/{shop_id}').get_json()]
+    assert "Renamed Pickle" in names
+    assert client.get('/search_items?query=renamed').get_json()["count"] == 1
+
+
+def test_stock_delta_on_a_null_stock(client, seeded):
+    shop_id = seeded["shop_ids"][0]
+    first, second = _products(shop_id)[:2]
+    with db.db_connection() as conn:
+        conn.cursor().execute("UPDATE products SET quantity_in_stock = NULL WHERE id IN (%s, %s)",
+                              (first["id"], second["id"]))
+        conn.commit()
+    items = [{"product_id": first["id"], "stock_delta": 3}, {"product_id": second["id"], "stock_delta": -1}]
+    body = client.post('/update_owner_products', json={"shop_id": shop_id, "items": items}).get_json()
+    assert body["results"][0] == {"product_id": first["id"], "status": "updated",
+                                  "price": float(first["price"]), "quantity_in_stock": 3}
+    assert body["results"][1]["error"] == "Not enough stock for stock_delta"
+    assert [p["quantity_in_stock"] for p in _products(shop_id)[:2]] == [3, None]
+
+
+def test_batch_update_request_errors(client, seeded, monkeypatch):
+    import app
+    shop_id = seeded["shop_ids"][0]
+    assert client.post('/update_owner_products', json={"items": [{"product_id": 1}]}).status_code == 400
+    assert client.post('/update_owner_products', json={"shop_id": shop_id, "items": []}).status_code == 400
+    monkeypatch.setattr(app, 'BATCH_UPDATE_MAX_ITEMS', 1)
+    too_many = [{"product_id": 1, "price": 1}, {"product_id": 2, "price": 1}]
+    assert client.post('/update_owner_products', json={"shop_id": shop_id, "items": too_many}).status_code == 400
+
+
+def test_batch_update_needs_the_shops_token(client, database, monkeypatch):
+    import auth
+    shop = {"shop_name": "Amma Pickles", "password": "s3cret", "latitude": 17.4, "longitude": 78.5}
+    mine = client.post('/shop_register', json=dict(shop, email="amma@example.com")).get_json()
+    other = client.post('/shop_register', json=dict(shop, email="other@example.com")).get_json()
+    request = {"shop_id": mine["shop_id"], "items": [{"product_id": 1, "price": 1}]}
+    monkeypatch.setattr(auth, 'SHOP_AUTH_REQUIRED', True)
+    assert client.post('/update_owner_products', json=request).status_code == 401
+    assert client.post('/update_owner_products', json=request,
+                       headers={"Authorization": f"Bearer {other['token']}"}).status_code == 403
+    response = client.post('/update_owner_products', json=request,
+                           headers={"Authorization": f"Bearer {mine['token']}"})
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [{"product_id": 1, "status": "error", "error": "Product not found"}]
@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import pytest
+
+import quotes
+
+ITEMS = [{"pickle_name": "Mango Pickle", "cost": 120, "quantity": 2}]
+
+
+@pytest.fixture
+def app_context():
+    import app
+    with app.app.app_context():
+        yield
+
+
+def test_quote_round_trip(app_context):
+    token = quotes.issue_quote(17.4, 78.5, 3, Decimal('1.25'), Decimal('20.00'), Decimal('240'))
+    assert quotes.verify_quote(token, 17.4, 78.5, Decimal('240')) == {
+        "shop_id": 3, "distance_km": Decimal('1.25'), "delivery_charge": Decimal('20.00')}
+
+
+@pytest.mark.parametrize("change", [
+    {"latitude": 17.41},
+    {"longitude": 78.49},
+    {"total_cost": Decimal('239')},
+])
+def test_quote_is_bound_to_location_and_total(app_context, change):
+    token = quotes.issue_quote(17.4, 78.5, 3, Decimal('1.25'), Decimal('20.00'), Decimal('240'))
+    args = dict({"latitude": 17.4, "longitude": 78.5, "total_cost": Decimal('240')}, **change)
+    assert quotes.verify_quote(token, **args) is None
+
+
+def test_tampered_or_expired_quote_is_rejected(app_context, monkeypatch):
+    token = quotes.issue_quote(17.4, 78.5, 3, Decimal('1.25'), Decimal('20.00'), Decimal('240'))
+    assert quotes.verify_quote(token[:-2] + "xx", 17.4, 78.5, Decimal('240')) is None
+    assert quotes.verify_quote(None, 17.4, 78.5, Decimal('240')) is None
+    monkeypatch.setattr(quotes, 'QUOTE_TTL', -1)
+    assert quotes.verify_quote(token, 17.4, 78.5, Decimal('240')) is None
+
+
+def test_buy_now_honours_the_quote(client, seeded):
+    user_id = seeded["user_ids"][0]
+    quoted = client.post('/distance_finder', json={"latitude": 17.4, "longitude": 78.5, "items": ITEMS}).get_json()
+    assert quoted["success"] and quoted["quote"]
+
+    for shop in ({}, {"shop_id": quoted["shop_id"]}):
+        placed = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                               "items": ITEMS, "quote": quoted["quote"], **shop}).get_json()
+        assert placed["success"]
+        assert placed["shop_id"] == quoted["shop_id"]
+        assert placed["delivery_charge"] == quoted["delivery_charge"]
+        assert placed["orders"][0]["final_cost"] == quoted["final_cost"]
+
+
+def test_quote_for_another_shop_is_not_used(client, seeded):
+    user_id = seeded["user_ids"][0]
+    quoted = client.post('/distance_finder', json={"latitude": 17.4, "longitude": 78.5, "items": ITEMS}).get_json()
+    other_shop = next(s for s in seeded["shop_ids"] if s != quoted["shop_id"])
+    placed = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                           "shop_id": other_shop, "items": ITEMS,
+                                           "quote": quoted["quote"]}).get_json()
+    assert placed["success"]
+    assert placed["shop_id"] == other_shop
+
+
+def test_quote_for_a_shop_that_closed_is_not_used(client, seeded):
+    from shop_index import shop_index
+    user_id = seeded["user_ids"][0]
+    quoted = client.post('/distance_finder', json={"latitude": 17.4, "longitude": 78.5, "items": ITEMS}).get_json()
+    shop_index.upsert(quoted["shop_id"], status='inactive')
+    placed = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                           "items": ITEMS, "quote": quoted["quote"]}).get_json()
+    assert placed["success"]
+    assert placed["shop_id"] != quoted["shop_id"]
+
+
+def test_buy_now_reprices_when_the_quote_does_not_match(client, seeded):
+    user_id = seeded["user_ids"][0]
+    quoted = client.post('/distance_finder', json={"latitude": 17.4, "longitude": 78.5, "items": ITEMS}).get_json()
+    other_shop = next(s for s in seeded["shop_ids"] if s != quoted["shop_id"])
+    cheaper = [dict(ITEMS[0], cost=100)]
+    placed = client.post('/buy_now', json={"user_id": user_id, "latitude": 17.4, "longitude": 78.5,
+                                           "shop_id": other_shop, "items": cheaper,
+                                           "quote": quoted["quote"]}).get_json()
+    assert placed["success"]
+    assert placed["shop_id"] == other_shop
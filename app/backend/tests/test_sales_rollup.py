@@ -0,0 +1,80 @@
+import pytest
+
+import db
+import sales_rollup
+
+
+def _summary(client, shop_id, **args):
+    return client.get('/shop_sales_summary', query_string={"shop_id": shop_id, **args}).get_json()
+
+
+def _orders_by_day(shop_id):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT DATE(created_at), COUNT(*), SUM(quantity), SUM(cost) FROM orders
+            WHERE shop_id = %s GROUP BY DATE(created_at) ORDER BY DATE(created_at)""", (shop_id,))
+        return [(str(day), count, qty, float(cost)) for day, count, qty, cost in cursor.fetchall()]
+
+
+def test_create_tables_can_be_repeated(database):
+    sales_rollup.migrate()
+    sales_rollup.migrate()
+
+
+def test_backfill_matches_the_orders(client, seeded):
+    shop_id = next(shop_id for shop_id in seeded["shop_ids"] if _orders_by_day(shop_id))
+    assert _summary(client, shop_id)["days"] == []  # seeded orders bypass buy_now
+
+    assert sales_rollup.backfill() > 0
+    summary = _summary(client, shop_id)
+    expected = _orders_by_day(shop_id)
+    assert [(d["day"], d["orders"], d["quantity"], d["revenue"]) for d in summary["days"]] == \
+        [(day, count, qty, pytest.approx(cost)) for day, count, qty, cost in expected]
+    assert summary["totals"]["orders"] == sum(row[1] for row in expected)
+    assert summary["totals"]["delivery_charge"] == pytest.approx(35.0 * summary["totals"]["orders"])
+
+    # Backfilling again, or one shop, rebuilds rather than adds
+    sales_rollup.backfill(shop_id)
+    sales_rollup.backfill()
+    assert _summary(client, shop_id) == summary
+
+
+def test_checkout_and_remove_item_keep_the_rollups_current(client, seeded):
+    user_id = seeded["user_ids"][0]
+    shop_id, name, price = seeded["products"][0]
+    client.post('/add_to_cart', json={"user_id": user_id, "items": [
+        {"pickle_name": name, "quantity": 3, "cost": price, "shop_id": shop_id}]})
+    order = client.post('/buy_now', json={"user_id": user_id, "from_cart": True,
+                                          "latitude": 17.385, "longitude": 78.4867}).get_json()["orders"][0]
+
+    summary = _summary(client, shop_id)
+    assert summary["totals"] == {"orders": 1, "quantity": 3, "revenue": order["cost"],
+                                 "delivery_charge": order["delivery_charge"]}
+    assert summary["top_products"] == [{"product_name": name, "orders": 1, "quantity": 3, "revenue": order["cost"]}]
+
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(id) FROM orders WHERE user_id = %s", (user_id,))
+        order_id = cursor.fetchone()[0]
+    assert client.post('/remove_item', json={"user_id": user_id, "order_id": order_id}).get_json()["success"]
+    summary = _summary(client, shop_id)
+    assert summary["days"] == [] and summary["top_products"] == [] and summary["totals"]["orders"] == 0
+
+    missing = client.post('/remove_item', json={"user_id": user_id, "order_id": order_id})
+    assert missing.status_code == 404
+
+
+def test_summary_ranges_and_top(client, seeded):
+    shop_id = next(shop_id for shop_id in seeded["shop_ids"] if _orders_by_day(shop_id))
+    sales_rollup.backfill()
+    days = [d["day"] for d in _summary(client, shop_id)["days"]]
+    assert days and [d["day"] for d in _summary(client, shop_id, from_date=days[-1])["days"]] == [days[-1]]
+    assert _summary(client, shop_id, to_date="2023-12-31")["days"] == []
+    assert len(_summary(client, shop_id, top=0)["top_products"]) == 1
+
+
+def test_summary_request_errors(client, seeded):
+    assert client.get('/shop_sales_summary').status_code == 400
+    shop_id = seeded["shop_ids"][0]
+    for args in ({"from_date": "2024-13-01"}, {"to_date": "01/02/2024"}, {"top": "many"}):
+        assert client.get('/shop_sales_summary', query_string={"shop_id": shop_id, **args}).status_code == 400
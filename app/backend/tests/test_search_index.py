@@ -0,0 +1,88 @@
+from search_index import SearchIndex
+
+ROWS = [
+    {"id": 1, "name": "Mango", "category": "pickles", "price": 10, "image_url": None, "shop_id": 1},
+    {"id": 2, "name": "Mango Thokku", "category": "pickles", "price": 20, "image_url": None, "shop_id": 1},
+    {"id": 3, "name": "Sweet Mango", "category": "pickles", "price": 30, "image_url": None, "shop_id": 2},
+    {"id": 4, "name": "Gongura", "category": "mango season", "price": 40, "image_url": None, "shop_id": 2},
+    {"id": 5, "name": "Amla Mangolia", "category": "pickles", "price": 50, "image_url": None, "shop_id": 2},
+    {"id": 6, "name": "Lemon", "category": "pickles", "price": 60, "image_url": None, "shop_id": 3},
+]
+
+
+def _index():
+    index = SearchIndex()
+    index.load(ROWS)
+    return index
+
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_results_are_ranked_by_match_kind():
+    # exact name, name prefix, word prefix (by name), category
+    assert _ids(_index().search("Mango")) == [1, 2, 5, 3, 4]
+
+
+def test_substring_matches():
+    assert _ids(_index().search("ngo")) == [5, 1, 2, 3, 4]
+    assert _ids(_index().search("m")) == [1, 2, 5, 3, 6, 4]
+
+
+def test_limit_returns_the_head_of_the_full_result():
+    index = _index()
+    for query in ("mango", "ngo", "m", "pickles"):
+        full = _ids(index.search(query))
+        for limit in range(1, len(full) + 1):
+            assert _ids(index.search(query, limit)) == full[:limit]
+
+
+def test_no_match_and_empty_query():
+    index = _index()
+    assert index.search("chilli") == []
+    assert index.search("   ") == []
+    assert index.autocomplete("") == []
+
+
+def test_upsert_and_remove_keep_the_index_current():
+    index = _index()
+    index.upsert(dict(ROWS[5], name="Lemon Mango"))
+    assert 6 in _ids(index.search("mango"))
+    index.remove(1)
+    assert _ids(index.search("mango"))[0] == 2
+    assert len(index) == 5
+
+
+def test_autocomplete_suggests_distinct_names():
+    assert _index().autocomplete("man") == ["Mango", "Mango Thokku", "Sweet Mango", "Amla Mangolia"]
+    assert _index().autocomplete("man", limit=1) == ["Mango"]
+
+
+def test_search_route_sees_product_writes(client, seeded):
+    shop_id = seeded["shop_ids"][0]
+    assert client.get('/search_items?query=zesty').get_json()["count"] == 0
+
+    client.post('/add_owner_product', json={"shop_id": shop_id, "name": "Zesty Lime", "category": "pickles",
+                                            "price": 99, "quantity_in_stock": 5})
+    found = client.get('/search_items?query=zesty').get_json()["products"]
+    assert [p["name"] for p in found] == ["Zesty Lime"]
+
+    client.post('/delete_owner_product', json={"product_id": found[0]["id"]})
+    assert client.get('/search_items?query=zesty').get_json()["count"] == 0
+    assert client.get('/search_autocomplete?query=zes').get_json()["suggestions"] == []
+
+
+def test_search_route_requires_a_query(client, database):
+    assert client.get('/search_items').status_code == 400
+    assert client.get('/search_autocomplete?query=').status_code == 400
+
+
+def test_search_route_limits(client, seeded, monkeypatch):
+    import paging
+    assert client.get('/search_items?query=pickle&limit=2').get_json()["count"] == 2
+    for limit in ("0", "-1", "many"):
+        assert client.get(f'/search_items?query=pickle&limit={limit}').status_code == 400
+        assert client.get(f'/search_autocomplete?query=pick&limit={limit}').status_code == 400
+    monkeypatch.setattr(paging, 'MAX_PAGE_SIZE', 3)
+    assert client.get('/search_items?query=pickle&limit=1000').get_json()["count"] == 3
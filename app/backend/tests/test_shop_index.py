@@ -0,0 +1,78 @@
+import random
+
+import db
+from geo import calc_distance
+from shop_index import ShopIndex
+
+
+def _shops(n, seed=7):
+    rng = random.Random(seed)
+    return [(i, round(17.0 + rng.uniform(-1, 1), 6), round(78.0 + rng.uniform(-1, 1), 6), 'active')
+            for i in range(1, n + 1)]
+
+
+def _brute_force(rows, lat, lon, k):
+    ranked = sorted((calc_distance(lat, lon, r[1], r[2]), r[0]) for r in rows if r[3] == 'active')
+    return [shop_id for _, shop_id in ranked[:k]]
+
+
+def test_nearest_matches_a_full_scan():
+    rows = _shops(300)
+    index = ShopIndex(cell_km=2)
+    index.load(rows)
+    rng = random.Random(3)
+    for _ in range(50):
+        lat, lon = 17.0 + rng.uniform(-1.2, 1.2), 78.0 + rng.uniform(-1.2, 1.2)
+        assert [s[0] for s in index.nearest(lat, lon, k=5)] == _brute_force(rows, lat, lon, 5)
+
+
+def test_inactive_and_unlocated_shops_are_not_indexed():
+    index = ShopIndex()
+    index.load([(1, 17.0, 78.0, 'inactive'), (2, None, None, 'active'), (3, 17.5, 78.5, 'active')])
+    assert len(index) == 1
+    assert index.get(1) is None
+    assert index.nearest(17.0, 78.0) == [(3, 17.5, 78.5)]
+
+
+def test_empty_index_has_no_nearest_shop():
+    index = ShopIndex()
+    index.load([])
+    assert index.nearest(17.0, 78.0, k=3) == []
+
+
+def test_upsert_moves_and_deactivates_shops():
+    index = ShopIndex()
+    index.load([(1, 17.0, 78.0, 'active'), (2, 18.0, 79.0, 'active')])
+    index.upsert(2, latitude=17.001, longitude=78.001)
+    assert index.nearest(17.001, 78.001)[0][0] == 2
+    index.upsert(2, status='inactive')
+    assert index.nearest(17.001, 78.001)[0][0] == 1
+    index.remove(1)
+    assert index.nearest(17.0, 78.0) == []
+
+
+def test_partial_change_to_an_unknown_shop_forces_a_reload():
+    index = ShopIndex()
+    index.load([(1, 17.0, 78.0, 'active')])
+    assert not index.is_stale()
+    index.upsert(99, status='active')
+    assert index.is_stale()
+
+
+def test_distance_finder_picks_the_nearest_shop(client, seeded):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT shop_id, latitude, longitude, status FROM shops")
+        rows = cursor.fetchall()
+    lat, lon = rows[1][1] + 0.0001, rows[1][2]
+    response = client.post('/distance_finder', json={
+        "latitude": lat, "longitude": lon, "items": [{"cost": 100, "quantity": 1}]})
+    assert response.status_code == 200
+    assert response.get_json()["shop_id"] == _brute_force(rows, lat, lon, 1)[0]
+
+
+def test_distance_finder_without_active_shops(client, database):
+    response = client.post('/distance_finder', json={
+        "latitude": 17.4, "longitude": 78.5, "items": [{"cost": 100, "quantity": 1}]})
+    assert response.status_code == 404
+    assert response.get_json()["success"] is False
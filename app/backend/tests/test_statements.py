@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import db
+import statements
+from statements import Result, run
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeCursor:
+    description = (("n",),)
+    rowcount = 1
+    lastrowid = None
+
+    def __init__(self):
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql, params):
+        if "boom" in sql:
+            raise RuntimeError("statement failed")
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    """A driver connection that hands out prepared cursors."""
+
+    def __init__(self):
+        self.prepared = []
+
+    def cursor(self, prepared=False):
+        assert prepared
+        cursor = FakeCursor()
+        self.prepared.append(cursor)
+        return cursor
+
+
+def _pooled():
+    return SimpleNamespace(driver_connection=FakeDriver())
+
+
+def test_statements_are_prepared_once_per_connection():
+    conn = _pooled()
+    run(conn, 'cart_for_user', [1])
+    run(conn, 'cart_for_user', (2,))
+    assert len(conn.driver_connection.prepared) == 1
+    (first_sql, first), (second_sql, second) = conn.driver_connection.prepared[0].executed
+    assert first_sql is second_sql is statements.STATEMENTS['cart_for_user']
+    assert (first, second) == ((1,), (2,))
+
+    run(_pooled(), 'cart_for_user', (1,))
+    assert len(conn.driver_connection.prepared) == 1  # other connections keep their own
+
+
+def test_least_recently_used_statement_is_closed(monkeypatch):
+    monkeypatch.setattr(statements, 'PREPARED_CACHE_SIZE', 2)
+    conn = _pooled()
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+        run(conn, sql)
+    one, two, three = conn.driver_connection.prepared
+    assert (one.closed, two.closed, three.closed) == (False, True, False)
+    assert list(conn.driver_connection._prepared_statements) == ["SELECT 1", "SELECT 3"]
+
+
+def test_failed_statement_is_prepared_again():
+    conn = _pooled()
+    with pytest.raises(RuntimeError):
+        run(conn, "SELECT boom")
+    assert conn.driver_connection.prepared[0].closed
+    assert "SELECT boom" not in conn.driver_connection._prepared_statements
+    with pytest.raises(RuntimeError):
+        run(conn, "SELECT boom")
+    assert len(conn.driver_connection.prepared) == 2
+
+
+def test_result():
+    result = Result(("id", "name"), [(1, "A"), (2, "B")], 2, None)
+    assert result.first() == (1, "A")
+    assert result.first_dict() == {"id": 1, "name": "A"}
+    assert result.rowset().columns == ("id", "name")
+    empty = Result(("id",), [], 0, None)
+    assert empty.first() is None and empty.first_dict() is None
+
+
+@pytest.mark.parametrize("prepared", [True, False])
+def test_run_against_the_database(seeded, monkeypatch, prepared):
+    monkeypatch.setattr(statements, 'DB_PREPARED_STATEMENTS', prepared)
+    with db.db_connection() as conn:
+        email = run(conn, "SELECT email FROM shops WHERE shop_id = %s", (seeded["shop_ids"][0],)).first()[0]
+        shop = run(conn, 'shop_card_by_email', (email,)).first_dict()
+        assert shop["shop_id"] == seeded["shop_ids"][0]
+        assert run(conn, 'shop_email_taken', ("nobody@example.com",)).rows == []
+        inserted = run(conn, "INSERT INTO users (name, email) VALUES (%s, %s)", ("N", "n@example.com"))
+        assert inserted.rowcount == 1 and inserted.lastrowid and inserted.columns == ()
+        conn.rollback()
+
+
+def test_benchmark_runs_on_the_stand_in():
+    result = subprocess.run([sys.executable, 'benchmarks/bench_prepared.py', '--backend', 'sqlite', '--calls', '2'],
+                            cwd=BACKEND, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert "shop_by_email" in result.stdout and "products page (keyset)" in result.stdout